@@ -0,0 +1,64 @@
+"""
+Scaling benchmark of the multi-process embedding encode pool.
+
+Encodes the same synthetic corpus in-process and with an increasing number of worker
+processes, and reports throughput and speedup for each worker count.
+
+    python benchmarks/encode_pool.py --model sentence-transformers/all-MiniLM-L6-v2 --texts 2000 --workers 1 2 4 8 16 32
+"""
+import time
+import random
+import argparse
+
+from prompt_regress.metrics import SimilarityMetrics
+
+
+WORDS = ("the model output should summarize the input text in a concise and accurate way while keeping "
+         "all of the important facts names numbers and dates").split()
+
+
+def make_corpus(count: int, min_words: int, max_words: int, seed: int = 0):
+    rng = random.Random(seed)
+    return [" ".join(rng.choices(WORDS, k=rng.randint(min_words, max_words))) for _ in range(count)]
+
+
+def run(model: str, texts, workers: int, batch_size: int, repeats: int) -> float:
+    """Best wall time of `repeats` encodes, after one warm-up encode."""
+    metrics = SimilarityMetrics(embedding_model=model, batch_size=batch_size, encode_workers=workers)
+    try:
+        metrics.encode(texts[:batch_size])
+        timings = []
+        for _ in range(repeats):
+            start = time.perf_counter()
+            metrics.encode(texts)
+            timings.append(time.perf_counter() - start)
+        return min(timings)
+    finally:
+        metrics.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--model', default='sentence-transformers/all-MiniLM-L6-v2')
+    parser.add_argument('--texts', type=int, default=2000)
+    parser.add_argument('--min-words', type=int, default=20)
+    parser.add_argument('--max-words', type=int, default=200)
+    parser.add_argument('--batch-size', type=int, default=16)
+    parser.add_argument('--repeats', type=int, default=3)
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 8])
+    args = parser.parse_args()
+
+    texts = make_corpus(args.texts, args.min_words, args.max_words)
+    print(f"{len(texts)} texts, {args.min_words}-{args.max_words} words, batch size {args.batch_size}, model {args.model}")
+    print(f"{'workers':>8} {'seconds':>9} {'texts/s':>9} {'speedup':>8}")
+
+    baseline = None
+    for workers in args.workers:
+        # One worker means encoding in this process with PyTorch's own intra-op threading.
+        seconds = run(args.model, texts, 0 if workers == 1 else workers, args.batch_size, args.repeats)
+        baseline = baseline or seconds
+        print(f"{workers:>8} {seconds:>9.2f} {len(texts) / seconds:>9.1f} {baseline / seconds:>7.2f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,17 @@
+from .results import ComparisonResult, ResultTable
+
+
+def __getattr__(name):
+    # PromptRegress pulls in PyTorch, so it is imported on first access only. This keeps
+    # `import prompt_regress.pytest_plugin` cheap for pytest sessions that do not use it.
+    if name == 'PromptRegress':
+        from .core import PromptRegress
+        return PromptRegress
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+__all__ = [
+    'PromptRegress',
+    'ComparisonResult',
+    'ResultTable'
+]
@@ -0,0 +1,71 @@
+import time
+import asyncio
+
+from typing import Optional, Iterable, Awaitable, List, Any
+
+
+class BudgetExceededError(RuntimeError):
+    """Raised when a run exceeds its cost or duration budget."""
+
+
+class Budget:
+    """
+    Cost and wall-time limits of a run.
+
+    The cost is checked before every request is sent and after every response is
+    received; the duration is enforced with a deadline on the whole run. Either way,
+    outstanding requests are cancelled once the budget is hit.
+    """
+
+    def __init__(self, max_cost: Optional[float] = None, max_duration: Optional[float] = None):
+        """
+        Initialize the budget.
+
+        Args:
+            max_cost (Optional[float]): Maximum spend in USD.
+            max_duration (Optional[float]): Maximum wall time in seconds.
+        """
+        self.max_cost = max_cost
+        self.max_duration = max_duration
+        self.spent = 0.0
+        self.started_at = time.monotonic()
+
+    @property
+    def elapsed(self) -> float:
+        """Seconds since the budget was created."""
+        return time.monotonic() - self.started_at
+
+    def check(self):
+        """Raise if the cost budget is already spent."""
+        if self.max_cost is not None and self.spent >= self.max_cost:
+            raise BudgetExceededError(f"Cost budget of ${self.max_cost:.4f} exceeded (spent ${self.spent:.4f}). "
+                                      "Outstanding requests were cancelled.")
+
+    def add(self, cost: float):
+        """
+        Account for the cost of a completed request.
+
+        Args:
+            cost (float): Cost of the request in USD.
+        """
+        self.spent += cost or 0.0
+        self.check()
+
+
+async def gather_or_cancel(aws: Iterable[Awaitable[Any]]) -> List[Any]:
+    """
+    Like `asyncio.gather`, but cancel the remaining awaitables as soon as one of them fails,
+    and re-raise the original exception rather than an exception group.
+
+    Args:
+        aws (Iterable[Awaitable[Any]]): Awaitables to run concurrently.
+
+    Returns:
+        List[Any]: Their results, in order.
+    """
+    try:
+        async with asyncio.TaskGroup() as group:
+            tasks = [group.create_task(aw) for aw in aws]
+    except BaseExceptionGroup as errors:
+        raise errors.exceptions[0]
+    return [task.result() for task in tasks]
@@ -1,9 +1,31 @@
 __version__ = "0.1.0"
 
+import yaml
 import click
 import asyncio
 from pathlib import Path
 from .core import PromptRegress
+from .config import resolve_state_dir
+from .history import HistoryStore
+from .daemon import PromptRegressDaemon, request_run
+
+def _format_value(value) -> str:
+    """Format an optional metric value for display."""
+    return "n/a" if value is None else f"{value:.3f}"
+
+def _format_estimate(estimate, max_cost, max_duration) -> str:
+    """Format a run estimate for display, warning about projections over budget."""
+    lines = ["💰 Dry Run Estimate", "=" * 50]
+    for model in estimate.models:
+        lines.append(f"{model.model}: {model.requests} requests, {model.input_tokens} input tokens, "
+                     f"~{model.output_tokens} output tokens, ~${model.cost:.4f}, ~{model.duration_s:.1f}s "
+                     f"({model.test_cases_with_history} test case(s) projected from history)")
+    lines.append(f"Total: ~${estimate.cost:.4f}, ~{estimate.duration_s:.1f}s")
+    if max_cost is not None and estimate.cost > max_cost:
+        lines.append(f"⚠️ Projected cost exceeds --max-cost ${max_cost:.4f}.")
+    if max_duration is not None and estimate.duration_s > max_duration:
+        lines.append(f"⚠️ Projected duration exceeds --max-duration {max_duration:.1f}s.")
+    return "\n".join(lines)
 
 @click.group()
 @click.version_option(__version__)
@@ -30,18 +52,83 @@ def init(config):
 @click.option('--target', required=True, help='Target model.')
 @click.option('-v', '--verbose', is_flag=True, help='Enable Verbose Mode.')
 @click.option('--config', default='prompt-regress.yml', help='Path to the configuration file.')
-@click.option('--format', default='console', type=click.Choice(['console', 'json']), help='Output format')
+@click.option('--format', default='console', type=click.Choice(['console', 'json', 'jsonl', 'parquet', 'arrow']), help='Output format')
+@click.option('--output', default=None, help='Write the report to this file instead of stdout. Required for parquet and arrow.')
 @click.option('--fail-on-regression', is_flag=True, help='Exit with non-zero code if regressions found')
-def check(baseline, target, verbose, config, format, fail_on_regression):
+@click.option('--fail-fast', is_flag=True, help='Cancel the remaining requests and exit with non-zero code as soon as a test case fails.')
+@click.option('--record', is_flag=True, help='Record every model response to the cassette.')
+@click.option('--replay', is_flag=True, help='Serve model responses from the cassette instead of calling the APIs.')
+@click.option('--cassette', default=None, help='Path to the cassette file. Defaults to .prompt-regress/cassette.jsonl.')
+@click.option('--on-miss', default='fail', type=click.Choice(['fail', 'live']), help='On a replay miss, fail or call the live API.')
+@click.option('--changed-only', is_flag=True, help='Only re-run test cases that changed since the last run.')
+@click.option('--no-history', is_flag=True, help='Do not record this run in the results history.')
+@click.option('--dry-run', is_flag=True, help='Only project token usage, cost and duration, without calling any model.')
+@click.option('--max-cost', default=None, type=float, help='Cancel the run once it has spent this many USD.')
+@click.option('--max-duration', default=None, type=float, help='Cancel the run once it has taken this many seconds.')
+@click.option('--daemon', default=None, help='Send the run to a `prompt-regress serve` daemon listening on this socket. '
+              'The daemon must serve the same --config. --record, --replay, --cassette and --dry-run are not supported.')
+def check(baseline, target, verbose, config, format, output, fail_on_regression, fail_fast, record, replay, cassette, on_miss, changed_only,
+          no_history, dry_run, max_cost, max_duration, daemon):
     "Compare outputs between two models and check for regressions."
+    if record and replay:
+        click.echo("❌ Error: --record and --replay are mutually exclusive.")
+        exit(1)
+
+    if daemon:
+        if format not in ('console', 'json'):
+            click.echo("❌ Error: Only the console and json formats are supported with --daemon.")
+            exit(1)
+        # The daemon's engine was created with its own cassette settings and a dry run calls no model anyway.
+        unsupported = [flag for flag, value in (('--record', record), ('--replay', replay), ('--cassette', cassette),
+                                                ('--dry-run', dry_run)) if value]
+        if unsupported:
+            click.echo(f"❌ Error: {', '.join(unsupported)} cannot be used with --daemon.")
+            exit(1)
+        try:
+            response = request_run(Path(daemon), baseline, target, format=format, verbose=verbose,
+                                   changed_only=changed_only, fail_fast=fail_fast, max_cost=max_cost,
+                                   max_duration=max_duration, record_history=False if no_history else None,
+                                   config=Path(config))
+        except OSError as e:
+            click.echo(f"❌ Error: Could not reach the daemon at {daemon}: {e}")
+            exit(1)
+        if 'error' in response:
+            click.echo(f"❌ Error: {response['error']}")
+            exit(1)
+        if output:
+            Path(output).write_text(response['report'])
+        else:
+            click.echo(response['report'])
+        if (fail_on_regression or fail_fast) and not response['passed']:
+            click.echo("❌ Regressions found! Exiting with non-zero code.")
+            exit(1)
+        return
+
     try:
-        regress = PromptRegress(Path(config))
-        results = asyncio.run(regress.acompare_models(baseline, target))
-        report = regress.generate_report(results, verbose, format)
+        cassette_mode = 'record' if record else 'replay' if replay else None
+        cassette_path = Path(cassette) if cassette else None
+        regress = PromptRegress(Path(config), cassette_mode=cassette_mode, cassette_path=cassette_path, on_miss=on_miss)
+        if no_history:
+            regress.record_history = False
+
+        if dry_run:
+            estimate = regress.estimate(baseline, target, changed_only=changed_only)
+            click.echo(_format_estimate(estimate, max_cost, max_duration))
+            return
 
-        click.echo(report)
+        results = asyncio.run(regress.acompare_models(baseline, target, changed_only=changed_only,
+                                                      max_cost=max_cost, max_duration=max_duration,
+                                                      fail_fast=fail_fast))
+        if format in ('jsonl', 'parquet', 'arrow'):
+            regress.write_report(results, Path(output) if output else None, format)
+        else:
+            report = regress.generate_report(results, verbose, format)
+            if output:
+                Path(output).write_text(report)
+            else:
+                click.echo(report)
 
-        if fail_on_regression:
+        if (fail_on_regression or fail_fast) and not all(result.passed for result in results):
             click.echo("❌ Regressions found! Exiting with non-zero code.")
             exit(1)
     except Exception as e:
@@ -54,8 +141,7 @@ def models(config):
     """List all configured models."""
     try:
         regress = PromptRegress(Path(config))
-        config = regress.load_config()
-        models = config.get('models', [])
+        models = regress.config.get('models', [])
         if not models:
             click.echo("⚠️ No models found in the configuration.")
         else:
@@ -72,8 +158,7 @@ def tests(config):
     """List all configured test cases."""
     try:
         regress = PromptRegress(Path(config))
-        config = regress.load_config()
-        test_cases = config.get('test_cases', [])
+        test_cases = regress.config.get('test_cases', [])
         if not test_cases:
             click.echo("⚠️ No test cases found in the configuration.")
         else:
@@ -85,5 +170,82 @@ def tests(config):
         exit(1)
 
 
+@cli.command()
+@click.option('--config', default='prompt-regress.yml', help='Path to the configuration file.')
+@click.option('--socket', 'socket_path', default=None, help='Socket to listen on. Defaults to .prompt-regress/daemon.sock.')
+def serve(config, socket_path):
+    """Keep models and provider clients warm and accept runs over a local socket."""
+    try:
+        regress = PromptRegress(Path(config))
+        socket_path = Path(socket_path) if socket_path else regress.state_dir / 'daemon.sock'
+        click.echo(f"🚀 Serving on {socket_path}. Run `prompt-regress check --daemon {socket_path} ...` to use it.")
+        asyncio.run(PromptRegressDaemon(regress).serve(socket_path))
+    except KeyboardInterrupt:
+        click.echo("👋 Stopped.")
+    except Exception as e:
+        click.echo(f"❌ Error: {e}")
+        exit(1)
+
+@cli.command()
+@click.option('--baseline', required=True, help='Baseline model name.')
+@click.option('--target', required=True, help='Target model.')
+@click.option('-v', '--verbose', is_flag=True, help='Enable Verbose Mode.')
+@click.option('--config', default='prompt-regress.yml', help='Path to the configuration file.')
+@click.option('--format', default='console', type=click.Choice(['console', 'json']), help='Output format')
+@click.option('--interval', default=1.0, show_default=True, help='Seconds between checks of the configuration file.')
+def watch(baseline, target, verbose, config, format, interval):
+    """Re-run the changed test cases whenever the configuration file changes."""
+    def on_report(response):
+        if 'error' in response:
+            click.echo(f"❌ Error: {response['error']}")
+        else:
+            click.echo(response['report'])
+        click.echo(f"👀 Watching {config} for changes...")
+
+    try:
+        regress = PromptRegress(Path(config))
+        asyncio.run(PromptRegressDaemon(regress).watch(baseline, target, on_report, format=format, verbose=verbose,
+                                                        interval=interval))
+    except KeyboardInterrupt:
+        click.echo("👋 Stopped.")
+    except Exception as e:
+        click.echo(f"❌ Error: {e}")
+        exit(1)
+
+@cli.command()
+@click.option('--config', default='prompt-regress.yml', help='Path to the configuration file.')
+@click.option('--metric', default='semantic_similarity', help="Metric to show, e.g. semantic_similarity, passed (pass rate) or target_response_time_ms.")
+@click.option('--test-case', default=None, help='Only include this test case.')
+@click.option('--baseline', default=None, help='Only include runs with this baseline model.')
+@click.option('--target', default=None, help='Only include runs with this target model.')
+@click.option('--last', default=50, show_default=True, help='Number of most recent runs to show.')
+def history(config, metric, test_case, baseline, target, last):
+    """Show the trend of a metric over past runs."""
+    try:
+        config_path = Path(config)
+        parsed = yaml.safe_load(config_path.read_text()) if config_path.exists() else None
+        db_path = resolve_state_dir(config_path, parsed if isinstance(parsed, dict) else {}) / 'history.db'
+        if not db_path.exists():
+            click.echo("⚠️ No history recorded yet. Run `prompt-regress check` first.")
+            return
+
+        store = HistoryStore(db_path)
+        rows = store.trend(metric, test_case=test_case, baseline=baseline, target=target, last=last)
+        store.close()
+        if not rows:
+            click.echo("⚠️ No runs match the given filters.")
+            return
+
+        scope = test_case or 'all test cases'
+        click.echo(f"📈 {metric} for {scope} over the last {len(rows)} run(s):")
+        for row in rows:
+            click.echo(f"   #{row['run_id']:<5} {row['started_at']}  {row['baseline']} → {row['target']}  "
+                       f"mean={_format_value(row['mean'])}  min={_format_value(row['min'])}  max={_format_value(row['max'])}  "
+                       f"(n={row['count']})")
+    except Exception as e:
+        click.echo(f"❌ Error: {e}")
+        exit(1)
+
+
 if __name__ == "__main__":
     cli()
\ No newline at end of file
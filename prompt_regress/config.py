@@ -0,0 +1,277 @@
+import os
+import glob
+import json
+import yaml
+import string
+import hashlib
+
+from pathlib import Path
+from dataclasses import dataclass
+from typing import Dict, Any, List, Optional
+
+# Bump whenever the compiled form changes, so that suites cached by older versions are recompiled.
+COMPILED_VERSION = 2
+# Errors listed when a configuration fails validation; the rest are only counted.
+MAX_REPORTED_ERRORS = 20
+# Metrics that are informational unless a threshold is given.
+OPTIONAL_THRESHOLD_METRICS = ('drift',)
+# State directory, relative to the configuration file, unless `regression_options.state_dir` is set.
+DEFAULT_STATE_DIR = '.prompt-regress'
+
+_Loader = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+
+
+@dataclass
+class CompiledTestCase:
+    """A validated test case with the prompt of every input rendered."""
+    template: str
+    inputs: List[Dict[str, Any]]
+    prompts: List[str]
+
+
+@dataclass
+class CompiledSuite:
+    """A validated configuration and the rendered prompts of all its test cases."""
+    config: Dict[str, Any]
+    test_cases: Dict[str, CompiledTestCase]
+    digest: str
+
+    def prompts(self, test_case: dict) -> Optional[List[str]]:
+        """
+        Get the pre-rendered prompts of a test case.
+
+        Args:
+            test_case (dict): Test case configuration.
+
+        Returns:
+            Optional[List[str]]: The prompts, or None if the test case is not part of the suite
+                                 or its template or inputs changed since it was compiled.
+        """
+        compiled = self.test_cases.get(test_case.get('name'))
+        if compiled is None or compiled.template != test_case.get('prompt_template'):
+            return None
+        # A deep comparison: the configuration may have been edited since the suite was compiled.
+        if compiled.inputs != test_case.get('inputs'):
+            return None
+        return compiled.prompts
+
+
+def render_prompt(template: str, input_data: Dict[str, Any]) -> str:
+    """
+    Render a prompt template with the values of one input.
+
+    Args:
+        template (str): Prompt template with `{name}` placeholders.
+        input_data (Dict[str, Any]): Values of the placeholders.
+
+    Returns:
+        str: The rendered prompt.
+    """
+    try:
+        return template.format(**input_data)
+    except KeyError as e:
+        raise ValueError(f"missing value for placeholder {e}")
+    except IndexError:
+        raise ValueError("positional placeholders ('{}' or '{0}') are not supported, name them")
+    except (AttributeError, TypeError, ValueError) as e:
+        raise ValueError(str(e))
+
+
+def compile_config(config: Optional[Dict[str, Any]], digest: str = '') -> CompiledSuite:
+    """
+    Validate a configuration and render the prompts of all test cases.
+
+    Every problem is collected before raising, so a broken configuration is reported at
+    once and before any model is called.
+
+    Args:
+        config (Optional[Dict[str, Any]]): Parsed configuration. None (an empty file) is an empty configuration.
+        digest (str): Hash of the configuration file.
+
+    Returns:
+        CompiledSuite: The validated configuration and its prompts.
+    """
+    if config is None:
+        config = {}
+    if not isinstance(config, dict):
+        raise ValueError("Invalid configuration: the file must contain a mapping.")
+
+    errors = []
+    test_cases = {}
+    for position, test_case in enumerate(config.get('test_cases') or []):
+        if not isinstance(test_case, dict) or not test_case.get('name'):
+            errors.append(f"test case #{position + 1} has no name")
+            continue
+        name = test_case['name']
+        if name in test_cases:
+            errors.append(f"test case '{name}' is defined more than once")
+            continue
+        template = test_case.get('prompt_template')
+        inputs = test_case.get('inputs')
+        if not isinstance(template, str):
+            errors.append(f"test case '{name}' has no prompt_template")
+            continue
+        if not isinstance(inputs, list):
+            errors.append(f"test case '{name}' has no list of inputs")
+            continue
+        try:
+            list(string.Formatter().parse(template))
+        except ValueError as e:
+            errors.append(f"test case '{name}': invalid prompt_template: {e}")
+            continue
+
+        prompts = []
+        for index, input_data in enumerate(inputs):
+            if not isinstance(input_data, dict):
+                errors.append(f"test case '{name}', input {index + 1}: not a mapping")
+                continue
+            try:
+                prompts.append(render_prompt(template, input_data))
+            except ValueError as e:
+                errors.append(f"test case '{name}', input {index + 1}: {e}")
+        test_cases[name] = CompiledTestCase(template=template, inputs=inputs, prompts=prompts)
+
+    for name, options in (config.get('metrics') or {}).items():
+        if name in OPTIONAL_THRESHOLD_METRICS:
+            continue
+        if not isinstance(options, dict) or not isinstance(options.get('threshold'), (int, float)):
+            errors.append(f"metric '{name}' has no numeric threshold")
+
+    if errors:
+        listed = "\n".join(f"  - {error}" for error in errors[:MAX_REPORTED_ERRORS])
+        more = f"\n  ... and {len(errors) - MAX_REPORTED_ERRORS} more" if len(errors) > MAX_REPORTED_ERRORS else ""
+        raise ValueError(f"Invalid configuration ({len(errors)} error(s)):\n{listed}{more}")
+    return CompiledSuite(config=config, test_cases=test_cases, digest=digest)
+
+
+def resolve_state_dir(config_path: Path, config: Dict[str, Any]) -> Path:
+    """
+    Get the directory holding the results, history and caches of a configuration.
+
+    Args:
+        config_path (Path): Path to the configuration file.
+        config (Dict[str, Any]): The parsed configuration.
+
+    Returns:
+        Path: `regression_options.state_dir`, or `.prompt-regress`, relative to the configuration file.
+    """
+    options = config.get('regression_options') or {}
+    return Path(config_path).parent / options.get('state_dir', DEFAULT_STATE_DIR)
+
+
+def load_suite(config_path: Path, cache_dir: Optional[Path] = None, cache_in_state_dir: bool = False) -> CompiledSuite:
+    """
+    Load and compile a configuration file, reusing the compiled form of an unchanged file.
+
+    The compiled suite is cached under the hash of the file contents, so later runs on the
+    same file skip parsing, validation and rendering.
+
+    With `cache_in_state_dir`, the suite is cached in the `compiled` directory of the state
+    directory the configuration itself selects. The default state directory is looked up
+    before parsing; a configuration that moves it is parsed on every load, since only then is
+    its state directory known, but still skips validation and rendering.
+
+    Args:
+        config_path (Path): Path to the configuration file.
+        cache_dir (Optional[Path]): Directory of compiled suites.
+        cache_in_state_dir (bool): Cache in the configuration's state directory instead of `cache_dir`.
+                                   Nothing is cached if neither is given.
+
+    Returns:
+        CompiledSuite: The validated configuration and its prompts.
+    """
+    config_path = Path(config_path)
+    content = config_path.read_bytes()
+    digest = hashlib.sha256(content).hexdigest()
+
+    if cache_in_state_dir:
+        cache_dir = config_path.parent / DEFAULT_STATE_DIR / 'compiled'
+    cache_path = _cache_path(cache_dir, config_path, digest) if cache_dir is not None else None
+    suite = _load_cached(cache_path, digest) if cache_path is not None else None
+    if suite is not None:
+        return suite
+
+    try:
+        config = yaml.load(content, Loader=_Loader)
+    except yaml.YAMLError as e:
+        raise ValueError(f"Error parsing configuration file: {e}")
+
+    if cache_in_state_dir and isinstance(config, dict):
+        state_cache_path = _cache_path(resolve_state_dir(config_path, config) / 'compiled', config_path, digest)
+        if state_cache_path != cache_path:
+            cache_path = state_cache_path
+            suite = _load_cached(cache_path, digest)
+            if suite is not None:
+                return suite
+    suite = compile_config(config, digest)
+
+    if cache_path is not None:
+        _save_suite(suite, cache_path, config_path.name)
+    return suite
+
+
+def _cache_path(cache_dir: Path, config_path: Path, digest: str) -> Path:
+    """Path of the compiled form of a configuration file with the given contents."""
+    return Path(cache_dir) / f"{config_path.name}-{digest[:32]}.v{COMPILED_VERSION}.json"
+
+
+def _load_cached(cache_path: Path, digest: str) -> Optional[CompiledSuite]:
+    """
+    Read a compiled suite, or return None if there is no usable one.
+
+    The cache is plain JSON, so a crafted file can at worst hold wrong prompts for its
+    digest, and nothing in it is used before the digest and version match.
+    """
+    try:
+        with open(cache_path, 'r', encoding='utf-8') as file:
+            data = json.load(file)
+        if not isinstance(data, dict) or data.get('version') != COMPILED_VERSION or data.get('digest') != digest:
+            return None
+        config, prompts = data['config'], data['prompts']
+        test_cases = {}
+        for test_case in config.get('test_cases') or []:
+            name = test_case['name']
+            if not isinstance(prompts[name], list) or not all(isinstance(prompt, str) for prompt in prompts[name]):
+                raise ValueError(f"prompts of test case '{name}' are not strings")
+            # Inputs are shared with the configuration, as in `compile_config`.
+            test_cases[name] = CompiledTestCase(template=test_case['prompt_template'], inputs=test_case['inputs'],
+                                                prompts=prompts[name])
+        return CompiledSuite(config=config, test_cases=test_cases, digest=digest)
+    except FileNotFoundError:
+        pass
+    except Exception as e:
+        print(f"⚠️ Ignoring unreadable compiled configuration {cache_path}: {e}")
+    return None
+
+
+def _save_suite(suite: CompiledSuite, cache_path: Path, name: str):
+    """Write a compiled suite atomically and remove the compiled forms of older versions of the file."""
+    data = {
+        'version': COMPILED_VERSION,
+        'digest': suite.digest,
+        'config': suite.config,
+        'prompts': {test_case: compiled.prompts for test_case, compiled in suite.test_cases.items()},
+    }
+    try:
+        content = json.dumps(data)
+    except (TypeError, ValueError):
+        # YAML values without a JSON form (e.g. dates); such configurations are compiled on every load.
+        return
+    if json.loads(content) != data:
+        # JSON would change the configuration, e.g. turn non-string mapping keys into strings.
+        return
+
+    try:
+        cache_path.parent.mkdir(parents=True, exist_ok=True)
+        pattern = f"{glob.escape(name)}-{'[0-9a-f]' * 32}.v*"
+        # Version 1 caches were pickles; they are removed but never read.
+        for stale in [*cache_path.parent.glob(f"{pattern}.json"), *cache_path.parent.glob(f"{pattern}.pickle")]:
+            if stale != cache_path:
+                stale.unlink(missing_ok=True)
+        # Concurrent processes (e.g. pytest-xdist workers) may compile the same file at once.
+        temporary = cache_path.with_suffix(f".{os.getpid()}.tmp")
+        with open(temporary, 'w', encoding='utf-8') as file:
+            file.write(content)
+        os.replace(temporary, cache_path)
+    except OSError as e:
+        print(f"⚠️ Could not cache the compiled configuration: {e}")
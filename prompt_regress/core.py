@@ -1,38 +1,124 @@
+import sys
 import yaml
 import json
 import asyncio
+import hashlib
+import tempfile
+import threading
 
-from typing import Dict, Any, List
+try:
+    import fcntl
+except ImportError:  # Windows: no cross-process locking
+    fcntl = None
+
+from typing import Dict, Any, List, Optional
 from pathlib import Path
-from dataclasses import dataclass, asdict
-from .models import OpenAIProvider, AnthropicProvider, LocalProvider, ModelProvider
-from .metrics import SimilarityMetrics
-
-@dataclass
-class ComparisonResult:
-    """Class to hold the results of a model comparison."""
-    test_case: str
-    prompt: str
-    baseline_output: str
-    target_output: str
-    text_similarity: float  
-    semantic_similarity: float
-    passed: bool
+from dataclasses import asdict
+from .results import ComparisonResult, ResultTable
+from .config import CompiledSuite, load_suite, render_prompt, resolve_state_dir
+from .history import HistoryStore
+from .budget import Budget, BudgetExceededError, gather_or_cancel
+from .estimate import RunEstimate, estimate_run
+from .scheduler import Job, FailFast, expected_duration_ms, order_jobs
+from .models import OpenAIProvider, AnthropicProvider, LocalProvider, ModelProvider, ModelResponse, Cassette, CassetteProvider, static_prefix
+from .metrics import SimilarityMetrics, JSONMetrics, LexicalMetrics
+from .metrics.lexical import LEXICAL_METRICS
+from .metrics.drift import DriftIndex, cluster_embeddings
+from .metrics.structured import parse_json, INVALID
 
 class PromptRegress:
-    def __init__(self, config_path: Path):
+    def __init__(self, config_path: Path, cassette_mode: Optional[str] = None, cassette_path: Optional[Path] = None,
+                 on_miss: str = 'fail'):
         """
         Initialize the Prompt Regress instance with a configuration file.
 
         Args:
             config_path (str): Path to the configuration file.
+            cassette_mode (Optional[str]): 'record' to capture all responses to a cassette, 'replay' to serve
+                                           them from it, or None to always call the providers.
+            cassette_path (Optional[Path]): Path to the cassette file. Defaults to `cassette.jsonl` in the
+                                            state directory.
+            on_miss (str): In replay mode, 'fail' on a request that was not recorded or fall through to the
+                           'live' provider.
         """
-        self.config_path = config_path
-        self.config = self.load_config()
+        self.config_path = Path(config_path)
+        self.metrics = None
+        self._providers: Dict[str, ModelProvider] = {}
+        self._providers_loop: Optional[asyncio.AbstractEventLoop] = None
+        self.suite = self.load_suite()
+        self.config = self.suite.config
+        self._apply_config()
+        self._history = None
+        self._runner: Optional[asyncio.Runner] = None
+        self._scoring_lock = threading.Lock()
+
+        self.cassette_mode = cassette_mode
+        self.on_miss = on_miss
+        self.cassette = None
+        if cassette_mode is not None:
+            self.cassette = Cassette(cassette_path or self.state_dir / 'cassette.jsonl')
+
+    def _apply_config(self):
+        """Set up the options, metrics and providers that depend on the loaded configuration."""
         self.regression_options = self.config.get('regression_options', {})
         self.max_concurrency = self.regression_options.get('max_concurrency', 5)
+        self.state_dir = resolve_state_dir(self.config_path, self.config)
+        self.record_history = self.regression_options.get('history', True)
+        self.prompt_caching = self.regression_options.get('prompt_caching', False)
+
         embedding_model = self.regression_options.get('embedding_model', 'Qwen/Qwen3-Embedding-0.6B')
-        self.metrics = SimilarityMetrics(embedding_model=embedding_model)
+        chunking = ((self.config.get('metrics') or {}).get('semantic_similarity') or {}).get('chunking') or {}
+        metrics_options = {
+            'embedding_model': embedding_model,
+            'chunk_tokens': chunking.get('max_tokens') if chunking else None,
+            'chunk_overlap': chunking.get('overlap', 0),
+            'pooling': chunking.get('pooling', 'mean'),
+            'encode_workers': self.regression_options.get('encode_workers', 0)
+        }
+        # Keep an already loaded embedding model unless its settings changed.
+        if self.metrics is None or self._metrics_options != metrics_options:
+            if self.metrics is not None and hasattr(self.metrics, 'close'):
+                self.metrics.close()
+            self.metrics = SimilarityMetrics(**metrics_options)
+            self._metrics_options = metrics_options
+            if metrics_options['encode_workers'] > 1:
+                # The encode pool forks this process, which must happen before scoring threads exist.
+                self.metrics.start()
+
+        bleu = (self.config.get('metrics') or {}).get('bleu') or {}
+        self.lexical_metrics = LexicalMetrics(max_order=bleu.get('max_order', 4))
+        self._drift_indexes: Dict[str, DriftIndex] = {}
+
+    def reload_config(self) -> bool:
+        """
+        Re-read the configuration file, keeping the embedding model and provider clients
+        loaded where their settings did not change.
+
+        Returns:
+            bool: True if the configuration changed.
+        """
+        suite = self.load_suite()
+        if suite.config == self.config:
+            return False
+
+        self.suite = suite
+        self.config = suite.config
+        self._apply_config()
+        return True
+
+    def load_suite(self) -> CompiledSuite:
+        """
+        Load the configuration file, validated and with all prompts rendered.
+
+        The compiled suite is cached in the `compiled` directory of the state directory, so an
+        unchanged file is loaded without validating or rendering it again.
+
+        Returns:
+            CompiledSuite: The configuration and its prompts.
+        """
+        if not self.config_path.exists():
+            self._create_default_config()
+        return load_suite(self.config_path, cache_in_state_dir=True)
 
     def load_config(self):
         """
@@ -41,14 +127,7 @@ class PromptRegress:
         Returns:
             dict: Configuration data.
         """
-        if not self.config_path.exists():
-            return self._create_default_config()
-        
-        try:
-            with open(self.config_path, 'r') as file:
-                return yaml.safe_load(file)
-        except yaml.YAMLError as e:
-            raise ValueError(f"Error parsing configuration file: {e}")
+        return self.load_suite().config
         
     def _create_default_config(self):
         """Create a default configuration."""
@@ -124,11 +203,7 @@ class PromptRegress:
         Returns:
             True or False
         """
-        try:
-            json.loads(result)
-            return True
-        except json.JSONDecodeError:
-            return False
+        return parse_json(result) is not INVALID
     
     def _get_provider(self, model_config: Dict[str, Any]) -> ModelProvider:
         """
@@ -141,62 +216,489 @@ class PromptRegress:
             ModelProvider: An instance of the provider class.
         """
 
+        # Providers (and their connection pools) are reused across runs of the same model configuration
+        # on the same event loop. Their semaphores and async clients are bound to the loop they first
+        # ran on, so a run on a new loop (e.g. another `asyncio.run`) starts with fresh providers.
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            loop = None
+        if loop is not self._providers_loop:
+            self._providers = {}
+            self._providers_loop = loop
+        key = json.dumps({'model': model_config, 'max_concurrency': self.max_concurrency}, sort_keys=True, default=str)
+        if key not in self._providers:
+            self._providers[key] = self._create_provider(model_config)
+        return self._providers[key]
+
+    def _create_provider(self, model_config: Dict[str, Any]) -> ModelProvider:
+        """
+        Create the provider of a model, wrapped in a cassette provider when recording or replaying.
+
+        Args:
+            model_config (Dict[str, Any]): Model configuration containing provider information.
+
+        Returns:
+            ModelProvider: An instance of the provider class.
+        """
         provider_name = model_config['provider']
-        
+
+        if self.cassette is not None:
+            if provider_name not in ('openai', 'anthropic', 'local'):
+                raise ValueError(f"Unsupported provider: {provider_name}")
+            provider = None
+            if self.cassette_mode == 'record' or self.on_miss == 'live':
+                provider = self._get_live_provider(model_config)
+            return CassetteProvider(self.cassette, provider_name, provider, mode=self.cassette_mode, on_miss=self.on_miss)
+
+        return self._get_live_provider(model_config)
+
+    def _get_live_provider(self, model_config: Dict[str, Any]) -> ModelProvider:
+        """
+        Create the provider that talks to the model's API.
+
+        Args:
+            model_config (Dict[str, Any]): Model configuration containing provider information.
+
+        Returns:
+            ModelProvider: An instance of the provider class.
+        """
+        provider_name = model_config['provider']
+
         if provider_name == 'openai':
-            provider = OpenAIProvider(model=model_config['name'], max_concurrency=self.max_concurrency)
+            provider = OpenAIProvider(model=model_config['name'], max_concurrency=self.max_concurrency,
+                                      pricing=model_config.get('pricing'))
         elif provider_name == 'anthropic':
-            provider = AnthropicProvider(max_concurrency=self.max_concurrency)
+            provider = AnthropicProvider(max_concurrency=self.max_concurrency, pricing=model_config.get('pricing'))
         elif provider_name == 'local':
-            if 'host' not in model_config:
+            if 'host' not in model_config and 'hosts' not in model_config:
                 print("⚠️ Specified Local provider but 'host' not provided in model configuration. Using default 'http://localhost:11434'.")
-            provider = LocalProvider(host=model_config.get('host', "http://localhost:11434"), max_concurrency=self.max_concurrency)
+            host = model_config.get('hosts') or model_config.get('host', "http://localhost:11434")
+            provider = LocalProvider(host=host, max_concurrency=self.max_concurrency,
+                                     pricing=model_config.get('pricing'), keep_alive=model_config.get('keep_alive'))
         else:
             raise ValueError(f"Unsupported provider: {provider_name}")
         
         return provider
     
-    async def arun_test_case(self, test_case: dict, model_config: Dict[str, Any]):
+    def _render_prompts(self, test_case: dict) -> List[str]:
+        """
+        Render the prompt of every input of a test case.
+
+        Args:
+            test_case (dict): Test case configuration.
+
+        Returns:
+            List[str]: One prompt per input, pre-rendered when the configuration was compiled.
+        """
+        prompts = self.suite.prompts(test_case)
+        if prompts is not None:
+            return prompts
+        try:
+            return [render_prompt(test_case['prompt_template'], input_data) for input_data in test_case['inputs']]
+        except ValueError as e:
+            raise ValueError(f"Invalid test case '{test_case.get('name')}': {e}")
+
+    def _cache_prefix(self, test_case: dict) -> Optional[str]:
+        """
+        Get the static prefix of a test case's prompts to cache on the provider side.
+
+        Args:
+            test_case (dict): Test case configuration.
+
+        Returns:
+            Optional[str]: The text before the first placeholder of the template, or None if
+                           prompt caching is off for the test case or the template starts with a placeholder.
+        """
+        if not test_case.get('prompt_caching', self.prompt_caching):
+            return None
+        return static_prefix(test_case['prompt_template']) or None
+
+    def _get_model_configs(self, baseline: str, target: str):
+        """Look up the configurations of the baseline and target models."""
+        baseline_config = next((m for m in self.config['models'] if m['name'] == baseline), None)
+        target_config = next((m for m in self.config['models'] if m['name'] == target), None)
+        if baseline_config is None or target_config is None:
+            raise ValueError(f"⚠️ One or both models not found in configuration. Provided models: baseline={baseline}, target={target}")
+        return baseline_config, target_config
+
+    def estimate(self, baseline: str, target: str, changed_only: bool = False) -> RunEstimate:
+        """
+        Project the token usage, cost and wall time of comparing two models, without calling them.
+
+        Args:
+            baseline (str): Baseline model name.
+            target (str): Target model name.
+            changed_only (bool): Only count the test cases whose fingerprint changed since the last run,
+                                 like `acompare_models` would re-run.
+
+        Returns:
+            RunEstimate: The projection for the run.
+        """
+        baseline_config, target_config = self._get_model_configs(baseline, target)
+        test_cases = self.config.get('test_cases', [])
+        if changed_only:
+            previous = self._load_previous_results(baseline, target)
+            changed = [
+                tc for tc in test_cases
+                if previous.get(tc['name'], {}).get('fingerprint') != self._fingerprint(tc, baseline_config, target_config)
+            ]
+            if len(changed) < len(test_cases):
+                print(f"♻️ Not counting {len(test_cases) - len(changed)} unchanged test case(s).")
+            test_cases = changed
+        prompts_by_case = {tc['name']: self._render_prompts(tc) for tc in test_cases}
+        history = self.history if (self.state_dir / 'history.db').exists() else None
+        return estimate_run([baseline_config, target_config], prompts_by_case, self.max_concurrency, history=history)
+
+    async def arun_test_case(self, test_case: dict, model_config: Dict[str, Any], budget: Optional[Budget] = None):
         """
         Asynchronously run a test case against a specified model.
 
         Args:
             test_case (dict): Test case configuration.
             model_config (Dict[str, Any]): Model configuration.
+            budget (Optional[Budget]): Cost budget checked before and after every request.
 
         Returns:
             dict: Results of the test case execution.
         """
+        prompts = self._render_prompts(test_case)
+        cache_prefix = self._cache_prefix(test_case)
+        return await gather_or_cancel(self._agenerate(model_config, prompt, budget, cache_prefix) for prompt in prompts)
+
+    async def _agenerate(self, model_config: Dict[str, Any], prompt: str, budget: Optional[Budget] = None,
+                         cache_prefix: Optional[str] = None) -> ModelResponse:
+        """Send one prompt to a model, checking the cost budget before and after the request."""
         provider = self._get_provider(model_config)
+        if budget is not None:
+            budget.check()
+        kwargs = dict(model_config.get('parameters', {}))
+        if cache_prefix:
+            kwargs['cache_prefix'] = cache_prefix
+        response = await provider.agenerate(prompt, model=model_config['name'], **kwargs)
+        if budget is not None:
+            budget.add(response.cost)
+        return response
+      
+    def _fingerprint(self, test_case: dict, baseline_config: Dict[str, Any], target_config: Dict[str, Any]) -> str:
+        """
+        Compute the fingerprint of a test case run. It changes whenever the template, inputs,
+        either model configuration, the metric thresholds or the JSON Schema file change.
+
+        Args:
+            test_case (dict): Test case configuration.
+            baseline_config (Dict[str, Any]): Baseline model configuration.
+            target_config (Dict[str, Any]): Target model configuration.
+
+        Returns:
+            str: A hex digest of the test case run.
+        """
+        fingerprinted = {
+            'test_case': test_case,
+            'baseline': baseline_config,
+            'target': target_config,
+            'metrics': self.config.get('metrics', {})
+        }
+        if isinstance(test_case.get('json_schema'), str):
+            # The test case only names the schema file; its contents decide the results.
+            try:
+                fingerprinted['json_schema'] = self._load_json_schema(test_case)
+            except (OSError, ValueError):
+                fingerprinted['json_schema'] = None
+        payload = json.dumps(fingerprinted, sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def _results_path(self, baseline: str, target: str) -> Path:
+        """Path of the file holding the last results of a baseline/target pair."""
+        pair = hashlib.sha256(f"{baseline}\0{target}".encode('utf-8')).hexdigest()[:16]
+        return self.state_dir / 'results' / f"{pair}.json"
+
+    def _load_previous_results(self, baseline: str, target: str) -> Dict[str, Any]:
+        """
+        Load the last persisted results of a baseline/target pair.
+
+        Args:
+            baseline (str): Baseline model name.
+            target (str): Target model name.
+
+        Returns:
+            Dict[str, Any]: Mapping of test case name to its fingerprint and results.
+        """
+        path = self._results_path(baseline, target)
+        if not path.exists():
+            return {}
+
+        try:
+            with open(path, 'r') as file:
+                return json.load(file).get('test_cases', {})
+        except (json.JSONDecodeError, OSError):
+            print(f"⚠️ Could not read previous results at {path}. Re-running all test cases.")
+            return {}
+
+    def _save_results(self, baseline: str, target: str, test_cases: Dict[str, Any], keep: Optional[set] = None):
+        """
+        Merge results of a baseline/target pair into its results file, together with their fingerprints.
 
-        prompts = []
-        for input_data in test_case['inputs']:
-            prompt = test_case['prompt_template'].format(**input_data)
-            prompts.append(prompt)
+        The file is re-read and rewritten under an exclusive lock, so processes that run other test
+        cases of the same pair at the same time (e.g. pytest-xdist workers) do not lose each other's results.
 
-        tasks = []
-        for prompt in prompts:
-            task = provider.agenerate(prompt, model=model_config['name'], **model_config.get('parameters', {}))
-            tasks.append(task)
-        results = await asyncio.gather(*tasks)
+        Args:
+            baseline (str): Baseline model name.
+            target (str): Target model name.
+            test_cases (Dict[str, Any]): Mapping of test case name to its fingerprint and results, added
+                                         to or replacing the saved ones.
+            keep (Optional[set]): Names of the test cases whose saved results are kept. Defaults to all.
+        """
+        path = self._results_path(baseline, target)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path.with_suffix('.lock'), 'w') as lock:
+            if fcntl is not None:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+            saved = self._load_previous_results(baseline, target)
+            if keep is not None:
+                saved = {name: entry for name, entry in saved.items() if name in keep}
+            saved.update(test_cases)
+            with tempfile.NamedTemporaryFile('w', dir=path.parent, suffix='.tmp', delete=False) as file:
+                json.dump({'baseline': baseline, 'target': target, 'test_cases': saved}, file)
+            Path(file.name).replace(path)
+
+    def _score_test_case(self, test_case: dict, baseline_results: List[ModelResponse],
+                         target_results: List[ModelResponse]) -> List[ComparisonResult]:
+        """
+        Score the baseline and target outputs of a test case against the configured metrics.
+
+        For `expect_json` test cases with a `json_similarity` metric configured, outputs are
+        compared structurally and the text, embedding and lexical similarities are skipped.
+        All configured lexical metrics share one tokenization of the outputs.
+
+        With a `drift` metric configured, every target output is also scored against its nearest
+        previously accepted outputs, failing outputs are clustered, and passing outputs are added
+        to the test case's drift index. Drift embeddings follow the `semantic_similarity` chunking
+        settings, so long outputs are not truncated.
+
+        Args:
+            test_case (dict): Test case configuration.
+            baseline_results (List[ModelResponse]): Baseline responses, one per input.
+            target_results (List[ModelResponse]): Target responses, one per input.
+
+        Returns:
+            List[ComparisonResult]: One result per input.
+        """
+        metrics = self.config['metrics']
+        baseline_texts = [result.text for result in baseline_results]
+        target_texts = [result.text for result in target_results]
+        count = len(baseline_texts)
+
+        expect_json = test_case.get('expect_json', False)
+        structural = expect_json and 'json_similarity' in metrics
+
+        text_similarities = [None] * count
+        semantic_similarities = [None] * count
+        json_similarities = [None] * count
+        json_diffs = [None] * count
+        drift_similarities = [None] * count
+        drift = metrics.get('drift')
+        target_embeddings = None
+        if drift is not None and not structural:
+            target_embeddings = self.metrics.embed(target_texts)
+            drift_index = self._drift_index(test_case['name'], target_embeddings.shape[1])
+            neighbours, _ = drift_index.query(target_embeddings.cpu().numpy(), k=drift.get('k', 5))
+            if neighbours.shape[1]:
+                drift_similarities = neighbours.mean(axis=1)
+        if 'text_similarity' in metrics and not structural:
+            text_similarities = self.metrics.text_similarity(baseline_texts, target_texts)
+        if 'semantic_similarity' in metrics and not structural:
+            if target_embeddings is not None:
+                semantic_similarities = self.metrics.semantic_similarity(baseline_texts, target_texts,
+                                                                         target_embeddings=target_embeddings)
+            else:
+                semantic_similarities = self.metrics.semantic_similarity(baseline_texts, target_texts)
+        lexical = {}
+        lexical_names = [name for name in LEXICAL_METRICS if name in metrics]
+        if lexical_names and not structural:
+            lexical = self.lexical_metrics.compute(baseline_texts, target_texts, metrics=lexical_names)
+        if expect_json:
+            json_metrics = JSONMetrics(schema=self._load_json_schema(test_case))
+            scores, baseline_valid, target_valid, diffs = json_metrics.compare(baseline_texts, target_texts)
+            if structural:
+                json_similarities = scores
+                json_diffs = [self._format_json_diff(diff) for diff in diffs]
+
+        results = []
+        for res_idx, (baseline_result, target_result) in enumerate(zip(baseline_results, target_results)):
+            metric_results = []
+            if text_similarities[res_idx] is not None:
+                metric_results.append(text_similarities[res_idx] >= metrics['text_similarity']['threshold'])
+            if semantic_similarities[res_idx] is not None:
+                metric_results.append(semantic_similarities[res_idx] >= metrics['semantic_similarity']['threshold'])
+            if json_similarities[res_idx] is not None:
+                metric_results.append(json_similarities[res_idx] >= metrics['json_similarity']['threshold'])
+            for name, scores in lexical.items():
+                metric_results.append(scores[res_idx] >= metrics[name]['threshold'])
+            if drift_similarities[res_idx] is not None and drift.get('threshold') is not None:
+                metric_results.append(drift_similarities[res_idx] >= drift['threshold'])
+            if expect_json:
+                metric_results.extend([baseline_valid[res_idx], target_valid[res_idx]])
+
+            passed = all(metric_results) if metric_results else False
+
+            results.append(ComparisonResult(
+                test_case=test_case['name'],
+                prompt=baseline_result.prompt,
+                baseline_output=baseline_result.text,
+                target_output=target_result.text,
+                text_similarity=self._optional_float(text_similarities[res_idx]),
+                semantic_similarity=self._optional_float(semantic_similarities[res_idx]),
+                passed=bool(passed),
+                baseline_response_time_ms=float(baseline_result.response_time_ms or 0),
+                target_response_time_ms=float(target_result.response_time_ms or 0),
+                baseline_cost=float(baseline_result.cost or 0),
+                target_cost=float(target_result.cost or 0),
+                baseline_output_tokens=int(baseline_result.metadata.get('output_tokens', 0)),
+                target_output_tokens=int(target_result.metadata.get('output_tokens', 0)),
+                baseline_input_tokens=int(baseline_result.metadata.get('input_tokens', 0)),
+                target_input_tokens=int(target_result.metadata.get('input_tokens', 0)),
+                baseline_cached_input_tokens=int(baseline_result.metadata.get('cached_input_tokens', 0)),
+                target_cached_input_tokens=int(target_result.metadata.get('cached_input_tokens', 0)),
+                json_similarity=self._optional_float(json_similarities[res_idx]),
+                json_diff=json_diffs[res_idx],
+                drift_similarity=self._optional_float(drift_similarities[res_idx]),
+                **{name: float(scores[res_idx]) for name, scores in lexical.items()}
+            ))
+
+        if target_embeddings is not None:
+            embeddings = target_embeddings.cpu().numpy()
+            failed = [idx for idx, result in enumerate(results) if not result.passed]
+            labels = cluster_embeddings(embeddings[failed], drift.get('cluster_threshold', 0.9)) if failed else []
+            for idx, label in zip(failed, labels):
+                results[idx].failure_cluster = failed[label]
+            drift_index.add(embeddings[[idx for idx, result in enumerate(results) if result.passed]])
         return results
-      
-    async def acompare_models(self, baseline: str, target: str) -> List[ComparisonResult]:
+
+    async def _ascore_test_case(self, test_case: dict, baseline_results: List[ModelResponse],
+                                target_results: List[ModelResponse]) -> List[ComparisonResult]:
+        """
+        Score a test case in a worker thread, so that encoding its outputs does not hold up the
+        dispatch and the latency measurements of the requests still in flight.
+
+        Test cases are scored one at a time, since the embedding model and the drift indexes are
+        not shared between threads. See `_score_test_case` for the arguments.
+        """
+        def score():
+            with self._scoring_lock:
+                return self._score_test_case(test_case, baseline_results, target_results)
+        return await asyncio.to_thread(score)
+
+    def _drift_index(self, test_case: str, dimension: int) -> DriftIndex:
+        """
+        Get the index of accepted outputs of a test case, loading it from the state directory on first use.
+
+        Args:
+            test_case (str): Name of the test case.
+            dimension (int): Dimension of the embeddings.
+
+        Returns:
+            DriftIndex: The index.
+        """
+        if test_case not in self._drift_indexes:
+            key = hashlib.sha256(test_case.encode()).hexdigest()[:16]
+            self._drift_indexes[test_case] = DriftIndex(self.state_dir / 'drift' / key,
+                                                        self._metrics_options['embedding_model'], dimension)
+        return self._drift_indexes[test_case]
+
+    @staticmethod
+    def _optional_float(value) -> Optional[float]:
+        return None if value is None else float(value)
+
+    @staticmethod
+    def _format_json_diff(diff: Dict[str, List[str]]) -> Optional[str]:
+        """Summarize a structural JSON diff on one line, or None if both documents match."""
+        parts = [f"{kind}: {', '.join(paths)}" for kind, paths in diff.items() if paths]
+        return "; ".join(parts) or None
+
+    def _load_json_schema(self, test_case: dict) -> Optional[Dict[str, Any]]:
+        """
+        Get the JSON Schema of a test case, given inline or as a path relative to the configuration file.
+
+        Args:
+            test_case (dict): Test case configuration.
+
+        Returns:
+            Optional[Dict[str, Any]]: The schema, or None if the test case has none.
+        """
+        schema = test_case.get('json_schema')
+        if isinstance(schema, str):
+            with open(self.config_path.parent / schema, 'r') as file:
+                schema = json.load(file)
+        return schema
+
+    @property
+    def history(self) -> HistoryStore:
+        """The results database of this configuration, opened on first use."""
+        if self._history is None:
+            self._history = HistoryStore(self.state_dir / 'history.db')
+        return self._history
+
+    def _plan_jobs(self, test_cases: List[dict], model_configs: List[Dict[str, Any]],
+                   previous: Dict[str, Any]) -> List[Job]:
+        """
+        Split test cases into individual requests and order them for dispatch.
+
+        Args:
+            test_cases (List[dict]): Test cases to run.
+            model_configs (List[Dict[str, Any]]): Baseline and target model configurations.
+            previous (Dict[str, Any]): Results of the previous run, see `_load_previous_results`.
+
+        Returns:
+            List[Job]: The requests in dispatch order.
+        """
+        has_history = (self.state_dir / 'history.db').exists()
+        jobs = []
+        for side, model_config in enumerate(model_configs):
+            averages = self.history.model_averages(model_config['name']) if has_history else {}
+            for test_case in test_cases:
+                average_ms = averages.get(test_case['name'], {}).get('response_time_ms')
+                previously_failed = any(not r['passed'] for r in previous.get(test_case['name'], {}).get('results', []))
+                cache_prefix = self._cache_prefix(test_case)
+                for index, prompt in enumerate(self._render_prompts(test_case)):
+                    jobs.append(Job(test_case, model_config, side, index, prompt,
+                                    expected_duration_ms(prompt, model_config, average_ms), previously_failed,
+                                    cache_prefix))
+        return order_jobs(jobs)
+
+    async def acompare_models(self, baseline: str, target: str, changed_only: bool = False,
+                              max_cost: Optional[float] = None, max_duration: Optional[float] = None,
+                              fail_fast: bool = False, test_cases: Optional[List[str]] = None,
+                              warmup: bool = True) -> ResultTable:
         """
         Compare outputs between two models.
 
+        Requests are dispatched one by one, previously failing test cases first and then longest
+        expected latency first, and every test case is scored as soon as both of its sides complete.
+
         Args:
             baseline (str): Baseline model name.
             target (str): Target model name.
+            changed_only (bool): Only re-run test cases whose fingerprint changed since the last run
+                                 and reuse the previous results of the others. Only the re-run test
+                                 cases are recorded in the history.
+            max_cost (Optional[float]): Cancel the run once it has spent this many USD.
+            max_duration (Optional[float]): Cancel the run once it has taken this many seconds.
+            fail_fast (bool): Cancel the outstanding requests as soon as a test case fails. The results
+                              then only include the test cases scored so far, and the run is not
+                              recorded in the history.
+            test_cases (Optional[List[str]]): Only run the test cases with these names.
+            warmup (bool): Warm up the providers before the run. Callers that run a suite piece by
+                           piece, like the pytest plugin, only warm up for the first piece.
+
+        Raises:
+            BudgetExceededError: If the cost or duration budget is exceeded.
 
         Returns:
-            dict: Comparison results.
+            ResultTable: Comparison results, in test case order.
         """
-        baseline_config = next((m for m in self.config['models'] if m['name'] == baseline), None)
-        target_config = next((m for m in self.config['models'] if m['name'] == target), None)
-        if baseline_config is None or target_config is None:
-            raise ValueError(f"⚠️ One or both models not found in configuration. Provided models: baseline={baseline}, target={target}")
-        
+        baseline_config, target_config = self._get_model_configs(baseline, target)
+
         if 'metrics' not in self.config:
             print("⚠️ Metrics are missing in the configuration. Using default metrics text and semantic similarity " \
             "with thresholds 0.7 and 0.8.")
@@ -205,65 +707,224 @@ class PromptRegress:
                 'semantic_similarity': {'threshold': 0.8}
             }
 
-        semaphore = asyncio.Semaphore(self.max_concurrency)
+        all_test_cases = self.config.get('test_cases', [])
+        if test_cases is None:
+            test_cases = all_test_cases
+        else:
+            unknown = set(test_cases) - {tc['name'] for tc in all_test_cases}
+            if unknown:
+                raise ValueError(f"⚠️ Test case(s) not found in configuration: {', '.join(sorted(unknown))}")
+            test_cases = [tc for tc in all_test_cases if tc['name'] in test_cases]
+        fingerprints = {tc['name']: self._fingerprint(tc, baseline_config, target_config) for tc in test_cases}
+        previous = self._load_previous_results(baseline, target)
 
-        async def run_with_semaphore(test_case, model_config):
-            async with semaphore:
-                return await self.arun_test_case(test_case, model_config)
+        reused = {}
+        if changed_only:
+            reused = {
+                name: entry['results']
+                for name, entry in previous.items()
+                if fingerprints.get(name) == entry['fingerprint']
+            }
+            if reused:
+                print(f"♻️ Reusing previous results for {len(reused)} unchanged test case(s).")
+        to_run = [tc for tc in test_cases if tc['name'] not in reused]
 
-        test_cases = self.config.get('test_cases', [])
+        # Rows are appended as test cases complete; `rows_by_case` locates each test case in the table.
+        table = ResultTable()
+        rows_by_case: Dict[str, range] = {}
+        for name, records in reused.items():
+            start = len(table)
+            table.extend(ComparisonResult(**record) for record in records)
+            rows_by_case[name] = range(start, len(table))
+        stopped = fail_fast and any(not record['passed'] for records in reused.values() for record in records)
+        if to_run and not stopped:
+            if warmup:
+                await self._awarmup([baseline_config, target_config])
+            stopped = await self._arun_jobs(self._plan_jobs(to_run, [baseline_config, target_config], previous),
+                                            table, rows_by_case, max_cost, max_duration, fail_fast)
+        if stopped:
+            print("⏹️ A test case failed. Cancelled the remaining requests (--fail-fast).")
 
-        tasks = []
-        for test_case in test_cases:
-            baseline_task = run_with_semaphore(test_case, baseline_config)
-            target_task = run_with_semaphore(test_case, target_config)
-            tasks.extend([baseline_task, target_task])
+        # Keep the previous results of test cases that were not part of this run.
+        self._save_results(baseline, target, {
+            name: {'fingerprint': fingerprints[name], 'results': list(table.iter_records(rows))}
+            for name, rows in rows_by_case.items()
+        }, keep={tc['name'] for tc in all_test_cases})
 
-        all_results = await asyncio.gather(*tasks)
+        results = table.take(row for test_case in test_cases for row in rows_by_case.get(test_case['name'], ()))
+        # Reused results were recorded by the run that produced them.
+        executed = table.take(row for test_case in to_run for row in rows_by_case.get(test_case['name'], ()))
+        if self.record_history and not stopped and len(executed):
+            self.history.record_run(baseline, target, executed)
 
-        baseline_results_list = all_results[::2]
-        target_results_list = all_results[1::2]
+        # Outputs of an interrupted run are not accepted; the indexes are reloaded from disk instead.
+        if stopped:
+            self._drift_indexes.clear()
+        for drift_index in self._drift_indexes.values():
+            drift_index.save()
 
-        results = []
-        for i, test_case in enumerate(test_cases):
-            baseline_results = baseline_results_list[i]
-            target_results = target_results_list[i]
+        return results
+                            
+    def compare_models(self, baseline: str, target: str, **kwargs) -> ResultTable:
+        """
+        Compare outputs between two models, blocking until the run completes.
 
-            baseline_texts = [result.text for result in baseline_results]
-            target_texts = [result.text for result in target_results]
+        Every call runs on the same event loop, so provider clients and their connection
+        pools are reused across calls. See `acompare_models` for the arguments.
 
-            if 'text_similarity' in self.config['metrics']:
-                text_similarities = self.metrics.text_similarity(baseline_texts, target_texts)
-            if 'semantic_similarity' in self.config['metrics']:
-                semantic_similarities = self.metrics.semantic_similarity(baseline_texts, target_texts)
+        Returns:
+            ResultTable: Comparison results, in test case order.
+        """
+        if self._runner is None:
+            self._runner = asyncio.Runner()
+        return self._runner.run(self.acompare_models(baseline, target, **kwargs))
 
-            for res_idx, (baseline_result, target_result) in enumerate(zip(baseline_results, target_results)):
-                metric_results = []
-                if 'text_similarity' in self.config['metrics']:
-                    metric_results.append(text_similarities[res_idx] >= self.config['metrics']['text_similarity']['threshold'])
-                if 'semantic_similarity' in self.config['metrics']:
-                    metric_results.append(semantic_similarities[res_idx] >= self.config['metrics']['semantic_similarity']['threshold'])
-                if test_case.get('expect_json', False):
-                    is_baseline_valid_json = self._is_valid_json(baseline_result.text)
-                    is_target_valid_json = self._is_valid_json(target_result.text)
-                    metric_results.extend([is_baseline_valid_json, is_target_valid_json])
-
-                passed = all(metric_results) if metric_results else False
-                
-                result = ComparisonResult(
-                    test_case=test_case['name'],
-                    prompt=baseline_result.prompt,
-                    baseline_output=baseline_result.text,
-                    target_output=target_result.text,
-                    text_similarity=text_similarities[res_idx],
-                    semantic_similarity=semantic_similarities[res_idx],
-                    passed=passed
-                )
-
-                results.append(result)
-        return results
-                            
-    def generate_report(self, results, verbose, format='console') -> str:
+    def close(self):
+        """Release the event loop, the encode pool and the history database."""
+        if self._runner is not None:
+            self._runner.close()
+            self._runner = None
+        if hasattr(self.metrics, 'close'):
+            self.metrics.close()
+        if self._history is not None:
+            self._history.close()
+            self._history = None
+
+    async def _awarmup(self, model_configs: List[Dict[str, Any]]):
+        """
+        Warm up the providers of a run before it is timed, e.g. load local models on every host.
+
+        Args:
+            model_configs (List[Dict[str, Any]]): Configurations of the models of the run.
+        """
+        warmups = []
+        for model_config in model_configs:
+            provider = self._get_provider(model_config)
+            if hasattr(provider, 'awarmup'):
+                warmups.append(provider.awarmup(model_config['name'], **model_config.get('parameters', {})))
+        await gather_or_cancel(warmups)
+
+    async def _arun_jobs(self, jobs: List[Job], table: ResultTable, rows_by_case: Dict[str, range],
+                         max_cost: Optional[float], max_duration: Optional[float], fail_fast: bool) -> bool:
+        """
+        Dispatch requests in order and score each test case once all of its requests complete.
+
+        The responses of a test case are dropped as soon as it is scored and its results are
+        appended to `table`, so only the responses of test cases still in flight are held.
+
+        Args:
+            jobs (List[Job]): Requests in dispatch order.
+            table (ResultTable): Receives the results of every scored test case.
+            rows_by_case (Dict[str, range]): Receives the rows of every scored test case in `table`.
+            max_cost (Optional[float]): Cancel the run once it has spent this many USD.
+            max_duration (Optional[float]): Cancel the run once it has taken this many seconds.
+            fail_fast (bool): Cancel the outstanding requests as soon as a test case fails.
+
+        Raises:
+            BudgetExceededError: If the cost or duration budget is exceeded.
+
+        Returns:
+            bool: True if the run was cancelled because a test case failed.
+        """
+        # Each model gets its own `max_concurrency` slots, as the estimates assume.
+        semaphores = [asyncio.Semaphore(self.max_concurrency) for _ in range(2)]
+        budget = Budget(max_cost=max_cost, max_duration=max_duration)
+        responses = {}
+        remaining = {}
+        for job in jobs:
+            name = job.test_case['name']
+            responses.setdefault(name, ([None] * len(job.test_case['inputs']), [None] * len(job.test_case['inputs'])))
+            remaining[name] = remaining.get(name, 0) + 1
+
+        # Semaphore waiters are woken in FIFO order, so the requests of each model are sent in the order of `jobs`.
+        failed = False
+
+        async def run_job(job: Job):
+            nonlocal failed
+            async with semaphores[job.side]:
+                # Requests already waiting for a slot must not start once the run is being cancelled.
+                if failed:
+                    return
+                response = await self._agenerate(job.model_config, job.prompt, budget, job.cache_prefix)
+            name = job.test_case['name']
+            responses[name][job.side][job.index] = response
+            remaining[name] -= 1
+            if remaining[name] == 0:
+                case_results = await self._ascore_test_case(job.test_case, *responses.pop(name))
+                start = len(table)
+                table.extend(case_results)
+                rows_by_case[name] = range(start, len(table))
+                if fail_fast and not all(r.passed for r in case_results):
+                    failed = True
+                    raise FailFast()
+
+        try:
+            async with asyncio.timeout(max_duration):
+                await gather_or_cancel(run_job(job) for job in jobs)
+        except FailFast:
+            return True
+        except TimeoutError:
+            raise BudgetExceededError(f"Duration budget of {max_duration}s exceeded (spent ${budget.spent:.4f}). "
+                                      "Outstanding requests were cancelled.")
+        return False
+
+    def write_report(self, results: ResultTable, output: Optional[Path], format: str = 'jsonl'):
+        """
+        Stream a machine-readable report to a file without building it in memory.
+
+        Args:
+            results (ResultTable): Comparison results.
+            output (Optional[Path]): Destination file. 'jsonl' is written to stdout if omitted.
+            format (str): One of 'jsonl', 'parquet' or 'arrow'.
+        """
+        if format == 'jsonl':
+            if output is None:
+                results.write_jsonl(sys.stdout)
+            else:
+                with open(output, 'w') as file:
+                    results.write_jsonl(file)
+        elif format in ('parquet', 'arrow'):
+            if output is None:
+                raise ValueError(f"An output path is required for the {format} format.")
+            if format == 'parquet':
+                results.write_parquet(output)
+            else:
+                results.write_arrow(output)
+        else:
+            raise ValueError(f"Unknown output format: {format}")
+
+    @staticmethod
+    def _cache_summary(results) -> Optional[str]:
+        """Summarize the share of input tokens served from prompt caches, or None if there were no cache hits."""
+        sides = []
+        for side in ('baseline', 'target'):
+            input_tokens = sum(getattr(r, f'{side}_input_tokens') for r in results)
+            cached_tokens = sum(getattr(r, f'{side}_cached_input_tokens') for r in results)
+            if cached_tokens:
+                sides.append(f"{side} {cached_tokens}/{input_tokens} ({cached_tokens / input_tokens:.0%})")
+        if not sides:
+            return None
+        return "💾 Cached input tokens: " + ", ".join(sides)
+
+    @staticmethod
+    def _failure_clusters(results) -> List[str]:
+        """Describe the clusters of similar failing outputs, largest first, one line each."""
+        clusters: Dict[tuple, List[ComparisonResult]] = {}
+        for result in results:
+            if result.failure_cluster is not None:
+                clusters.setdefault((result.test_case, result.failure_cluster), []).append(result)
+
+        lines = []
+        for (test_case, _), members in sorted(clusters.items(), key=lambda item: -len(item[1])):
+            leader = members[0]
+            prompt = leader.prompt if len(leader.prompt) <= 60 else leader.prompt[:57] + "..."
+            line = f"  {test_case}: {len(members)} failure(s) like {prompt!r}"
+            if leader.drift_similarity is not None:
+                line += f", {leader.drift_similarity:.3f} similar to accepted outputs"
+            lines.append(line)
+        return lines
+
+    def generate_report(self, results, verbose=False, format='console') -> str:
         if format == 'json':
             return json.dumps([asdict(r) for r in results], indent=2)
         
@@ -277,6 +938,15 @@ class PromptRegress:
             
             report.append(f"✅ Passed: {passed_count}/{total_count}")
             report.append(f"❌ Failed: {total_count - passed_count}/{total_count}")
+
+            cache_summary = self._cache_summary(results)
+            if cache_summary:
+                report.append(cache_summary)
+
+            failure_clusters = self._failure_clusters(results)
+            if failure_clusters:
+                report.append("🧩 Failure clusters:")
+                report.extend(failure_clusters)
             
             report.append("")
             
@@ -287,8 +957,24 @@ class PromptRegress:
                     report.append(f"  Prompt: {result.prompt}")
                     report.append(f"  Baseline Output: {result.baseline_output}")
                     report.append(f"  Target Output: {result.target_output}")
-                report.append(f"  Text Similarity: {result.text_similarity:.3f}")
-                report.append(f"  Semantic Similarity: {result.semantic_similarity:.3f}")
+                if result.text_similarity is not None:
+                    report.append(f"  Text Similarity: {result.text_similarity:.3f}")
+                if result.semantic_similarity is not None:
+                    report.append(f"  Semantic Similarity: {result.semantic_similarity:.3f}")
+                if result.json_similarity is not None:
+                    report.append(f"  JSON Similarity: {result.json_similarity:.3f}")
+                if result.rouge_l is not None:
+                    report.append(f"  ROUGE-L: {result.rouge_l:.3f}")
+                if result.bleu is not None:
+                    report.append(f"  BLEU: {result.bleu:.3f}")
+                if result.token_jaccard is not None:
+                    report.append(f"  Token Jaccard: {result.token_jaccard:.3f}")
+                if result.length_ratio is not None:
+                    report.append(f"  Length Ratio: {result.length_ratio:.3f}")
+                if result.drift_similarity is not None:
+                    report.append(f"  Drift Similarity: {result.drift_similarity:.3f}")
+                if verbose and result.json_diff:
+                    report.append(f"  JSON Diff: {result.json_diff}")
                 
                 report.append("")
             
@@ -0,0 +1,171 @@
+import json
+import socket
+import asyncio
+
+from pathlib import Path
+from typing import Dict, Any, Callable, Optional
+from .core import PromptRegress
+
+
+class PromptRegressDaemon:
+    """
+    Long-lived runner that keeps a `PromptRegress` instance, its embedding model and its
+    provider clients warm between runs.
+
+    Runs are either requested over a local Unix socket (`serve`) or triggered by changes
+    to the configuration file (`watch`). Both re-read the configuration before every run.
+    `watch` only re-executes the test cases whose fingerprint changed; socket requests
+    choose with `changed_only`.
+    """
+
+    def __init__(self, regress: PromptRegress):
+        """
+        Initialize the daemon.
+
+        Args:
+            regress (PromptRegress): The instance to keep resident.
+        """
+        self.regress = regress
+        self._lock = asyncio.Lock()
+
+    async def arun(self, baseline: str, target: str, format: str = 'console', verbose: bool = False,
+                   changed_only: bool = True, fail_fast: bool = False, max_cost: Optional[float] = None,
+                   max_duration: Optional[float] = None, record_history: Optional[bool] = None) -> Dict[str, Any]:
+        """
+        Reload the configuration and run a comparison.
+
+        Args:
+            baseline (str): Baseline model name.
+            target (str): Target model name.
+            format (str): Report format, 'console' or 'json'.
+            verbose (bool): Include prompts and outputs in the report.
+            changed_only (bool): Only re-run test cases that changed since the last run.
+            fail_fast (bool): Cancel the outstanding requests as soon as a test case fails.
+            max_cost (Optional[float]): Cancel the run once it has spent this many USD.
+            max_duration (Optional[float]): Cancel the run once it has taken this many seconds.
+            record_history (Optional[bool]): Record the run in the history. Defaults to the configuration.
+
+        Returns:
+            Dict[str, Any]: The report and whether every test case passed.
+        """
+        async with self._lock:
+            self.regress.reload_config()
+            configured = self.regress.record_history
+            if record_history is not None:
+                self.regress.record_history = record_history
+            try:
+                results = await self.regress.acompare_models(baseline, target, changed_only=changed_only,
+                                                             max_cost=max_cost, max_duration=max_duration,
+                                                             fail_fast=fail_fast)
+            finally:
+                self.regress.record_history = configured
+            return {
+                'report': self.regress.generate_report(results, verbose, format),
+                'passed': all(result.passed for result in results)
+            }
+
+    async def _handle_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """Serve one JSON request line and answer with one JSON response line."""
+        try:
+            request = json.loads(await reader.readline())
+            served = self.regress.config_path.resolve()
+            if request.get('config') and Path(request['config']).resolve() != served:
+                raise ValueError(f"The daemon serves {served}, not {request['config']}. "
+                                 "Start a daemon for that configuration or run without --daemon.")
+            response = await self.arun(
+                request['baseline'],
+                request['target'],
+                format=request.get('format', 'console'),
+                verbose=request.get('verbose', False),
+                changed_only=request.get('changed_only', True),
+                fail_fast=request.get('fail_fast', False),
+                max_cost=request.get('max_cost'),
+                max_duration=request.get('max_duration'),
+                record_history=request.get('record_history')
+            )
+        except Exception as e:
+            response = {'error': str(e)}
+
+        writer.write(json.dumps(response).encode('utf-8') + b'\n')
+        await writer.drain()
+        writer.close()
+        await writer.wait_closed()
+
+    async def serve(self, socket_path: Path):
+        """
+        Accept runs over a Unix socket until cancelled.
+
+        Args:
+            socket_path (Path): Path of the socket to listen on.
+        """
+        socket_path = Path(socket_path)
+        socket_path.parent.mkdir(parents=True, exist_ok=True)
+        socket_path.unlink(missing_ok=True)
+
+        server = await asyncio.start_unix_server(self._handle_client, path=str(socket_path))
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            socket_path.unlink(missing_ok=True)
+
+    async def watch(self, baseline: str, target: str, on_report: Callable[[Dict[str, Any]], None],
+                    format: str = 'console', verbose: bool = False, interval: float = 1.0):
+        """
+        Run once, then re-run whenever the configuration file changes, until cancelled.
+
+        Args:
+            baseline (str): Baseline model name.
+            target (str): Target model name.
+            on_report (Callable): Called with the outcome of every run.
+            format (str): Report format, 'console' or 'json'.
+            verbose (bool): Include prompts and outputs in the report.
+            interval (float): Seconds between checks of the configuration file.
+        """
+        config_path = self.regress.config_path
+        last_mtime = None
+        while True:
+            mtime = config_path.stat().st_mtime_ns if config_path.exists() else None
+            if mtime != last_mtime:
+                last_mtime = mtime
+                try:
+                    on_report(await self.arun(baseline, target, format=format, verbose=verbose))
+                except Exception as e:
+                    on_report({'error': str(e)})
+            await asyncio.sleep(interval)
+
+
+def request_run(socket_path: Path, baseline: str, target: str, format: str = 'console', verbose: bool = False,
+                changed_only: bool = True, fail_fast: bool = False, max_cost: Optional[float] = None,
+                max_duration: Optional[float] = None, record_history: Optional[bool] = None,
+                config: Optional[Path] = None, timeout: Optional[float] = None) -> Dict[str, Any]:
+    """
+    Ask a running daemon to run a comparison.
+
+    Args:
+        socket_path (Path): Path of the daemon's socket.
+        baseline (str): Baseline model name.
+        target (str): Target model name.
+        format (str): Report format, 'console' or 'json'.
+        verbose (bool): Include prompts and outputs in the report.
+        changed_only (bool): Only re-run test cases that changed since the last run.
+        fail_fast (bool): Cancel the outstanding requests as soon as a test case fails.
+        max_cost (Optional[float]): Cancel the run once it has spent this many USD.
+        max_duration (Optional[float]): Cancel the run once it has taken this many seconds.
+        record_history (Optional[bool]): Record the run in the history. Defaults to the daemon's configuration.
+        config (Optional[Path]): Configuration file the run is meant for. The daemon refuses the run if it
+                                 serves a different one.
+        timeout (Optional[float]): Seconds to wait for the run to finish.
+
+    Returns:
+        Dict[str, Any]: The report and whether every test case passed, or an 'error'.
+    """
+    request = {'baseline': baseline, 'target': target, 'format': format, 'verbose': verbose, 'changed_only': changed_only,
+               'fail_fast': fail_fast, 'max_cost': max_cost, 'max_duration': max_duration,
+               'record_history': record_history, 'config': str(Path(config).resolve()) if config else None}
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+        client.settimeout(timeout)
+        client.connect(str(socket_path))
+        client.sendall(json.dumps(request).encode('utf-8') + b'\n')
+        with client.makefile('rb') as stream:
+            return json.loads(stream.readline())
@@ -0,0 +1,145 @@
+from dataclasses import dataclass
+from typing import Dict, Any, List, Optional
+from .models import OpenAIProvider, AnthropicProvider, LocalProvider, compute_cost
+
+
+PROVIDER_CLASSES = {
+    'openai': OpenAIProvider,
+    'anthropic': AnthropicProvider,
+    'local': LocalProvider,
+}
+
+# Assumptions used for test cases that have no history yet.
+DEFAULT_OUTPUT_TOKENS = 256
+DEFAULT_OVERHEAD_MS = 500.0
+DEFAULT_TOKENS_PER_SECOND = 50.0
+
+
+@dataclass
+class ModelEstimate:
+    """Projected usage of one model for a run."""
+    model: str
+    requests: int
+    input_tokens: int
+    output_tokens: int
+    cost: float
+    duration_s: float
+    test_cases_with_history: int
+
+
+@dataclass
+class RunEstimate:
+    """Projected usage of a run."""
+    models: List[ModelEstimate]
+    cost: float
+    duration_s: float
+
+
+def max_output_tokens(model_config: Dict[str, Any]) -> int:
+    """
+    Get the output token limit configured for a model.
+
+    Args:
+        model_config (Dict[str, Any]): Model configuration.
+
+    Returns:
+        int: The configured limit, or a default if there is none.
+    """
+    parameters = model_config.get('parameters', {})
+    for key in ('max_tokens', 'max_output_tokens', 'num_predict'):
+        if key in parameters:
+            return int(parameters[key])
+    return DEFAULT_OUTPUT_TOKENS
+
+
+def estimate_model(model_config: Dict[str, Any], prompts_by_case: Dict[str, List[str]], max_concurrency: int,
+                   averages: Optional[Dict[str, Dict[str, float]]] = None, num_threads: int = 8) -> ModelEstimate:
+    """
+    Project the token usage, cost and wall time of running prompts against a model.
+
+    Input tokens are counted exactly (or with an approximate tokenizer for providers without
+    a local one). Output tokens and latency come from the model's history when available and
+    otherwise from its configured output token limit.
+
+    Args:
+        model_config (Dict[str, Any]): Model configuration.
+        prompts_by_case (Dict[str, List[str]]): Rendered prompts of every test case.
+        max_concurrency (int): Number of concurrent requests per model.
+        averages (Optional[Dict[str, Dict[str, float]]]): Historical averages per test case, see
+                                                          `HistoryStore.model_averages`.
+        num_threads (int): Number of tokenizer threads.
+
+    Returns:
+        ModelEstimate: The projection for the model.
+    """
+    provider_class = PROVIDER_CLASSES.get(model_config['provider'])
+    if provider_class is None:
+        raise ValueError(f"Unsupported provider: {model_config['provider']}")
+    encoding = provider_class.get_encoding(model_config['name'])
+    averages = averages or {}
+    output_limit = max_output_tokens(model_config)
+
+    requests = input_tokens = output_tokens = with_history = 0
+    latency_ms = 0.0
+    for test_case, prompts in prompts_by_case.items():
+        if not prompts:
+            continue
+        case_input_tokens = sum(len(tokens) for tokens in
+                                encoding.encode_batch(prompts, num_threads=num_threads, allowed_special="all"))
+
+        history = averages.get(test_case)
+        if history and history.get('output_tokens') and history.get('response_time_ms'):
+            with_history += 1
+            case_output_tokens = history['output_tokens']
+            case_latency_ms = history['response_time_ms']
+        else:
+            case_output_tokens = output_limit
+            case_latency_ms = DEFAULT_OVERHEAD_MS + case_output_tokens / DEFAULT_TOKENS_PER_SECOND * 1000
+
+        requests += len(prompts)
+        input_tokens += case_input_tokens
+        output_tokens += int(round(case_output_tokens * len(prompts)))
+        latency_ms += case_latency_ms * len(prompts)
+
+    duration_s = latency_ms / 1000 / max(1, max_concurrency)
+    rate_limit = model_config.get('rate_limit', {})
+    if rate_limit.get('requests_per_minute'):
+        duration_s = max(duration_s, requests / rate_limit['requests_per_minute'] * 60)
+    if rate_limit.get('tokens_per_minute'):
+        duration_s = max(duration_s, (input_tokens + output_tokens) / rate_limit['tokens_per_minute'] * 60)
+
+    return ModelEstimate(
+        model=model_config['name'],
+        requests=requests,
+        input_tokens=input_tokens,
+        output_tokens=output_tokens,
+        cost=compute_cost(model_config.get('pricing'), input_tokens, output_tokens),
+        duration_s=duration_s,
+        test_cases_with_history=with_history
+    )
+
+
+def estimate_run(model_configs: List[Dict[str, Any]], prompts_by_case: Dict[str, List[str]], max_concurrency: int,
+                 history=None) -> RunEstimate:
+    """
+    Project the cost and wall time of running prompts against several models concurrently.
+
+    Args:
+        model_configs (List[Dict[str, Any]]): Configurations of the models of the run.
+        prompts_by_case (Dict[str, List[str]]): Rendered prompts of every test case.
+        max_concurrency (int): Number of concurrent requests per model.
+        history (Optional[HistoryStore]): Past runs used to project output tokens and latency.
+
+    Returns:
+        RunEstimate: The projection for the run.
+    """
+    estimates = [
+        estimate_model(config, prompts_by_case, max_concurrency,
+                       averages=history.model_averages(config['name']) if history is not None else None)
+        for config in model_configs
+    ]
+    return RunEstimate(
+        models=estimates,
+        cost=sum(estimate.cost for estimate in estimates),
+        duration_s=max((estimate.duration_s for estimate in estimates), default=0.0)
+    )
@@ -0,0 +1,175 @@
+import sqlite3
+
+from pathlib import Path
+from datetime import datetime, timezone
+from dataclasses import fields
+from typing import Dict, Any, List, Optional, get_type_hints, get_args
+from .results import ComparisonResult, ResultTable
+
+
+# Text fields (prompts and outputs) are not kept in the history, only the per-result scores.
+HISTORY_TEXT_FIELDS = ('test_case', 'prompt', 'baseline_output', 'target_output')
+
+
+def history_metrics() -> List[str]:
+    """
+    Names of the numeric `ComparisonResult` fields stored in the history.
+
+    Returns:
+        List[str]: Metric column names.
+    """
+    hints = get_type_hints(ComparisonResult)
+    metrics = []
+    for field in fields(ComparisonResult):
+        types = get_args(hints[field.name]) or (hints[field.name],)
+        if field.name not in HISTORY_TEXT_FIELDS and any(t in (float, int, bool) for t in types):
+            metrics.append(field.name)
+    return metrics
+
+
+class HistoryStore:
+    """
+    SQLite-backed store of the results of every run.
+
+    Each run is one row in `runs`; its results are bulk-inserted into `results` in a
+    single transaction. Results are indexed by run, by model pair and test case, so trend
+    queries only touch the rows of the requested runs.
+    """
+
+    def __init__(self, path: Path):
+        """
+        Open (or create) the history database.
+
+        Args:
+            path (Path): Path to the SQLite database file.
+        """
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.connection = sqlite3.connect(self.path)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.metrics = history_metrics()
+        self._create_schema()
+
+    def _create_schema(self):
+        """Create the tables and indexes, adding columns for metrics introduced since the database was created."""
+        with self.connection:
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS runs ("
+                "id INTEGER PRIMARY KEY, started_at TEXT NOT NULL, baseline TEXT NOT NULL, target TEXT NOT NULL)"
+            )
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS results ("
+                "run_id INTEGER NOT NULL REFERENCES runs(id), test_case TEXT NOT NULL, "
+                "baseline TEXT NOT NULL, target TEXT NOT NULL)"
+            )
+            existing = {row[1] for row in self.connection.execute("PRAGMA table_info(results)")}
+            for metric in self.metrics:
+                if metric not in existing:
+                    self.connection.execute(f"ALTER TABLE results ADD COLUMN {metric} REAL")
+
+            self.connection.execute("CREATE INDEX IF NOT EXISTS idx_runs_pair ON runs(baseline, target, id)")
+            self.connection.execute("CREATE INDEX IF NOT EXISTS idx_results_run ON results(run_id, test_case)")
+            self.connection.execute(
+                "CREATE INDEX IF NOT EXISTS idx_results_pair_case ON results(baseline, target, test_case, run_id)"
+            )
+            self.connection.execute("CREATE INDEX IF NOT EXISTS idx_results_target_case ON results(target, test_case, run_id)")
+
+    def record_run(self, baseline: str, target: str, results: ResultTable) -> int:
+        """
+        Store the results of a run.
+
+        Args:
+            baseline (str): Baseline model name.
+            target (str): Target model name.
+            results (ResultTable): Results of the run.
+
+        Returns:
+            int: The id of the new run.
+        """
+        started_at = datetime.now(timezone.utc).isoformat(timespec='seconds')
+        columns = [[float(value) for value in results.column(metric).tolist()] for metric in self.metrics]
+        test_cases = results.column('test_case')
+
+        placeholders = ", ".join("?" for _ in range(4 + len(self.metrics)))
+        insert = f"INSERT INTO results (run_id, test_case, baseline, target, {', '.join(self.metrics)}) VALUES ({placeholders})"
+
+        with self.connection:
+            run_id = self.connection.execute(
+                "INSERT INTO runs (started_at, baseline, target) VALUES (?, ?, ?)", (started_at, baseline, target)
+            ).lastrowid
+            self.connection.executemany(insert, (
+                (run_id, test_case, baseline, target, *values)
+                for test_case, *values in zip(test_cases, *columns)
+            ))
+        return run_id
+
+    def trend(self, metric: str, test_case: Optional[str] = None, baseline: Optional[str] = None,
+              target: Optional[str] = None, last: int = 50) -> List[Dict[str, Any]]:
+        """
+        Aggregate a metric per run over the most recent runs.
+
+        Args:
+            metric (str): Name of the metric, e.g. 'semantic_similarity' or 'passed' for the pass rate.
+            test_case (Optional[str]): Restrict to one test case.
+            baseline (Optional[str]): Restrict to runs with this baseline model.
+            target (Optional[str]): Restrict to runs with this target model.
+            last (int): Number of most recent runs to include.
+
+        Returns:
+            List[Dict[str, Any]]: One row per run, oldest first, with the mean, min and max of the metric.
+        """
+        if metric not in self.metrics:
+            raise ValueError(f"Unknown metric: {metric}. Available metrics: {', '.join(self.metrics)}")
+
+        # Only add the filters that are set, so SQLite can use the (run_id, test_case) index.
+        run_filters = [f"{column} = :{column}" for column, value in (('baseline', baseline), ('target', target)) if value]
+        run_where = f"WHERE {' AND '.join(run_filters)}" if run_filters else ""
+        result_where = "WHERE results.test_case = :test_case" if test_case else ""
+
+        query = (
+            f"WITH recent AS (SELECT id, started_at, baseline, target FROM runs {run_where} ORDER BY id DESC LIMIT :last) "
+            f"SELECT recent.id, recent.started_at, recent.baseline, recent.target, "
+            f"AVG(results.{metric}), MIN(results.{metric}), MAX(results.{metric}), COUNT(*) "
+            f"FROM recent JOIN results ON results.run_id = recent.id {result_where} "
+            "GROUP BY recent.id ORDER BY recent.id"
+        )
+        rows = self.connection.execute(
+            query, {'baseline': baseline, 'target': target, 'test_case': test_case, 'last': last}
+        )
+        return [
+            {'run_id': run_id, 'started_at': started_at, 'baseline': run_baseline, 'target': run_target,
+             'mean': mean, 'min': minimum, 'max': maximum, 'count': count}
+            for run_id, started_at, run_baseline, run_target, mean, minimum, maximum, count in rows
+        ]
+
+    def model_averages(self, model: str, last: int = 20) -> Dict[str, Dict[str, float]]:
+        """
+        Average latency and output tokens per test case of a model, whether it ran as baseline or target.
+
+        Args:
+            model (str): Model name.
+            last (int): Number of most recent runs of the model to include.
+
+        Returns:
+            Dict[str, Dict[str, float]]: Mapping of test case to its average 'response_time_ms' and 'output_tokens'.
+        """
+        query = (
+            "WITH recent AS (SELECT id FROM runs WHERE baseline = :model OR target = :model ORDER BY id DESC LIMIT :last) "
+            "SELECT test_case, AVG(response_time_ms), AVG(output_tokens) FROM ("
+            "  SELECT test_case, baseline_response_time_ms AS response_time_ms, baseline_output_tokens AS output_tokens "
+            "  FROM results WHERE baseline = :model AND run_id IN recent "
+            "  UNION ALL "
+            "  SELECT test_case, target_response_time_ms, target_output_tokens "
+            "  FROM results WHERE target = :model AND run_id IN recent"
+            ") GROUP BY test_case"
+        )
+        rows = self.connection.execute(query, {'model': model, 'last': last})
+        return {
+            test_case: {'response_time_ms': response_time_ms, 'output_tokens': output_tokens}
+            for test_case, response_time_ms, output_tokens in rows
+        }
+
+    def close(self):
+        """Close the database connection."""
+        self.connection.close()
@@ -1,6 +1,12 @@
 from .similarity import SimilarityMetrics
+from .structured import JSONMetrics
+from .lexical import LexicalMetrics
+from .drift import DriftIndex
 
 
 __all__ = [
-    "SimilarityMetrics"
+    "SimilarityMetrics",
+    "JSONMetrics",
+    "LexicalMetrics",
+    "DriftIndex"
 ]
\ No newline at end of file
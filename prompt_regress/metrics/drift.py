@@ -0,0 +1,191 @@
+import json
+import numpy as np
+
+from pathlib import Path
+from typing import List, Tuple
+
+try:
+    import hnswlib
+except ImportError:
+    hnswlib = None
+
+
+# Outputs at least this similar to an accepted output are already represented in the index.
+DUPLICATE_SIMILARITY = 0.999
+
+
+def _normalize(embeddings: np.ndarray) -> np.ndarray:
+    """Scale embeddings to unit length, so that inner products are cosine similarities."""
+    embeddings = np.asarray(embeddings, dtype=np.float32).reshape(len(embeddings), -1)
+    norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+    return embeddings / np.maximum(norms, 1e-12)
+
+
+class DriftIndex:
+    """
+    Persisted nearest-neighbour index of the embeddings of accepted outputs of one test case.
+
+    With hnswlib installed the embeddings are kept in an HNSW graph, so a query takes well
+    under a millisecond regardless of how many outputs were accepted. Without it the index
+    falls back to an exact search over a NumPy matrix.
+    """
+
+    def __init__(self, path: Path, model: str, dimension: int, ef: int = 64, m: int = 16):
+        """
+        Initialize the index, loading it from `path` if it was saved before.
+
+        An index saved for a different embedding model or dimension is discarded, since its
+        embeddings cannot be compared with new ones.
+
+        Args:
+            path (Path): Directory the index is stored in.
+            model (str): Name of the embedding model.
+            dimension (int): Dimension of the embeddings.
+            ef (int): HNSW search breadth; higher is more accurate and slower.
+            m (int): HNSW graph degree.
+        """
+        self.path = Path(path)
+        self.model = model
+        self.dimension = dimension
+        self.ef = ef
+        self.m = m
+        self._hnsw = None
+        self._embeddings = np.zeros((0, dimension), dtype=np.float32)
+        self._modified = False
+        self._load()
+
+    def __len__(self) -> int:
+        if self._hnsw is not None:
+            return self._hnsw.get_current_count()
+        return len(self._embeddings)
+
+    def _new_hnsw(self, capacity: int):
+        index = hnswlib.Index(space='ip', dim=self.dimension)
+        index.init_index(max_elements=max(capacity, 1024), ef_construction=200, M=self.m)
+        index.set_ef(self.ef)
+        return index
+
+    def _load(self):
+        """Load the saved index, moving a NumPy index into an HNSW graph once hnswlib is installed."""
+        meta_path = self.path / 'meta.json'
+        if not meta_path.exists():
+            return
+        meta = json.loads(meta_path.read_text())
+        if meta.get('model') != self.model or meta.get('dimension') != self.dimension:
+            print(f"⚠️ Drift index {self.path} was built with another embedding model. Starting a new one.")
+            return
+
+        if meta['backend'] == 'hnsw':
+            if hnswlib is None:
+                print(f"⚠️ Drift index {self.path} requires hnswlib. Starting a new one.")
+                return
+            self._hnsw = hnswlib.Index(space='ip', dim=self.dimension)
+            self._hnsw.load_index(str(self.path / 'index.bin'), max_elements=max(meta['count'], 1024))
+            self._hnsw.set_ef(self.ef)
+        else:
+            self._embeddings = np.load(self.path / 'embeddings.npy')
+            if hnswlib is not None and len(self._embeddings):
+                embeddings, self._embeddings = self._embeddings, self._embeddings[:0]
+                self.add(embeddings)
+
+    def query(self, embeddings: np.ndarray, k: int = 5) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Find the accepted outputs nearest to each embedding.
+
+        Args:
+            embeddings (np.ndarray): Embeddings of shape (n, dimension).
+            k (int): Number of neighbours.
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: Cosine similarities and ids of the neighbours, both
+                                           of shape (n, min(k, len(self))), nearest first.
+        """
+        queries = _normalize(embeddings)
+        k = min(k, len(self))
+        if k == 0:
+            return np.zeros((len(queries), 0), dtype=np.float32), np.zeros((len(queries), 0), dtype=np.int64)
+
+        if self._hnsw is not None:
+            self._hnsw.set_ef(max(self.ef, k))
+            ids, distances = self._hnsw.knn_query(queries, k=k)
+            return 1.0 - distances, ids.astype(np.int64)
+
+        similarities = queries @ self._embeddings.T
+        ids = np.argpartition(-similarities, k - 1, axis=1)[:, :k]
+        nearest = np.take_along_axis(similarities, ids, axis=1)
+        order = np.argsort(-nearest, axis=1)
+        return np.take_along_axis(nearest, order, axis=1), np.take_along_axis(ids, order, axis=1)
+
+    def add(self, embeddings: np.ndarray) -> int:
+        """
+        Add embeddings of accepted outputs, skipping those already in the index.
+
+        Args:
+            embeddings (np.ndarray): Embeddings of shape (n, dimension).
+
+        Returns:
+            int: Number of embeddings added.
+        """
+        embeddings = _normalize(embeddings)
+        if len(embeddings) and len(self):
+            similarities, _ = self.query(embeddings, k=1)
+            embeddings = embeddings[similarities[:, 0] < DUPLICATE_SIMILARITY]
+        if not len(embeddings):
+            return 0
+
+        if hnswlib is not None:
+            if self._hnsw is None:
+                self._hnsw = self._new_hnsw(len(embeddings))
+            count = len(self)
+            if count + len(embeddings) > self._hnsw.get_max_elements():
+                self._hnsw.resize_index(max(2 * self._hnsw.get_max_elements(), count + len(embeddings)))
+            self._hnsw.add_items(embeddings, np.arange(count, count + len(embeddings)))
+        else:
+            self._embeddings = np.concatenate([self._embeddings, embeddings])
+        self._modified = True
+        return len(embeddings)
+
+    def save(self):
+        """Write the index to its directory, if it changed since it was loaded or last saved."""
+        if not self._modified:
+            return
+        self.path.mkdir(parents=True, exist_ok=True)
+        if self._hnsw is not None:
+            self._hnsw.save_index(str(self.path / 'index.bin'))
+            backend = 'hnsw'
+        else:
+            np.save(self.path / 'embeddings.npy', self._embeddings)
+            backend = 'numpy'
+        meta = {'model': self.model, 'dimension': self.dimension, 'backend': backend, 'count': len(self)}
+        (self.path / 'meta.json').write_text(json.dumps(meta))
+        self._modified = False
+
+
+def cluster_embeddings(embeddings: np.ndarray, threshold: float = 0.9) -> List[int]:
+    """
+    Group similar embeddings with single-pass leader clustering.
+
+    Each embedding joins the cluster of its most similar leader if it is at least `threshold`
+    similar to it, or leads a new cluster.
+
+    Args:
+        embeddings (np.ndarray): Embeddings of shape (n, dimension).
+        threshold (float): Minimum cosine similarity to a cluster's leader.
+
+    Returns:
+        List[int]: For each embedding, the position of its cluster's leader.
+    """
+    embeddings = _normalize(embeddings)
+    leaders: List[int] = []
+    labels: List[int] = []
+    for idx, embedding in enumerate(embeddings):
+        if leaders:
+            similarities = embeddings[leaders] @ embedding
+            best = int(np.argmax(similarities))
+            if similarities[best] >= threshold:
+                labels.append(leaders[best])
+                continue
+        leaders.append(idx)
+        labels.append(idx)
+    return labels
+
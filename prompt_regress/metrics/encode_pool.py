@@ -0,0 +1,128 @@
+import numpy as np
+import multiprocessing
+
+from typing import Any, List, Optional
+from multiprocessing import shared_memory
+
+
+# Set in every worker by `_init_worker`. With the fork start method the model is inherited
+# from the parent rather than pickled, so its weights are shared copy-on-write.
+_worker_model = None
+
+
+def _init_worker(model: Any, threads: int):
+    """Keep the inherited model and limit the worker to its share of the cores."""
+    global _worker_model
+    import torch
+    torch.set_num_threads(threads)
+    _worker_model = model
+
+
+def _encode_shard(shm_name: str, shape: tuple, start: int, texts: List[str], batch_size: int, normalize: bool) -> int:
+    """Encode a shard of texts and write the embeddings into rows `start:` of the shared output array."""
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        out = np.ndarray(shape, dtype=np.float32, buffer=shm.buf)
+        out[start:start + len(texts)] = _worker_model.encode(texts, batch_size=batch_size, convert_to_numpy=True,
+                                                             normalize_embeddings=normalize)
+        del out
+    finally:
+        shm.close()
+    return len(texts)
+
+
+class EncodePool:
+    """
+    Pool of worker processes that shard `encode` calls of a SentenceTransformer across CPU cores.
+
+    Workers are forked from the parent after the model is loaded, so the weights are shared
+    copy-on-write instead of being loaded once per worker. Embeddings are written by the
+    workers straight into a shared memory block and never pickled back to the parent.
+
+    The parent must not run inference itself before the pool is started: forking a process
+    whose PyTorch thread pool is already running can deadlock the children.
+    """
+
+    def __init__(self, model: Any, workers: int, threads_per_worker: int = 1):
+        """
+        Initialize the pool. Worker processes are started by `start`, or on first use.
+
+        Args:
+            model (Any): A loaded SentenceTransformer (or any object with `encode` and
+                         `get_sentence_embedding_dimension` methods) on the CPU.
+            workers (int): Number of worker processes.
+            threads_per_worker (int): PyTorch intra-op threads of every worker.
+        """
+        if workers < 1:
+            raise ValueError("workers must be at least 1.")
+        if 'fork' not in multiprocessing.get_all_start_methods():
+            raise ValueError("The encode pool requires the 'fork' start method, which is not available on this platform.")
+        device = getattr(model, 'device', None)
+        if device is not None and getattr(device, 'type', 'cpu') != 'cpu':
+            raise ValueError("The encode pool only supports CPU models.")
+
+        self.model = model
+        self.workers = workers
+        self.threads_per_worker = threads_per_worker
+        self.dimension = model.get_sentence_embedding_dimension()
+        self._pool: Optional[multiprocessing.pool.Pool] = None
+
+    def start(self) -> multiprocessing.pool.Pool:
+        """
+        Fork the worker processes, if they are not running yet.
+
+        Call this from the main thread before any other threads are started: forking a
+        multi-threaded process can deadlock the children on locks held by other threads.
+
+        Returns:
+            multiprocessing.pool.Pool: The worker processes.
+        """
+        if self._pool is None:
+            context = multiprocessing.get_context('fork')
+            self._pool = context.Pool(self.workers, initializer=_init_worker,
+                                      initargs=(self.model, self.threads_per_worker))
+        return self._pool
+
+    def encode(self, texts: List[str], batch_size: int = 16, normalize_embeddings: bool = False) -> np.ndarray:
+        """
+        Encode texts across the worker processes.
+
+        Texts are sorted by length and dealt out in batches, so every worker gets a similar
+        amount of work and every batch holds texts of similar length.
+
+        Args:
+            texts (List[str]): Texts to encode.
+            batch_size (int): Batch size of every worker's `encode` call.
+            normalize_embeddings (bool): Normalize the embeddings to unit length.
+
+        Returns:
+            np.ndarray: A float32 array of shape (len(texts), dimension), in the order of `texts`.
+        """
+        shape = (len(texts), self.dimension)
+        if not texts:
+            return np.zeros(shape, dtype=np.float32)
+
+        order = np.argsort([-len(text) for text in texts], kind='stable')
+        sorted_texts = [texts[idx] for idx in order]
+
+        # Several shards per worker keep the pool busy when shards take uneven time.
+        shard_size = max(batch_size, -(-len(texts) // (self.workers * 4)))
+        shm = shared_memory.SharedMemory(create=True, size=max(1, shape[0] * shape[1] * 4))
+        try:
+            tasks = [(shm.name, shape, start, sorted_texts[start:start + shard_size], batch_size, normalize_embeddings)
+                     for start in range(0, len(sorted_texts), shard_size)]
+            self.start().starmap(_encode_shard, tasks)
+
+            embeddings = np.empty(shape, dtype=np.float32)
+            embeddings[order] = np.ndarray(shape, dtype=np.float32, buffer=shm.buf)
+        finally:
+            shm.close()
+            shm.unlink()
+        return embeddings
+
+    def close(self):
+        """Stop the worker processes."""
+        if self._pool is not None:
+            self._pool.terminate()
+            self._pool.join()
+            self._pool = None
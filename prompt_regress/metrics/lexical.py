@@ -0,0 +1,224 @@
+import re
+import numpy as np
+
+from typing import Dict, Iterable, List, Tuple
+
+
+LEXICAL_METRICS = ('rouge_l', 'bleu', 'token_jaccard', 'length_ratio')
+
+_TOKEN_PATTERN = re.compile(r"\w+|[^\w\s]")
+
+
+class LexicalMetrics:
+    """
+    Batched lexical similarity metrics: ROUGE-L, BLEU, token Jaccard and length ratio.
+
+    Every text is tokenized once into an array of integer token ids shared by all metrics,
+    and each metric is computed for all pairs at once with NumPy. The baseline output is
+    the reference and the target output the candidate.
+    """
+
+    def __init__(self, lowercase: bool = True, max_order: int = 4, batch_size: int = 64):
+        """
+        Initialize the LexicalMetrics class.
+
+        Args:
+            lowercase (bool): Compare tokens case-insensitively.
+            max_order (int): Longest n-gram used by BLEU.
+            batch_size (int): Number of pairs aligned at once by ROUGE-L.
+        """
+        if max_order < 1:
+            raise ValueError("max_order must be at least 1.")
+        self.lowercase = lowercase
+        self.max_order = max_order
+        self.batch_size = batch_size
+
+    def tokenize(self, texts: List[str]) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Tokenize texts into one flat array of token ids.
+
+        Args:
+            texts (List[str]): Texts to tokenize.
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: The token ids of all texts concatenated, and the
+                                           offset of every text in it (len(texts) + 1 bounds).
+        """
+        vocabulary: Dict[str, int] = {}
+        ids, lengths = [], []
+        for text in texts:
+            tokens = _TOKEN_PATTERN.findall(text.lower() if self.lowercase else text)
+            ids.extend(vocabulary.setdefault(token, len(vocabulary)) for token in tokens)
+            lengths.append(len(tokens))
+        bounds = np.zeros(len(texts) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=bounds[1:])
+        return np.asarray(ids, dtype=np.int64), bounds
+
+    def compute(self, baseline_texts: List[str], target_texts: List[str],
+                metrics: Iterable[str] = LEXICAL_METRICS) -> Dict[str, np.ndarray]:
+        """
+        Compute lexical metrics for pairs of texts.
+
+        Args:
+            baseline_texts (List[str]): Baseline outputs, used as references.
+            target_texts (List[str]): Target outputs, used as candidates.
+            metrics (Iterable[str]): Names of the metrics to compute, see `LEXICAL_METRICS`.
+
+        Returns:
+            Dict[str, np.ndarray]: One score in [0, 1] per pair for every requested metric.
+        """
+        if not baseline_texts or not target_texts:
+            raise ValueError("Both baseline_texts and target_texts must be non-empty lists.")
+        if len(baseline_texts) != len(target_texts):
+            raise ValueError("baseline_texts and target_texts must have the same length.")
+        unknown = set(metrics) - set(LEXICAL_METRICS)
+        if unknown:
+            raise ValueError(f"Unknown lexical metric(s): {', '.join(sorted(unknown))}")
+
+        count = len(baseline_texts)
+        tokens, bounds = self.tokenize(list(baseline_texts) + list(target_texts))
+        lengths = np.diff(bounds)
+        baseline_lengths, target_lengths = lengths[:count], lengths[count:]
+
+        scores = {}
+        for metric in metrics:
+            if metric == 'length_ratio':
+                scores[metric] = self._ratio(np.minimum(baseline_lengths, target_lengths),
+                                             np.maximum(baseline_lengths, target_lengths))
+            elif metric == 'token_jaccard':
+                scores[metric] = self._token_jaccard(tokens, bounds, count)
+            elif metric == 'rouge_l':
+                scores[metric] = self._rouge_l(tokens, bounds, count)
+            elif metric == 'bleu':
+                scores[metric] = self._bleu(tokens, bounds, count)
+        return scores
+
+    @staticmethod
+    def _ratio(numerator: np.ndarray, denominator: np.ndarray) -> np.ndarray:
+        """Element-wise ratio, 1 where both sides are 0 (two empty texts are identical)."""
+        numerator = numerator.astype(np.float64)
+        denominator = denominator.astype(np.float64)
+        return np.divide(numerator, denominator, out=(denominator == 0).astype(np.float64), where=denominator > 0)
+
+    @staticmethod
+    def _owners(bounds: np.ndarray) -> np.ndarray:
+        """Index of the text of every token."""
+        return np.repeat(np.arange(len(bounds) - 1), np.diff(bounds))
+
+    @staticmethod
+    def _pair_keys(ids: np.ndarray, texts: np.ndarray, count: int) -> Tuple[np.ndarray, np.ndarray, int]:
+        """
+        Combine the pair of every item and its id into one int64 key, split by side.
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray, int]: Keys of the baseline and target items, and the
+                                                width used to recover the pair as `key // width`.
+        """
+        width = int(ids.max()) + 1 if len(ids) else 1
+        keys = (texts % count) * width + ids
+        return keys[texts < count], keys[texts >= count], width
+
+    def _token_jaccard(self, tokens: np.ndarray, bounds: np.ndarray, count: int) -> np.ndarray:
+        """Size of the intersection over the size of the union of the token sets of each pair."""
+        baseline_keys, target_keys, width = self._pair_keys(tokens, self._owners(bounds), count)
+        baseline_set, target_set = np.unique(baseline_keys), np.unique(target_keys)
+        shared = np.intersect1d(baseline_set, target_set, assume_unique=True)
+
+        intersection = np.bincount(shared // width, minlength=count)
+        union = (np.bincount(baseline_set // width, minlength=count)
+                 + np.bincount(target_set // width, minlength=count) - intersection)
+        return self._ratio(intersection, union)
+
+    def _rouge_l(self, tokens: np.ndarray, bounds: np.ndarray, count: int) -> np.ndarray:
+        """
+        ROUGE-L F1 from the longest common subsequence (LCS) of each pair, i.e. 2 * LCS / (m + n).
+
+        The LCS table is filled one row at a time for a whole batch of pairs: with
+        t[j] = max(prev[j], prev[j-1] + match[j]), the row is the running maximum of t,
+        which NumPy computes without a Python loop over columns. Pairs are batched by
+        length so little work is spent on padding.
+        """
+        lengths = np.diff(bounds)
+        baseline_lengths, target_lengths = lengths[:count], lengths[count:]
+        lcs = np.zeros(count, dtype=np.int64)
+
+        order = np.argsort(np.maximum(baseline_lengths, target_lengths), kind='stable')
+        for start in range(0, count, self.batch_size):
+            batch = order[start:start + self.batch_size]
+            rows, cols = baseline_lengths[batch].max(), target_lengths[batch].max()
+            if rows == 0 or cols == 0:
+                continue
+            # Different paddings on each side, so padding never matches.
+            baseline = np.full((len(batch), rows), -1, dtype=np.int64)
+            target = np.full((len(batch), cols), -2, dtype=np.int64)
+            for row, pair in enumerate(batch):
+                baseline[row, :baseline_lengths[pair]] = tokens[bounds[pair]:bounds[pair + 1]]
+                target[row, :target_lengths[pair]] = tokens[bounds[count + pair]:bounds[count + pair + 1]]
+
+            previous = np.zeros((len(batch), cols + 1), dtype=np.int64)
+            current = np.zeros_like(previous)
+            for i in range(rows):
+                match = target == baseline[:, i:i + 1]
+                np.maximum(previous[:, 1:], previous[:, :-1] + match, out=current[:, 1:])
+                np.maximum.accumulate(current[:, 1:], axis=1, out=current[:, 1:])
+                previous, current = current, previous
+            lcs[batch] = previous[:, -1]
+
+        return self._ratio(2 * lcs, baseline_lengths + target_lengths)
+
+    def _ngrams(self, tokens: np.ndarray, bounds: np.ndarray) -> List[Tuple[np.ndarray, np.ndarray]]:
+        """
+        Ids and texts of the n-grams of every order up to `max_order`.
+
+        Ids of order n are derived from the ids of order n-1 and the next token, so n-grams
+        of any length are identified without overflowing integer keys.
+
+        Returns:
+            List[Tuple[np.ndarray, np.ndarray]]: For each order, the id and the text of every n-gram.
+        """
+        owners = self._owners(bounds)
+        ids = tokens
+        ngrams = [(ids, owners)]
+        for order in range(2, self.max_order + 1):
+            starts = np.arange(max(len(tokens) - order + 1, 0))
+            # An n-gram is valid if its first and last tokens belong to the same text.
+            starts = starts[owners[starts] == owners[starts + order - 1]]
+            next_ids = np.full(len(tokens), -1, dtype=np.int64)
+            if len(starts):
+                pairs = np.stack([ids[starts], tokens[starts + order - 1]], axis=1)
+                next_ids[starts] = np.unique(pairs, axis=0, return_inverse=True)[1].reshape(-1)
+            ids = next_ids
+            ngrams.append((ids[starts], owners[starts]))
+        return ngrams
+
+    def _bleu(self, tokens: np.ndarray, bounds: np.ndarray, count: int) -> np.ndarray:
+        """
+        Sentence-level BLEU of each target against its baseline, with add-one smoothing of
+        the precisions of order 2 and above.
+        """
+        lengths = np.diff(bounds)
+        baseline_lengths, target_lengths = lengths[:count], lengths[count:]
+
+        log_precision = np.zeros(count)
+        for order, (ids, texts) in enumerate(self._ngrams(tokens, bounds), start=1):
+            baseline_keys, target_keys, width = self._pair_keys(ids, texts, count)
+            baseline_unique, baseline_counts = np.unique(baseline_keys, return_counts=True)
+            target_unique, target_counts = np.unique(target_keys, return_counts=True)
+            # Target n-gram counts clipped by their count in the baseline.
+            shared, baseline_idx, target_idx = np.intersect1d(baseline_unique, target_unique,
+                                                              assume_unique=True, return_indices=True)
+            clipped = np.bincount(shared // width, minlength=count,
+                                  weights=np.minimum(baseline_counts[baseline_idx], target_counts[target_idx]))
+
+            total = np.maximum(target_lengths - order + 1, 0)
+            smoothing = (total > 0) * (order > 1)
+            precision = self._ratio(clipped + smoothing, total + smoothing)
+            # No matching unigram gives log(0) = -inf and a score of exactly 0.
+            with np.errstate(divide='ignore'):
+                log_precision += np.log(precision)
+
+        brevity = np.exp(np.minimum(0.0, 1.0 - self._ratio(baseline_lengths, target_lengths)))
+        bleu = brevity * np.exp(log_precision / self.max_order)
+        bleu[target_lengths == 0] = 0.0
+        bleu[(baseline_lengths == 0) & (target_lengths == 0)] = 1.0
+        return np.clip(bleu, 0.0, 1.0)
@@ -1,9 +1,10 @@
 import torch
 import numpy as np
 
-from typing import List
+from typing import List, Optional, Tuple
 from sentence_transformers import SentenceTransformer
 from rapidfuzz import fuzz, process
+from .encode_pool import EncodePool
 
 
 class SimilarityMetrics:
@@ -14,17 +15,93 @@ class SimilarityMetrics:
     between two texts using a pre-trained model.
     """
     
-    def __init__(self, embedding_model: str, batch_size: int = 16):
+    def __init__(self, embedding_model: str, batch_size: int = 16, chunk_tokens: Optional[int] = None,
+                 chunk_overlap: int = 0, pooling: str = 'mean', encode_workers: int = 0):
         """
         Initialize the SimilarityMetrics class with a pre-trained embedding model.
 
         Args:
             embedding_model (str): The name of the pre-trained model to use for semantic similarity.
                                    Default is "Qwen/Qwen3-Embedding-0.6B".
+            batch_size (int): Batch size used when encoding texts.
+            chunk_tokens (Optional[int]): If set, texts longer than this many tokens are split into windows
+                                          that are embedded separately instead of being truncated. Capped at
+                                          the model's max sequence length.
+            chunk_overlap (int): Number of tokens shared by consecutive windows.
+            pooling (str): How window similarities are aggregated: 'mean' compares the mean window
+                           embeddings, 'max' averages the best match of every window on the other side.
+            encode_workers (int): If greater than 1, embeddings are computed by this many worker processes
+                                  on the CPU instead of in this process. See `EncodePool`.
         """
-        self.model = SentenceTransformer(embedding_model, device="cuda" if torch.cuda.is_available() else "cpu")
+        if pooling not in ('mean', 'max'):
+            raise ValueError(f"Unknown pooling: {pooling}. Use 'mean' or 'max'.")
+        if chunk_tokens is not None and not 0 <= chunk_overlap < chunk_tokens:
+            raise ValueError("chunk_overlap must be non-negative and smaller than chunk_tokens.")
+        if encode_workers < 0:
+            raise ValueError("encode_workers must be non-negative.")
+
+        self.embedding_model = embedding_model
+        self._model = None
         self.batch_size = batch_size
+        self.chunk_tokens = chunk_tokens
+        self.chunk_overlap = chunk_overlap
+        self.pooling = pooling
+        self.encode_workers = encode_workers
+        self._encode_pool = None
+
+    @property
+    def model(self) -> SentenceTransformer:
+        """The embedding model, loaded on first use so runs that do not need it never pay for it."""
+        return self._ensure_model()
+
+    def _ensure_model(self) -> SentenceTransformer:
+        """Load the embedding model and, with `encode_workers`, fork the encode pool, if not done yet."""
+        if self._model is None:
+            if self.encode_workers > 1:
+                device = "cpu"
+            else:
+                device = "cuda" if torch.cuda.is_available() else "cpu"
+            self._model = SentenceTransformer(self.embedding_model, device=device)
+            if self.encode_workers > 1:
+                # Fork the workers right away, before this process runs the model or its tokenizer.
+                self._encode_pool = EncodePool(self._model, self.encode_workers)
+                self._encode_pool.start()
+        return self._model
+
+    def start(self):
+        """
+        Load the embedding model and start the encode pool now rather than on first use.
+
+        With `encode_workers`, call this on the main thread before any other threads run, since
+        the pool forks this process. Scoring later runs in worker threads, which must not fork.
+        """
+        self._ensure_model()
+
+    def encode(self, texts: List[str], normalize_embeddings: bool = False) -> torch.Tensor:
+        """
+        Embed texts, in this process or across the encode pool if `encode_workers` is set.
 
+        Args:
+            texts (List[str]): Texts to embed.
+            normalize_embeddings (bool): Normalize the embeddings to unit length.
+
+        Returns:
+            torch.Tensor: One embedding per text.
+        """
+        if self.encode_workers > 1:
+            self._ensure_model()
+            embeddings = self._encode_pool.encode(texts, batch_size=self.batch_size,
+                                                  normalize_embeddings=normalize_embeddings)
+            return torch.from_numpy(embeddings)
+        return self.model.encode(texts, batch_size=self.batch_size, convert_to_tensor=True,
+                                 normalize_embeddings=normalize_embeddings)
+
+    def close(self):
+        """Stop the encode pool, if one was started."""
+        if self._encode_pool is not None:
+            self._encode_pool.close()
+            self._encode_pool = None
+            self._model = None
 
     def text_similarity(self, baseline_texts: List[str], target_texts: List[str]) -> List[float]:
         """
@@ -44,25 +121,134 @@ class SimilarityMetrics:
         return one_to_one
 
 
-    def semantic_similarity(self, baseline_texts: List[str], target_texts: List[str]) -> List[float]:
+    def semantic_similarity(self, baseline_texts: List[str], target_texts: List[str],
+                            target_embeddings: Optional[torch.Tensor] = None) -> List[float]:
         """
         Calculate the semantic similarity between two texts using a pre-trained model.
         
         Args:
             text1 (str): The first text.
             text2 (str): The second text.
+            target_embeddings (Optional[torch.Tensor]): Embeddings of the target texts from `embed`,
+                                                        if they were already computed. With chunking they
+                                                        are only reused by mean pooling; max pooling
+                                                        compares individual windows.
         
         Returns:
             float: A similarity score between 0 and 1.
         """
         if not baseline_texts or not target_texts:
             raise ValueError("Both baseline_texts and target_texts must be non-empty lists.")
-        baseline_embeddings = self.model.encode(baseline_texts, batch_size=self.batch_size, convert_to_tensor=True)
-        target_embeddings = self.model.encode(target_texts, batch_size=self.batch_size, convert_to_tensor=True)
+        if self.chunk_tokens is not None:
+            if target_embeddings is None or self.pooling != 'mean':
+                return self._chunked_semantic_similarity(baseline_texts, target_texts)
+            # `embed` pools the windows by their mean, which is what mean pooling compares.
+            baseline_embeddings = self.embed(baseline_texts)
+            return torch.cosine_similarity(baseline_embeddings, target_embeddings, dim=1).cpu().numpy()
+        baseline_embeddings = self.encode(baseline_texts)
+        if target_embeddings is None:
+            target_embeddings = self.encode(target_texts)
         similarities = torch.cosine_similarity(baseline_embeddings, target_embeddings, dim=1)
         similarities = similarities.cpu().numpy()
         return similarities
 
+    def _split_windows(self, texts: List[str]) -> Tuple[List[str], List[int]]:
+        """
+        Split texts into token windows of at most `chunk_tokens` tokens.
+
+        Args:
+            texts (List[str]): Texts to split.
+
+        Returns:
+            Tuple[List[str], List[int]]: The windows of all texts, and for each window the index of its text.
+        """
+        tokenizer = self.model.tokenizer
+        # Leave room for the special tokens the model adds around every window.
+        max_tokens = self.chunk_tokens
+        if self.model.max_seq_length:
+            max_tokens = min(max_tokens, self.model.max_seq_length - 2)
+        stride = max(1, max_tokens - self.chunk_overlap)
+
+        token_ids = tokenizer(texts, add_special_tokens=False)['input_ids']
+        windows, owners, to_decode = [], [], []
+        for text_idx, (text, ids) in enumerate(zip(texts, token_ids)):
+            if len(ids) <= max_tokens:
+                windows.append(text)
+                owners.append(text_idx)
+                continue
+            for start in range(0, max(len(ids) - self.chunk_overlap, 1), stride):
+                to_decode.append((len(windows), ids[start:start + max_tokens]))
+                windows.append(None)
+                owners.append(text_idx)
+
+        if to_decode:
+            decoded = tokenizer.batch_decode([ids for _, ids in to_decode], skip_special_tokens=True)
+            for (window_idx, _), text in zip(to_decode, decoded):
+                windows[window_idx] = text
+        return windows, owners
+
+    def _encode_windows(self, texts: List[str]) -> Tuple[torch.Tensor, np.ndarray]:
+        """
+        Encode the token windows of all texts in a single `encode` call, which sorts them by
+        length so every batch holds windows of similar size.
+
+        Args:
+            texts (List[str]): Texts to encode.
+
+        Returns:
+            Tuple[torch.Tensor, np.ndarray]: The unit-length window embeddings, and bounds such that the
+                                             windows of text `i` are `embeddings[bounds[i]:bounds[i + 1]]`.
+        """
+        windows, owners = self._split_windows(texts)
+        embeddings = self.encode(windows, normalize_embeddings=True)
+        # Windows of a text are contiguous, so each text owns a slice of the embeddings.
+        bounds = np.concatenate([[0], np.cumsum(np.bincount(owners, minlength=len(texts)))])
+        return embeddings, bounds
+
+    def embed(self, texts: List[str]) -> torch.Tensor:
+        """
+        Embed texts to unit length, one embedding per text.
+
+        With chunking enabled, each text is embedded as the mean of its token windows, so long
+        texts are not truncated to the model's maximum sequence length.
+
+        Args:
+            texts (List[str]): Texts to embed.
+
+        Returns:
+            torch.Tensor: One unit-length embedding per text.
+        """
+        if self.chunk_tokens is None:
+            return self.encode(texts, normalize_embeddings=True)
+        embeddings, bounds = self._encode_windows(texts)
+        pooled = torch.stack([embeddings[bounds[idx]:bounds[idx + 1]].mean(dim=0) for idx in range(len(texts))])
+        return torch.nn.functional.normalize(pooled, dim=1)
+
+    def _chunked_semantic_similarity(self, baseline_texts: List[str], target_texts: List[str]) -> np.ndarray:
+        """
+        Calculate semantic similarity on token windows, so long outputs are not truncated.
+
+        Args:
+            baseline_texts (List[str]): Baseline outputs.
+            target_texts (List[str]): Target outputs.
+
+        Returns:
+            np.ndarray: One similarity score per pair.
+        """
+        embeddings, bounds = self._encode_windows(list(baseline_texts) + list(target_texts))
+
+        similarities = []
+        for pair_idx in range(len(baseline_texts)):
+            target_idx = len(baseline_texts) + pair_idx
+            baseline_windows = embeddings[bounds[pair_idx]:bounds[pair_idx + 1]]
+            target_windows = embeddings[bounds[target_idx]:bounds[target_idx + 1]]
+            if self.pooling == 'mean':
+                similarity = torch.cosine_similarity(baseline_windows.mean(dim=0), target_windows.mean(dim=0), dim=0)
+            else:
+                matrix = baseline_windows @ target_windows.T
+                similarity = (matrix.max(dim=1).values.mean() + matrix.max(dim=0).values.mean()) / 2
+            similarities.append(similarity)
+        return torch.stack(similarities).cpu().numpy()
 
 if __name__ == "__main__":
     texts1 = []
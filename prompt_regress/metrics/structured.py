@@ -0,0 +1,191 @@
+import json
+import numpy as np
+
+from typing import Any, Dict, List, Optional, Tuple
+from rapidfuzz import fuzz, process
+
+try:
+    import orjson
+    _loads = orjson.loads
+except ImportError:
+    _loads = json.loads
+
+
+# Marker for outputs that are not valid JSON (None is a valid JSON document).
+INVALID = object()
+
+
+def parse_json(text: str) -> Any:
+    """
+    Parse a JSON document, using orjson when it is installed.
+
+    Args:
+        text (str): The text to parse.
+
+    Returns:
+        Any: The parsed document, or `INVALID` if the text is not valid JSON.
+    """
+    try:
+        return _loads(text)
+    except (ValueError, TypeError):
+        return INVALID
+
+
+def flatten_json(document: Any, prefix: str = '$') -> Dict[str, Any]:
+    """
+    Flatten a JSON document into a mapping of leaf paths to leaf values.
+
+    Args:
+        document (Any): A parsed JSON document.
+        prefix (str): Path of the document itself.
+
+    Returns:
+        Dict[str, Any]: e.g. {'$.name': 'John', '$.tags[0]': 'a'}. Empty objects and arrays are leaves.
+    """
+    leaves = {}
+    stack = [(prefix, document)]
+    while stack:
+        path, value = stack.pop()
+        if isinstance(value, dict) and value:
+            stack.extend((f"{path}.{key}", child) for key, child in value.items())
+        elif isinstance(value, list) and value:
+            stack.extend((f"{path}[{idx}]", child) for idx, child in enumerate(value))
+        else:
+            leaves[path] = value
+    return leaves
+
+
+class JSONMetrics:
+    """
+    Structural comparison of JSON outputs.
+
+    Each output is parsed once and optionally validated against a JSON Schema that is
+    compiled when the class is created. Documents are compared path by path: the score
+    of a pair is the summed similarity of the leaves present on both sides divided by
+    the number of distinct leaf paths on either side.
+    """
+
+    def __init__(self, schema: Optional[Dict[str, Any]] = None):
+        """
+        Initialize the JSONMetrics class.
+
+        Args:
+            schema (Optional[Dict[str, Any]]): JSON Schema every output must satisfy.
+        """
+        self.validator = None
+        if schema is not None:
+            try:
+                from jsonschema.validators import validator_for
+            except ImportError:
+                raise ImportError("jsonschema is required to validate 'json_schema'. "
+                                  "Install it with `pip install prompt-regress[json]`.")
+            validator_class = validator_for(schema)
+            validator_class.check_schema(schema)
+            self.validator = validator_class(schema)
+
+    def is_valid(self, document: Any) -> bool:
+        """
+        Check that a parsed document is valid JSON and satisfies the schema, if any.
+
+        Args:
+            document (Any): A document returned by `parse_json`.
+
+        Returns:
+            bool: True if the document is valid.
+        """
+        if document is INVALID:
+            return False
+        return self.validator is None or self.validator.is_valid(document)
+
+    @staticmethod
+    def structural_diff(baseline: Dict[str, Any], target: Dict[str, Any]) -> Dict[str, List[str]]:
+        """
+        Compare two flattened documents path by path.
+
+        Args:
+            baseline (Dict[str, Any]): Flattened baseline document.
+            target (Dict[str, Any]): Flattened target document.
+
+        Returns:
+            Dict[str, List[str]]: Paths 'missing' from the target, 'added' in the target and 'changed' between both.
+        """
+        return {
+            'missing': sorted(baseline.keys() - target.keys()),
+            'added': sorted(target.keys() - baseline.keys()),
+            'changed': sorted(path for path in baseline.keys() & target.keys() if baseline[path] != target[path]),
+        }
+
+    def compare(self, baseline_texts: List[str], target_texts: List[str]) -> Tuple[np.ndarray, List[bool], List[bool], List[Dict[str, List[str]]]]:
+        """
+        Parse, validate and structurally compare pairs of JSON outputs.
+
+        Leaf similarities of all pairs are computed in one pass per value type: exact
+        matches for booleans, nulls and empty containers, relative difference for numbers
+        and a normalized edit distance for strings.
+
+        Args:
+            baseline_texts (List[str]): Baseline outputs.
+            target_texts (List[str]): Target outputs.
+
+        Returns:
+            Tuple: Similarity per pair (0 when either side is invalid), validity of the baseline
+                   and target outputs, and the structural diff of every pair.
+        """
+        if not baseline_texts or not target_texts:
+            raise ValueError("Both baseline_texts and target_texts must be non-empty lists.")
+
+        baseline_docs = [parse_json(text) for text in baseline_texts]
+        target_docs = [parse_json(text) for text in target_texts]
+        baseline_valid = [self.is_valid(doc) for doc in baseline_docs]
+        target_valid = [self.is_valid(doc) for doc in target_docs]
+
+        union_sizes = np.zeros(len(baseline_docs))
+        diffs = []
+        pairs, baseline_leaves, target_leaves = [], [], []
+        for pair_idx, (baseline_doc, target_doc) in enumerate(zip(baseline_docs, target_docs)):
+            if baseline_doc is INVALID or target_doc is INVALID:
+                diffs.append({'missing': [], 'added': [], 'changed': []})
+                continue
+            baseline_flat = flatten_json(baseline_doc)
+            target_flat = flatten_json(target_doc)
+            diffs.append(self.structural_diff(baseline_flat, target_flat))
+            union_sizes[pair_idx] = len(baseline_flat.keys() | target_flat.keys())
+            for path in baseline_flat.keys() & target_flat.keys():
+                pairs.append(pair_idx)
+                baseline_leaves.append(baseline_flat[path])
+                target_leaves.append(target_flat[path])
+
+        leaf_scores = self._leaf_similarity(baseline_leaves, target_leaves)
+        pairs = np.asarray(pairs, dtype=np.int64)
+        totals = np.bincount(pairs, weights=leaf_scores, minlength=len(baseline_docs)).astype(np.float64)
+        scores = np.divide(totals, union_sizes, out=np.zeros_like(union_sizes), where=union_sizes > 0)
+        return scores, baseline_valid, target_valid, diffs
+
+    @staticmethod
+    def _leaf_similarity(baseline_leaves: List[Any], target_leaves: List[Any]) -> np.ndarray:
+        """Similarity in [0, 1] of aligned leaf values, computed per value type."""
+        scores = np.zeros(len(baseline_leaves))
+        if not baseline_leaves:
+            return scores
+
+        def is_number(value):
+            return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+        numbers = np.array([is_number(a) and is_number(b) for a, b in zip(baseline_leaves, target_leaves)])
+        strings = np.array([isinstance(a, str) and isinstance(b, str) for a, b in zip(baseline_leaves, target_leaves)])
+        others = ~(numbers | strings)
+
+        if numbers.any():
+            a = np.array([v for v, n in zip(baseline_leaves, numbers) if n], dtype=np.float64)
+            b = np.array([v for v, n in zip(target_leaves, numbers) if n], dtype=np.float64)
+            scale = np.maximum(np.abs(a), np.abs(b))
+            relative = np.divide(np.abs(a - b), scale, out=np.zeros_like(scale), where=scale > 0)
+            scores[numbers] = 1.0 - np.clip(relative, 0.0, 1.0)
+        if strings.any():
+            a = [v for v, s in zip(baseline_leaves, strings) if s]
+            b = [v for v, s in zip(target_leaves, strings) if s]
+            scores[strings] = process.cpdist(a, b, scorer=fuzz.ratio) / 100.0
+        if others.any():
+            scores[others] = [float(a == b and type(a) is type(b))
+                              for a, b, o in zip(baseline_leaves, target_leaves, others) if o]
+        return scores
@@ -1,13 +1,19 @@
-from .base import ModelResponse, ModelProvider
+from .base import ModelResponse, ModelProvider, compute_cost, static_prefix
 from .anthropic_provider import AnthropicProvider
 from .openai_provider import OpenAIProvider
 from .local_provider import LocalProvider
+from .cassette import Cassette, CassetteProvider, CassetteMissError
 
 
 __all__ = [
     'AnthropicProvider',
     'OpenAIProvider',
     'LocalProvider',
+    'Cassette',
+    'CassetteProvider',
+    'CassetteMissError',
     'ModelResponse',
-    'ModelProvider'
+    'ModelProvider',
+    'compute_cost',
+    'static_prefix'
 ]
\ No newline at end of file
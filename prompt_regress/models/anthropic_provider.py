@@ -1,90 +1,114 @@
+import time
 import asyncio
 
 from anthropic import Anthropic, AsyncAnthropic
-from .base import ModelProvider, ModelResponse
+from typing import Any, Dict, List, Optional
+from .base import ModelProvider, ModelResponse, compute_cost
 
 class AnthropicProvider(ModelProvider):
-    def __init__(self, max_concurrency: int = 5):
+    def __init__(self, max_concurrency: int = 5, pricing: Optional[Dict[str, float]] = None):
         super().__init__()
 
         self.client = Anthropic()
         self.async_client = AsyncAnthropic()
         self.semaphore = asyncio.Semaphore(max_concurrency)
+        # Anthropic's tokenizer is only available through the API; `encoding` falls back to cl100k_base,
+        # a close offline approximation.
+        self.pricing = pricing
 
 
-    def generate(self, prompt: str, **kwargs) -> str:
+    @staticmethod
+    def _content(prompt: str, cache_prefix: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        Build the content blocks of a prompt, with a cache breakpoint after its static prefix.
+
+        Args:
+            prompt (str): The input prompt.
+            cache_prefix (Optional[str]): Leading part of the prompt shared with other requests.
+
+        Returns:
+            List[Dict[str, Any]]: The message content.
+        """
+        if not cache_prefix or not prompt.startswith(cache_prefix):
+            return [{"type": "text", "text": prompt}]
+
+        content = [{"type": "text", "text": cache_prefix, "cache_control": {"type": "ephemeral"}}]
+        if len(prompt) > len(cache_prefix):
+            content.append({"type": "text", "text": prompt[len(cache_prefix):]})
+        return content
+
+    def generate(self, prompt: str, cache_prefix: Optional[str] = None, **kwargs) -> str:
         """
         Get a completion for the given prompt using Anthropic's API.
 
         Args:
             prompt (str): The input prompt to complete.
+            cache_prefix (Optional[str]): Leading part of the prompt to cache with a cache-control block.
             **kwargs: Additional parameters for the model.
 
         Returns:
             str: The model's completion for the prompt.
         """
+        start = time.perf_counter()
         message = self.client.messages.create(
-            messages=[
-                {
-                    "role": "user",
-                    "content": [
-                        {
-                            "type": "text",
-                            "text": prompt
-                        }
-                    ]
-                }
-            ],
+            messages=[{"role": "user", "content": self._content(prompt, cache_prefix)}],
             **kwargs
             )
+        elapsed_ms = (time.perf_counter() - start) * 1000
 
-
-        return ModelResponse(
-            text=message.content[0].text,
-            prompt=prompt,
-            token_count=0,
-            cost=0,
-            response_time_ms=0,
-            metadata={},
-            raw_response=message
-            )
+        return self._to_model_response(prompt, message, elapsed_ms)
     
-    async def agenerate(self, prompt: str, **kwargs) -> str:
+    async def agenerate(self, prompt: str, cache_prefix: Optional[str] = None, **kwargs) -> str:
         """
         Asynchronously get a completion for the given prompt using Anthropic's API.
 
         Args:
             prompt (str): The input prompt to complete.
+            cache_prefix (Optional[str]): Leading part of the prompt to cache with a cache-control block.
             **kwargs: Additional parameters for the model.
 
         Returns:
             str: The model's completion for the prompt.
         """
         async with self.semaphore:
+            start = time.perf_counter()
             message = await self.async_client.messages.create(
-                messages=[
-                    {
-                        "role": "user",
-                        "content": [
-                            {
-                                "type": "text",
-                                "text": prompt
-                            }
-                        ]
-                    }
-                ],
+                messages=[{"role": "user", "content": self._content(prompt, cache_prefix)}],
                 **kwargs
                 )
+            elapsed_ms = (time.perf_counter() - start) * 1000
 
-            return ModelResponse(
-                text=message.content[0].text,
-                prompt=prompt,
-                token_count=0,
-                cost=0, 
-                response_time_ms=0,
-                metadata={},
-                raw_response=message
-                )
+            return self._to_model_response(prompt, message, elapsed_ms)
+
+    def _to_model_response(self, prompt: str, message, elapsed_ms: float) -> ModelResponse:
+        """
+        Build a ModelResponse, including usage metadata, from an Anthropic message.
+
+        Args:
+            prompt (str): The prompt that was completed.
+            message: The raw message returned by the Anthropic client.
+            elapsed_ms (float): Wall time of the request in milliseconds.
+
+        Returns:
+            ModelResponse: The model's response containing text and metadata.
+        """
+        usage = getattr(message, 'usage', None)
+        # Anthropic reports the tokens read from and written to the prompt cache separately.
+        cached_input_tokens = getattr(usage, 'cache_read_input_tokens', 0) or 0
+        cache_write_input_tokens = getattr(usage, 'cache_creation_input_tokens', 0) or 0
+        input_tokens = (getattr(usage, 'input_tokens', 0) or 0) + cached_input_tokens + cache_write_input_tokens
+        output_tokens = getattr(usage, 'output_tokens', 0) or 0
+
+        return ModelResponse(
+            text=message.content[0].text,
+            prompt=prompt,
+            token_count=input_tokens + output_tokens,
+            cost=compute_cost(self.pricing, input_tokens, output_tokens, cached_input_tokens, cache_write_input_tokens),
+            response_time_ms=elapsed_ms,
+            metadata={'input_tokens': input_tokens, 'output_tokens': output_tokens,
+                      'cached_input_tokens': cached_input_tokens, 'cache_write_input_tokens': cache_write_input_tokens},
+            raw_response=message
+            )
     
     def get_tokens(self, prompt: str) -> int:
         """
@@ -96,7 +120,7 @@ class AnthropicProvider(ModelProvider):
         Returns:
             int: The number of input tokens in the prompt.
         """
-        pass
+        return len(self.encoding.encode(prompt, allowed_special="all"))
 
 
     def get_cost(self, input_tokens: int, output_tokens: int) -> float:
@@ -110,4 +134,4 @@ class AnthropicProvider(ModelProvider):
         Returns:
             float: The cost for the completion.
         """
-        pass
\ No newline at end of file
+        return compute_cost(self.pricing, input_tokens, output_tokens)
\ No newline at end of file
@@ -1,7 +1,14 @@
+import string
+import tiktoken
+
 from abc import ABC, abstractmethod
+from functools import cached_property
 from dataclasses import dataclass
 from typing import Dict, Any, Optional
 
+# Price of prompt cache writes relative to regular input tokens, unless the pricing sets 'cache_write'.
+CACHE_WRITE_PREMIUM = 1.25
+
 
 @dataclass
 class ModelResponse:
@@ -15,11 +22,78 @@ class ModelResponse:
     raw_response: Optional[Any] = None
 
 
+def compute_cost(pricing: Optional[Dict[str, float]], input_tokens: int, output_tokens: int,
+                 cached_input_tokens: int = 0, cache_write_input_tokens: int = 0) -> float:
+    """
+    Calculate the cost of a completion from a model's pricing.
+
+    Args:
+        pricing (Optional[Dict[str, float]]): USD per million 'input' and 'output' tokens, and optionally
+                                              per million 'cached_input' tokens read from a prompt cache
+                                              and 'cache_write' tokens written to it.
+        input_tokens (int): The number of input tokens, including cached and cache-written ones.
+        output_tokens (int): The number of output tokens.
+        cached_input_tokens (int): The number of input tokens read from the prompt cache.
+        cache_write_input_tokens (int): The number of input tokens written to the prompt cache. Without a
+                                        'cache_write' price they cost `CACHE_WRITE_PREMIUM` times the input price.
+
+    Returns:
+        float: The cost for the completion, 0 if the model has no pricing.
+    """
+    if not pricing:
+        return 0.0
+    input_price = pricing.get('input', 0.0)
+    cached_price = pricing.get('cached_input', input_price)
+    write_price = pricing.get('cache_write', input_price * CACHE_WRITE_PREMIUM)
+    uncached_tokens = input_tokens - cached_input_tokens - cache_write_input_tokens
+    return (uncached_tokens * input_price + cached_input_tokens * cached_price
+            + cache_write_input_tokens * write_price + output_tokens * pricing.get('output', 0.0)) / 1_000_000
+
+
+def static_prefix(template: str) -> str:
+    """
+    Get the fixed part of a prompt template that precedes its first placeholder.
+
+    Every prompt rendered from the template starts with this prefix, so it can be cached
+    by providers that support prompt caching.
+
+    Args:
+        template (str): A `str.format` template.
+
+    Returns:
+        str: The prefix, or the whole template if it has no placeholders.
+    """
+    prefix = []
+    for literal_text, field_name, _, _ in string.Formatter().parse(template):
+        prefix.append(literal_text)
+        if field_name is not None:
+            break
+    return "".join(prefix)
+
+
 class ModelProvider(ABC):
     """
     Abstract base class for model providers.
     """
 
+    @classmethod
+    def get_encoding(cls, model: Optional[str] = None) -> tiktoken.Encoding:
+        """
+        Get the tokenizer used to count input tokens offline.
+
+        Args:
+            model (Optional[str]): Name of the model.
+
+        Returns:
+            tiktoken.Encoding: The model's encoding, or cl100k_base as an approximation.
+        """
+        return tiktoken.get_encoding("cl100k_base")
+
+    @cached_property
+    def encoding(self) -> tiktoken.Encoding:
+        """The tokenizer of this provider, loaded on first use."""
+        return self.get_encoding()
+
     @abstractmethod
     def generate(self, prompt: str, **kwargs) -> str:
         """
@@ -49,6 +123,16 @@ class ModelProvider(ABC):
         pass
 
 
+    async def awarmup(self, model: str, **kwargs):
+        """
+        Prepare the model before a run is timed, e.g. load it into memory. Does nothing by default.
+
+        Args:
+            model (str): Name of the model.
+            **kwargs: Generation parameters of the run.
+        """
+        pass
+
     @abstractmethod
     def get_tokens(self, prompt: str) -> int:
         """
@@ -0,0 +1,267 @@
+import json
+import hashlib
+
+try:
+    import fcntl
+except ImportError:  # Windows: no cross-process locking
+    fcntl = None
+
+from pathlib import Path
+from dataclasses import asdict
+from typing import Dict, Any, Optional
+from .base import ModelProvider, ModelResponse
+
+
+class CassetteMissError(LookupError):
+    """Raised when a replayed request has no matching recording in the cassette."""
+
+
+class Cassette:
+    """
+    An indexed, append-only store of recorded model responses.
+
+    Recordings are kept as compact JSON lines, one per request. On open only the
+    request keys are read to build an in-memory index of byte offsets; a response
+    is parsed from disk only when it is looked up.
+
+    Several processes may share a cassette: appends are serialized with a file lock,
+    and a lookup that misses picks up the recordings appended by other processes.
+    """
+
+    def __init__(self, path: Path):
+        """
+        Open (or lazily create) a cassette file.
+
+        Args:
+            path (Path): Path to the cassette file.
+        """
+        self.path = Path(path)
+        self._index: Dict[str, int] = {}
+        self._indexed_size = 0
+        self._build_index()
+
+    @staticmethod
+    def make_key(provider: str, prompt: str, **kwargs) -> str:
+        """
+        Build the lookup key for a request.
+
+        Args:
+            provider (str): Name of the provider serving the request.
+            prompt (str): The input prompt.
+            **kwargs: Model name and generation parameters of the request.
+
+        Returns:
+            str: A hex digest identifying the request.
+        """
+        payload = json.dumps({'provider': provider, 'prompt': prompt, 'kwargs': kwargs}, sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def _build_index(self):
+        """
+        Scan the part of the cassette file not indexed yet and record the byte offset of every key.
+
+        A trailing line without a newline is still being written and is picked up by a later
+        scan; a corrupt line is skipped. If the file shrank, it was replaced and is indexed again.
+        """
+        try:
+            size = self.path.stat().st_size
+        except FileNotFoundError:
+            return
+        if size == self._indexed_size:
+            return
+        if size < self._indexed_size:
+            self._index.clear()
+            self._indexed_size = 0
+
+        offset = self._indexed_size
+        with open(self.path, 'rb') as file:
+            if fcntl is not None:
+                fcntl.flock(file, fcntl.LOCK_SH)
+            file.seek(offset)
+            for line in file:
+                if not line.endswith(b'\n'):
+                    break
+                if line.strip():
+                    try:
+                        key = json.loads(line)['key']
+                    except (ValueError, KeyError, TypeError):
+                        print(f"⚠️ Skipping corrupt recording at byte {offset} of {self.path}")
+                    else:
+                        self._index[key] = offset
+                offset += len(line)
+        self._indexed_size = offset
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._index
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def get(self, key: str) -> Optional[ModelResponse]:
+        """
+        Look up a recorded response.
+
+        Args:
+            key (str): Request key produced by `make_key`.
+
+        Returns:
+            Optional[ModelResponse]: The recorded response with a cost of 0, or None if not recorded.
+        """
+        offset = self._index.get(key)
+        if offset is None:
+            # Another process may have recorded it since the index was built: index the appended bytes.
+            self._build_index()
+            offset = self._index.get(key)
+        if offset is None:
+            return None
+
+        with open(self.path, 'rb') as file:
+            file.seek(offset)
+            record = json.loads(file.readline())
+
+        response = ModelResponse(**record['response'])
+        # A replay costs nothing; the recorded cost is kept for reference only.
+        response.metadata = {**response.metadata, 'replayed': True, 'recorded_cost': response.cost}
+        response.cost = 0.0
+        return response
+
+    def put(self, key: str, response: ModelResponse):
+        """
+        Append a response to the cassette. A later recording of the same key wins.
+
+        Args:
+            key (str): Request key produced by `make_key`.
+            response (ModelResponse): The response to record.
+        """
+        data = asdict(response)
+        data.pop('raw_response', None)
+        line = json.dumps({'key': key, 'response': data}, separators=(',', ':'), default=str) + '\n'
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.path, 'ab') as file:
+            if fcntl is not None:
+                fcntl.flock(file, fcntl.LOCK_EX)
+            offset = file.seek(0, 2)
+            file.write(line.encode('utf-8'))
+        self._index[key] = offset
+
+
+class CassetteProvider(ModelProvider):
+    """
+    Provider wrapper that records responses to, or replays them from, a cassette.
+
+    In 'record' mode every request goes to the wrapped provider and its response is
+    stored. In 'replay' mode requests are served from the cassette; on a miss the
+    request either fails (`on_miss='fail'`) or falls through to the wrapped provider
+    and is recorded (`on_miss='live'`).
+    """
+
+    def __init__(self, cassette: Cassette, provider_name: str, provider: Optional[ModelProvider] = None,
+                 mode: str = 'replay', on_miss: str = 'fail'):
+        """
+        Initialize the CassetteProvider.
+
+        Args:
+            cassette (Cassette): Cassette to record to / replay from.
+            provider_name (str): Name of the wrapped provider, used in request keys.
+            provider (Optional[ModelProvider]): The live provider. May be omitted for strict replay.
+            mode (str): Either 'record' or 'replay'.
+            on_miss (str): Either 'fail' or 'live'; only used in replay mode.
+        """
+        super().__init__()
+        if mode not in ('record', 'replay'):
+            raise ValueError(f"Unknown cassette mode: {mode}")
+        if on_miss not in ('fail', 'live'):
+            raise ValueError(f"Unknown cassette miss policy: {on_miss}")
+        if provider is None and (mode == 'record' or on_miss == 'live'):
+            raise ValueError("A live provider is required to record responses.")
+
+        self.cassette = cassette
+        self.provider_name = provider_name
+        self.provider = provider
+        self.mode = mode
+        self.on_miss = on_miss
+
+    def _lookup(self, prompt: str, kwargs: Dict[str, Any]):
+        """Return the request key and, in replay mode, the recorded response (if any)."""
+        # The cached prefix only changes how a request is sent, not its response.
+        kwargs = {name: value for name, value in kwargs.items() if name != 'cache_prefix'}
+        key = Cassette.make_key(self.provider_name, prompt, **kwargs)
+        if self.mode == 'record':
+            return key, None
+
+        response = self.cassette.get(key)
+        if response is None and self.on_miss == 'fail':
+            raise CassetteMissError(f"No recorded response for {kwargs.get('model')} ({self.provider_name}) "
+                                    f"and prompt: {prompt[:80]!r}")
+        return key, response
+
+    def generate(self, prompt: str, **kwargs) -> ModelResponse:
+        """
+        Get a completion for the given prompt, from the cassette or the live provider.
+
+        Args:
+            prompt (str): The input prompt to complete.
+            **kwargs: Additional parameters for the model.
+
+        Returns:
+            ModelResponse: The model's response containing text and metadata.
+        """
+        key, response = self._lookup(prompt, kwargs)
+        if response is None:
+            response = self.provider.generate(prompt, **kwargs)
+            self.cassette.put(key, response)
+        return response
+
+    async def agenerate(self, prompt: str, **kwargs) -> ModelResponse:
+        """
+        Asynchronously get a completion for the given prompt, from the cassette or the live provider.
+
+        Args:
+            prompt (str): The input prompt to complete.
+            **kwargs: Additional parameters for the model.
+
+        Returns:
+            ModelResponse: The model's response containing text and metadata.
+        """
+        key, response = self._lookup(prompt, kwargs)
+        if response is None:
+            response = await self.provider.agenerate(prompt, **kwargs)
+            self.cassette.put(key, response)
+        return response
+
+    async def awarmup(self, model: str, **kwargs):
+        """
+        Warm up the live provider when recording. Replays never reach it, so they skip the warm-up.
+
+        Args:
+            model (str): Name of the model.
+            **kwargs: Generation parameters of the run.
+        """
+        if self.mode == 'record':
+            await self.provider.awarmup(model, **kwargs)
+
+    def get_tokens(self, prompt: str) -> int:
+        """
+        Calculate the number of input tokens for the given prompt using the wrapped provider.
+
+        Args:
+            prompt (str): The input prompt to analyze.
+
+        Returns:
+            int: The number of input tokens in the prompt.
+        """
+        return self.provider.get_tokens(prompt) if self.provider else None
+
+    def get_cost(self, input_tokens: int, output_tokens: int) -> float:
+        """
+        Calculate the cost for the given input and output tokens using the wrapped provider.
+
+        Args:
+            input_tokens (int): The number of input tokens.
+            output_tokens (int): The number of output tokens.
+
+        Returns:
+            float: The cost for the completion.
+        """
+        return self.provider.get_cost(input_tokens, output_tokens) if self.provider else None
@@ -1,75 +1,246 @@
+import time
+import httpx
 import asyncio
-import tiktoken
 
-from ollama import Client, ChatResponse, AsyncClient
-from .base import ModelProvider, ModelResponse
+from ollama import Client, ChatResponse, AsyncClient, ResponseError
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Union
+from .base import ModelProvider, ModelResponse, compute_cost
+
+# How long Ollama keeps a model loaded when prompt caching is on, so that requests sharing
+# a prompt prefix reuse its KV cache instead of re-evaluating the prefix.
+CACHE_KEEP_ALIVE = "30m"
+
+@dataclass(eq=False)
+class OllamaHost:
+    """An Ollama server of a LocalProvider and its load-balancing state."""
+    url: str
+    client: Client
+    async_client: AsyncClient
+    semaphore: asyncio.Semaphore
+    outstanding: int = 0
+    unhealthy_until: float = 0.0
+
+    @property
+    def healthy(self) -> bool:
+        return self.unhealthy_until <= time.monotonic()
+
+
+def _is_host_failure(error: Exception) -> bool:
+    """Whether an error means the host is down, as opposed to a bad request."""
+    if isinstance(error, ResponseError):
+        return error.status_code >= 500
+    return isinstance(error, (ConnectionError, httpx.TransportError))
+
 
 class LocalProvider(ModelProvider):
-    def __init__(self, host: str, max_concurrency: int = 5):
+    def __init__(self, host: Union[str, List[str]], max_concurrency: int = 5, pricing: Optional[Dict[str, float]] = None,
+                 keep_alive: Optional[str] = None, retry_after: float = 30.0):
         """
-        Initialize the LocalProvider with the Ollama client.
+        Initialize the LocalProvider with one Ollama client per host.
+
+        Requests go to the healthy host with the fewest outstanding requests. A host that fails
+        to answer is taken out of rotation for `retry_after` seconds and the request is retried
+        on the next host.
 
         Args:
-            url (str): The URL of the Ollama server. Defaults to "http://localhost:11434".
+            host (Union[str, List[str]]): The URL of the Ollama server, or the URLs of several servers
+                                          serving the same models.
+            max_concurrency (int): Number of concurrent requests per host.
+            pricing (Optional[Dict[str, float]]): USD per million 'input' and 'output' tokens, e.g. to account
+                                                  for hardware cost. Local models are free by default.
+            keep_alive (Optional[str]): How long Ollama keeps the model loaded after a request, e.g. "30m".
+            retry_after (float): Seconds a failed host is skipped before it is tried again.
         """
         super().__init__()
-        self.client = Client(host=host)
-        self.async_client = AsyncClient(host=host)
-        self.semaphore = asyncio.Semaphore(max_concurrency)
-        self.encoding = tiktoken.get_encoding("cl100k_base")
+        urls = [host] if isinstance(host, str) else list(host)
+        if not urls:
+            raise ValueError("At least one host is required.")
+        self.hosts = [
+            OllamaHost(url, Client(host=url), AsyncClient(host=url), asyncio.Semaphore(max_concurrency))
+            for url in urls
+        ]
+        self.pricing = pricing
+        self.keep_alive = keep_alive
+        self.retry_after = retry_after
+
+    def _keep_alive(self, cache_prefix: Optional[str], kwargs: dict) -> Optional[str]:
+        """The keep_alive of a request: explicit, configured, or long enough to reuse a cached prefix."""
+        keep_alive = kwargs.pop('keep_alive', self.keep_alive)
+        if keep_alive is None and cache_prefix:
+            keep_alive = CACHE_KEEP_ALIVE
+        return keep_alive
+
+    def _pick_host(self, tried: List[OllamaHost]) -> Optional[OllamaHost]:
+        """
+        Pick the host of the next request: the healthy host with the fewest outstanding requests.
+
+        Args:
+            tried (List[OllamaHost]): Hosts that already failed for this request.
 
-    def generate(self, prompt: str, **kwargs) -> ModelResponse:
+        Returns:
+            Optional[OllamaHost]: The host, or None if every host was tried. When all remaining hosts
+                                  are marked unhealthy, they are tried anyway.
+        """
+        remaining = [host for host in self.hosts if host not in tried]
+        healthy = [host for host in remaining if host.healthy]
+        return min(healthy or remaining, key=lambda host: host.outstanding, default=None)
+
+    def _mark_unhealthy(self, host: OllamaHost, error: Exception):
+        host.unhealthy_until = time.monotonic() + self.retry_after
+        if len(self.hosts) > 1:
+            print(f"⚠️ Ollama host {host.url} failed ({error}). Skipping it for {self.retry_after:.0f}s.")
+
+    def generate(self, prompt: str, cache_prefix: Optional[str] = None, **kwargs) -> ModelResponse:
         """
         Get a completion for the given prompt using Ollama's API.
 
         Args:
             prompt (str): The input prompt to complete.
+            cache_prefix (Optional[str]): Leading part of the prompt shared with other requests. Ollama
+                                          reuses the KV cache of a matching prefix while the model stays loaded.
             **kwargs: Additional parameters for the model.
 
         Returns:
             ModelResponse: The model's response containing text and metadata.
         """
-        response: ChatResponse = self.client.chat(
-            messages=[{"role": "user", "content": prompt}],
-            model=kwargs.pop('model'),
-            options=kwargs
-        )
-
-        return ModelResponse(
-            text=response.message.content,
-            prompt=prompt,
-            token_count=0,
-            cost=0.0,
-            response_time_ms=0.0,
-            metadata={},
-            raw_response=response
-        )
+        keep_alive = self._keep_alive(cache_prefix, kwargs)
+        model = kwargs.pop('model')
+        tried = []
+        while (host := self._pick_host(tried)) is not None:
+            host.outstanding += 1
+            try:
+                start = time.perf_counter()
+                response: ChatResponse = host.client.chat(
+                    messages=[{"role": "user", "content": prompt}],
+                    model=model,
+                    options=kwargs,
+                    keep_alive=keep_alive
+                )
+                elapsed_ms = (time.perf_counter() - start) * 1000
+            except Exception as e:
+                if not _is_host_failure(e) or len(tried) + 1 == len(self.hosts):
+                    raise
+                self._mark_unhealthy(host, e)
+                tried.append(host)
+                continue
+            finally:
+                host.outstanding -= 1
+            return self._to_model_response(prompt, response, elapsed_ms, host)
     
-    async def agenerate(self, prompt, **kwargs):
+    async def agenerate(self, prompt, cache_prefix: Optional[str] = None, **kwargs):
         """
         Asynchronously get a completion for the given prompt using Ollama's API.
 
         Args:
             prompt (str): The input prompt to complete.
+            cache_prefix (Optional[str]): Leading part of the prompt shared with other requests. Ollama
+                                          reuses the KV cache of a matching prefix while the model stays loaded.
             **kwargs: Additional parameters for the model.
 
         Returns:
             ModelResponse: The model's response containing text and metadata.
         """
-        async with self.semaphore:
-            response: ChatResponse = await self.async_client.chat(
-                messages=[{"role": "user", "content": prompt}],
-                model=kwargs.pop('model'),
-                options=kwargs
-            )
+        keep_alive = self._keep_alive(cache_prefix, kwargs)
+        model = kwargs.pop('model')
+        tried = []
+        while (host := self._pick_host(tried)) is not None:
+            # Counted while queued on the host's semaphore too, so load is spread before requests start.
+            host.outstanding += 1
+            try:
+                async with host.semaphore:
+                    start = time.perf_counter()
+                    response: ChatResponse = await host.async_client.chat(
+                        messages=[{"role": "user", "content": prompt}],
+                        model=model,
+                        options=kwargs,
+                        keep_alive=keep_alive
+                    )
+                    elapsed_ms = (time.perf_counter() - start) * 1000
+            except Exception as e:
+                if not _is_host_failure(e) or len(tried) + 1 == len(self.hosts):
+                    raise
+                self._mark_unhealthy(host, e)
+                tried.append(host)
+                continue
+            finally:
+                host.outstanding -= 1
+            return self._to_model_response(prompt, response, elapsed_ms, host)
+
+    async def acheck_health(self, timeout: float = 5.0) -> List[str]:
+        """
+        Probe every host and update its health.
+
+        Args:
+            timeout (float): Seconds to wait for each host.
+
+        Returns:
+            List[str]: URLs of the healthy hosts.
+        """
+        async def probe(host: OllamaHost):
+            try:
+                await asyncio.wait_for(host.async_client.ps(), timeout)
+                host.unhealthy_until = 0.0
+            except Exception as e:
+                self._mark_unhealthy(host, e)
+
+        await asyncio.gather(*(probe(host) for host in self.hosts))
+        return [host.url for host in self.hosts if host.healthy]
+
+    async def awarmup(self, model: str, **kwargs):
+        """
+        Load the model on every healthy host, so the first timed request does not pay for a cold start.
+
+        Args:
+            model (str): Name of the model.
+            **kwargs: Generation parameters of the run; only `keep_alive` is used.
+
+        Raises:
+            ConnectionError: If no host could load the model.
+        """
+        keep_alive = kwargs.get('keep_alive', self.keep_alive)
+        await self.acheck_health()
+
+        async def load(host: OllamaHost):
+            try:
+                # An empty prompt only loads the model into memory.
+                await host.async_client.generate(model=model, prompt='', keep_alive=keep_alive)
+            except Exception as e:
+                if not _is_host_failure(e):
+                    raise
+                self._mark_unhealthy(host, e)
+
+        await asyncio.gather(*(load(host) for host in self.hosts if host.healthy))
+        if not any(host.healthy for host in self.hosts):
+            raise ConnectionError(f"None of the Ollama hosts could load {model}: {', '.join(h.url for h in self.hosts)}")
+
+    def _to_model_response(self, prompt: str, response: ChatResponse, elapsed_ms: float,
+                           host: Optional[OllamaHost] = None) -> ModelResponse:
+        """
+        Build a ModelResponse, including usage metadata, from an Ollama chat response.
+
+        Args:
+            prompt (str): The prompt that was completed.
+            response (ChatResponse): The raw response returned by the Ollama client.
+            elapsed_ms (float): Wall time of the request in milliseconds.
+            host (Optional[OllamaHost]): The host that served the request.
+
+        Returns:
+            ModelResponse: The model's response containing text and metadata.
+        """
+        input_tokens = response.prompt_eval_count or 0
+        output_tokens = response.eval_count or 0
+        metadata = {'input_tokens': input_tokens, 'output_tokens': output_tokens}
+        if host is not None:
+            metadata['host'] = host.url
 
         return ModelResponse(
             text=response.message.content,
             prompt=prompt,
-            token_count=0,
-            cost=0.0,
-            response_time_ms=0.0,
-            metadata={},
+            token_count=input_tokens + output_tokens,
+            cost=self.get_cost(input_tokens, output_tokens),
+            response_time_ms=elapsed_ms,
+            metadata=metadata,
             raw_response=response
         )
     
@@ -83,7 +254,7 @@ class LocalProvider(ModelProvider):
         Returns:
             int: The number of input tokens in the prompt.
         """
-        pass
+        return len(self.encoding.encode(prompt, allowed_special="all"))
     
     def get_cost(self, input_tokens, output_tokens) -> float:
         """
@@ -96,4 +267,4 @@ class LocalProvider(ModelProvider):
         Returns:
             float: The cost for the completion.
         """
-        pass
\ No newline at end of file
+        return compute_cost(self.pricing, input_tokens, output_tokens)
\ No newline at end of file
@@ -1,74 +1,122 @@
+import time
+import hashlib
 import tiktoken
 import asyncio
 from openai import OpenAI, AsyncOpenAI
-from .base import ModelProvider, ModelResponse
+from typing import Dict, Optional
+from .base import ModelProvider, ModelResponse, compute_cost
 
 class OpenAIProvider(ModelProvider):
-    def __init__(self, model, max_concurrency: int = 5):
+    def __init__(self, model, max_concurrency: int = 5, pricing: Optional[Dict[str, float]] = None):
         super().__init__()
         self.client = OpenAI()
         self.async_client =  AsyncOpenAI()
         self.semaphore = asyncio.Semaphore(max_concurrency)
+        self.pricing = pricing
+        self.encoding = self.get_encoding(model)
 
+    @classmethod
+    def get_encoding(cls, model: Optional[str] = None) -> tiktoken.Encoding:
+        """
+        Get the tokenizer of an OpenAI model.
+
+        Args:
+            model (Optional[str]): Name of the model.
+
+        Returns:
+            tiktoken.Encoding: The model's encoding, or cl100k_base for unknown models.
+        """
         try:
-            self.encoding = tiktoken.encoding_for_model(model)
+            return tiktoken.encoding_for_model(model)
         except KeyError:
-            self.encoding = tiktoken.get_encoding("cl100k_base")
+            return tiktoken.get_encoding("cl100k_base")
+
+
+    @staticmethod
+    def _cache_kwargs(cache_prefix: Optional[str], kwargs: dict) -> dict:
+        """
+        Add a prompt cache key derived from the static prefix of the prompt.
 
+        OpenAI caches prompt prefixes automatically; a stable key routes requests that share
+        a prefix to the same cache, which raises the hit rate.
+        """
+        if not cache_prefix or 'prompt_cache_key' in kwargs:
+            return kwargs
+        key = hashlib.sha256(cache_prefix.encode('utf-8')).hexdigest()[:32]
+        extra_body = {'prompt_cache_key': key, **kwargs.get('extra_body', {})}
+        return {**kwargs, 'extra_body': extra_body}
 
-    def generate(self, prompt, **kwargs) -> ModelResponse:
+    def generate(self, prompt, cache_prefix: Optional[str] = None, **kwargs) -> ModelResponse:
         """
         Get a completion for the given prompt using OpenAI's API.
 
         Args:
             prompt (str): The input prompt to complete.
+            cache_prefix (Optional[str]): Leading part of the prompt shared with other requests.
             **kwargs: Additional parameters for the model.
 
         Returns:
             str: The model's completion for the prompt.
         """
+        start = time.perf_counter()
         response = self.client.responses.create(
             input=prompt,
-            **kwargs
+            **self._cache_kwargs(cache_prefix, kwargs)
         )
+        elapsed_ms = (time.perf_counter() - start) * 1000
 
-        return ModelResponse(
-            text=response.output_text,
-            prompt=prompt,
-            token_count=0,
-            cost=0,
-            response_time_ms=0,
-            metadata={},
-            raw_response=response
-        )
+        return self._to_model_response(prompt, response, elapsed_ms)
     
-    async def agenerate(self, prompt, **kwargs) -> ModelResponse:
+    async def agenerate(self, prompt, cache_prefix: Optional[str] = None, **kwargs) -> ModelResponse:
         """
         Asynchronously get a completion for the given prompt using OpenAI's API.
 
         Args:
             prompt (str): The input prompt to complete.
+            cache_prefix (Optional[str]): Leading part of the prompt shared with other requests.
             **kwargs: Additional parameters for the model.
 
         Returns:
             str: The model's completion for the prompt.
         """
         async with self.semaphore:
+            start = time.perf_counter()
             response = await self.async_client.responses.create(
                 input=prompt,
-                **kwargs
-            )
-            
-            return ModelResponse(
-                text=response.output_text,
-                prompt=prompt,
-                token_count=0,
-                cost=0,
-                response_time_ms=0,
-                metadata={},
-                raw_response=response
+                **self._cache_kwargs(cache_prefix, kwargs)
             )
-    
+            elapsed_ms = (time.perf_counter() - start) * 1000
+
+            return self._to_model_response(prompt, response, elapsed_ms)
+
+    def _to_model_response(self, prompt: str, response, elapsed_ms: float) -> ModelResponse:
+        """
+        Build a ModelResponse, including usage metadata, from an OpenAI response.
+
+        Args:
+            prompt (str): The prompt that was completed.
+            response: The raw response returned by the OpenAI client.
+            elapsed_ms (float): Wall time of the request in milliseconds.
+
+        Returns:
+            ModelResponse: The model's response containing text and metadata.
+        """
+        usage = getattr(response, 'usage', None)
+        input_tokens = getattr(usage, 'input_tokens', 0) or 0
+        output_tokens = getattr(usage, 'output_tokens', 0) or 0
+        cached_input_tokens = getattr(getattr(usage, 'input_tokens_details', None), 'cached_tokens', 0) or 0
+
+        return ModelResponse(
+            text=response.output_text,
+            prompt=prompt,
+            token_count=input_tokens + output_tokens,
+            cost=compute_cost(self.pricing, input_tokens, output_tokens, cached_input_tokens),
+            response_time_ms=elapsed_ms,
+            metadata={'input_tokens': input_tokens, 'output_tokens': output_tokens,
+                      'cached_input_tokens': cached_input_tokens},
+            raw_response=response
+        )
+
 
     def get_tokens(self, prompt: str) -> int:
         """
@@ -95,4 +143,4 @@ class OpenAIProvider(ModelProvider):
         Returns:
             float: The cost for the completion.
         """
-        pass
\ No newline at end of file
+        return compute_cost(self.pricing, input_tokens, output_tokens)
\ No newline at end of file
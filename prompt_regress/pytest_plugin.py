@@ -0,0 +1,161 @@
+"""
+pytest plugin that runs the test cases of a prompt-regress configuration as pytest items.
+
+The plugin stays inactive until a baseline and a target model are given. Then every test
+case of the configuration file becomes one pytest item:
+
+    pytest prompt-regress.yml --prompt-regress-baseline gpt-4 --prompt-regress-target claude-opus
+
+One `PromptRegress` engine, with its embedding model and provider clients, is shared by all
+items of a session and is available to regular tests through the `prompt_regress` fixture.
+The providers are warmed up once, and the results of all items are recorded in the history
+as a single run at the end of the session.
+"""
+import pytest
+
+from pathlib import Path
+from dataclasses import asdict
+from typing import TYPE_CHECKING, List, Optional
+from .results import ComparisonResult, ResultTable
+
+# The engine pulls in PyTorch; it is only imported once the plugin is actually used, so that
+# installing prompt-regress does not slow down the startup of unrelated pytest sessions.
+if TYPE_CHECKING:
+    from .core import PromptRegress
+
+_ENGINE = pytest.StashKey['PromptRegress']()
+_WARMED_UP = pytest.StashKey[bool]()
+# Name of the item property carrying its results; pytest-xdist sends it to the controller with the report.
+_RESULTS_PROPERTY = 'prompt_regress_results'
+
+
+class PromptRegressionFailure(Exception):
+    """Raised by an item whose test case has failing results."""
+
+    def __init__(self, results: List[ComparisonResult]):
+        super().__init__(f"{len(results)} input(s) regressed")
+        self.results = results
+
+
+def pytest_addoption(parser):
+    group = parser.getgroup('prompt-regress')
+    group.addoption('--prompt-regress-config', default=None,
+                    help='Configuration file whose test cases are collected. Defaults to prompt-regress.yml.')
+    group.addoption('--prompt-regress-baseline', default=None, help='Baseline model name.')
+    group.addoption('--prompt-regress-target', default=None, help='Target model name.')
+    group.addoption('--prompt-regress-cache', action='store_true', default=None,
+                    help='Reuse recorded model responses from the cassette and record new ones. '
+                         'The cassette is shared by all pytest-xdist workers.')
+    parser.addini('prompt_regress_config', 'Configuration file of prompt-regress.', default='prompt-regress.yml')
+    parser.addini('prompt_regress_baseline', 'Baseline model name.', default=None)
+    parser.addini('prompt_regress_target', 'Target model name.', default=None)
+    parser.addini('prompt_regress_cache', 'Reuse and record model responses in the cassette.', type='bool', default=False)
+
+
+def _option(config: pytest.Config, name: str):
+    """A plugin option from the command line, falling back to the ini file."""
+    value = config.getoption(f'--prompt-regress-{name}')
+    return value if value is not None else config.getini(f'prompt_regress_{name}')
+
+
+def _engine(config: pytest.Config) -> 'PromptRegress':
+    """
+    The engine of this pytest process, created on first use.
+
+    With pytest-xdist every worker is its own process and gets its own engine. Each item runs
+    on exactly one worker, so no generation is made twice; with `--prompt-regress-cache` the
+    workers also share recorded responses through the cassette file.
+    """
+    if _ENGINE not in config.stash:
+        from .core import PromptRegress
+        cache = _option(config, 'cache')
+        engine = PromptRegress(config.rootpath / _option(config, 'config'),
+                               cassette_mode='replay' if cache else None, on_miss='live')
+        # Items are recorded together as one run by `HistoryRecorder` at the end of the session.
+        engine.record_history = False
+        config.stash[_ENGINE] = engine
+    return config.stash[_ENGINE]
+
+
+class HistoryRecorder:
+    """
+    Collects the results of all items and records them in the history as one run.
+
+    Under pytest-xdist the results of every worker reach the controller with the item
+    reports, so the whole session is recorded once, by the controller.
+    """
+
+    def __init__(self, config: pytest.Config):
+        self.config = config
+        self.results: List[dict] = []
+
+    def pytest_runtest_logreport(self, report: pytest.TestReport):
+        if report.when == 'call':
+            for name, value in report.user_properties:
+                if name == _RESULTS_PROPERTY:
+                    self.results.extend(value)
+
+    def pytest_sessionfinish(self, session: pytest.Session):
+        if hasattr(self.config, 'workerinput') or not self.results:
+            return
+        engine = _engine(self.config)
+        if engine.regression_options.get('history', True):
+            results = ResultTable(ComparisonResult(**result) for result in self.results)
+            engine.history.record_run(_option(self.config, 'baseline'), _option(self.config, 'target'), results)
+
+
+def pytest_configure(config: pytest.Config):
+    if _option(config, 'baseline') and _option(config, 'target'):
+        config.pluginmanager.register(HistoryRecorder(config), 'prompt-regress-history')
+
+
+def pytest_unconfigure(config: pytest.Config):
+    if _ENGINE in config.stash:
+        config.stash[_ENGINE].close()
+        del config.stash[_ENGINE]
+
+
+def pytest_collect_file(file_path: Path, parent: pytest.Collector) -> Optional[pytest.Collector]:
+    config = parent.config
+    if not (_option(config, 'baseline') and _option(config, 'target')):
+        return None
+    if file_path.resolve() == (config.rootpath / _option(config, 'config')).resolve():
+        return PromptRegressFile.from_parent(parent, path=file_path)
+    return None
+
+
+class PromptRegressFile(pytest.File):
+    """A prompt-regress configuration file, collected as one item per test case."""
+
+    def collect(self):
+        for test_case in _engine(self.config).config.get('test_cases', []):
+            yield PromptRegressItem.from_parent(self, name=test_case['name'])
+
+
+class PromptRegressItem(pytest.Item):
+    """One test case of the configuration, compared between the baseline and the target model."""
+
+    def runtest(self):
+        engine = _engine(self.config)
+        results = engine.compare_models(_option(self.config, 'baseline'), _option(self.config, 'target'),
+                                        test_cases=[self.name], warmup=not self.config.stash.get(_WARMED_UP, False))
+        self.config.stash[_WARMED_UP] = True
+        self.user_properties.append((_RESULTS_PROPERTY, [asdict(result) for result in results]))
+        failed = [result for result in results if not result.passed]
+        if failed:
+            raise PromptRegressionFailure(failed)
+
+    def repr_failure(self, excinfo, style=None):
+        if isinstance(excinfo.value, PromptRegressionFailure):
+            report = _engine(self.config).generate_report(excinfo.value.results, verbose=True)
+            return f"{excinfo.value}\n\n{report}"
+        return super().repr_failure(excinfo, style=style)
+
+    def reportinfo(self):
+        return self.path, None, f"prompt-regress: {self.name}"
+
+
+@pytest.fixture(scope='session')
+def prompt_regress(pytestconfig: pytest.Config) -> 'PromptRegress':
+    """The `PromptRegress` engine shared by the whole session."""
+    return _engine(pytestconfig)
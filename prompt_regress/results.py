@@ -0,0 +1,270 @@
+import json
+import math
+import numpy as np
+
+from array import array
+from pathlib import Path
+from collections.abc import Sequence
+from dataclasses import dataclass, fields
+from typing import Dict, Any, List, Optional, Iterable, Iterator, TextIO, get_type_hints, get_origin, get_args, Union
+
+
+@dataclass(slots=True)
+class ComparisonResult:
+    """Class to hold the results of a model comparison."""
+    test_case: str
+    prompt: str
+    baseline_output: str
+    target_output: str
+    text_similarity: Optional[float]
+    semantic_similarity: Optional[float]
+    passed: bool
+    baseline_response_time_ms: float = 0.0
+    target_response_time_ms: float = 0.0
+    baseline_cost: float = 0.0
+    target_cost: float = 0.0
+    baseline_output_tokens: int = 0
+    target_output_tokens: int = 0
+    baseline_input_tokens: int = 0
+    target_input_tokens: int = 0
+    baseline_cached_input_tokens: int = 0
+    target_cached_input_tokens: int = 0
+    json_similarity: Optional[float] = None
+    json_diff: Optional[str] = None
+    rouge_l: Optional[float] = None
+    bleu: Optional[float] = None
+    token_jaccard: Optional[float] = None
+    length_ratio: Optional[float] = None
+    drift_similarity: Optional[float] = None
+    failure_cluster: Optional[int] = None
+
+
+# array typecodes used to store each field type. Strings are stored out-of-line in a
+# shared pool and referenced by index; anything else is stored as JSON in the same pool.
+_TYPECODES = {str: 'q', float: 'd', int: 'q', bool: 'b'}
+# Stored for None in nullable int columns.
+_NULL_INT = -2 ** 63
+
+
+def _column_kind(annotation):
+    """Return the (python type, nullable) pair a column of the given annotation is stored as."""
+    nullable = False
+    if get_origin(annotation) is Union:
+        args = [a for a in get_args(annotation) if a is not type(None)]
+        nullable = len(args) < len(get_args(annotation))
+        annotation = args[0] if len(args) == 1 else object
+    return (annotation if annotation in _TYPECODES else object), nullable
+
+
+class ResultTable(Sequence):
+    """
+    Compact columnar storage for comparison results.
+
+    Every `ComparisonResult` field is stored in its own typed array. Text fields are
+    interned into a single string pool and stored as indices, so repeated prompts and
+    outputs are kept once. Rows are materialized as `ComparisonResult` objects only when
+    they are accessed.
+    """
+
+    def __init__(self, results: Iterable[ComparisonResult] = ()):
+        """
+        Initialize the table, optionally filling it with results.
+
+        Args:
+            results (Iterable[ComparisonResult]): Results to add to the table.
+        """
+        hints = get_type_hints(ComparisonResult)
+        self._fields = [f.name for f in fields(ComparisonResult)]
+        self._kinds = {name: _column_kind(hints[name]) for name in self._fields}
+        self._columns = {name: array(_TYPECODES.get(self._kinds[name][0], 'q')) for name in self._fields}
+        self._pool: List[str] = []
+        self._pool_index: Dict[str, int] = {}
+        self.extend(results)
+
+    def _intern(self, text: str) -> int:
+        """Add a string to the pool (if new) and return its index."""
+        idx = self._pool_index.get(text)
+        if idx is None:
+            idx = self._pool_index[text] = len(self._pool)
+            self._pool.append(text)
+        return idx
+
+    def _encode(self, name: str, value):
+        kind, nullable = self._kinds[name]
+        if kind is float:
+            return math.nan if value is None else float(value)
+        if kind is str:
+            return -1 if value is None else self._intern(value)
+        if kind in (int, bool):
+            return _NULL_INT if value is None else int(value)
+        return -1 if value is None else self._intern(json.dumps(value))
+
+    def _decode(self, name: str, value):
+        kind, nullable = self._kinds[name]
+        if kind is float:
+            return None if nullable and math.isnan(value) else value
+        if kind is str:
+            return None if value < 0 else self._pool[value]
+        if kind is bool:
+            return bool(value)
+        if kind is int:
+            return None if nullable and value == _NULL_INT else value
+        return None if value < 0 else json.loads(self._pool[value])
+
+    def append(self, result: ComparisonResult):
+        """
+        Add a result to the table.
+
+        Args:
+            result (ComparisonResult): The result to add.
+        """
+        for name in self._fields:
+            self._columns[name].append(self._encode(name, getattr(result, name)))
+
+    def extend(self, results: Iterable[ComparisonResult]):
+        """
+        Add several results to the table.
+
+        Args:
+            results (Iterable[ComparisonResult]): The results to add.
+        """
+        for result in results:
+            self.append(result)
+
+    def __len__(self) -> int:
+        return len(self._columns[self._fields[0]])
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("ResultTable index out of range")
+        return ComparisonResult(**self._record(index))
+
+    def _record(self, index: int) -> Dict[str, Any]:
+        return {name: self._decode(name, self._columns[name][index]) for name in self._fields}
+
+    def iter_records(self, indices: Optional[Iterable[int]] = None) -> Iterator[Dict[str, Any]]:
+        """
+        Iterate over the rows as plain dictionaries.
+
+        Args:
+            indices (Optional[Iterable[int]]): Rows to iterate over. Defaults to all rows.
+
+        Returns:
+            Iterator[Dict[str, Any]]: One dictionary per result.
+        """
+        for index in (range(len(self)) if indices is None else indices):
+            yield self._record(index)
+
+    def take(self, indices: Iterable[int]) -> 'ResultTable':
+        """
+        Copy rows into a new table, column by column, without materializing them.
+
+        Args:
+            indices (Iterable[int]): Rows to copy, in the order of the new table.
+
+        Returns:
+            ResultTable: A table holding the selected rows.
+        """
+        indices = list(indices)
+        table = ResultTable()
+        # Rows keep their pool indices, so the new table starts from a copy of this pool.
+        table._pool = list(self._pool)
+        table._pool_index = dict(self._pool_index)
+        for name, column in self._columns.items():
+            table._columns[name] = array(column.typecode, (column[index] for index in indices))
+        return table
+
+    def column(self, name: str):
+        """
+        Get a column of the table.
+
+        Args:
+            name (str): Name of a `ComparisonResult` field.
+
+        Returns:
+            A numpy array for numeric and boolean columns, or a list for other columns. Arrays are
+            copies, so the table can still be appended to while they are in use. Nullable integer
+            columns are returned as floats with NaN for None.
+        """
+        kind, nullable = self._kinds[name]
+        if kind is int and nullable:
+            column = np.array(self._columns[name], dtype=np.int64)
+            return np.where(column == _NULL_INT, np.nan, column)
+        if kind is float or kind is int:
+            return np.array(self._columns[name], dtype=np.float64 if kind is float else np.int64)
+        if kind is bool:
+            return np.array(self._columns[name], dtype=np.int8).astype(bool)
+        return [self._decode(name, value) for value in self._columns[name]]
+
+    def write_jsonl(self, file: TextIO):
+        """
+        Stream the results to a file, one JSON object per line.
+
+        Args:
+            file (TextIO): A writable text file.
+        """
+        for record in self.iter_records():
+            file.write(json.dumps(record))
+            file.write('\n')
+
+    def to_arrow(self):
+        """
+        Convert the table to a pyarrow Table. Text columns become dictionary-encoded
+        columns sharing the string pool, so no text is duplicated.
+
+        Returns:
+            pyarrow.Table: The results as an Arrow table.
+        """
+        try:
+            import pyarrow as pa
+        except ImportError:
+            raise ImportError("pyarrow is required for Arrow/Parquet export. Install it with `pip install pyarrow`.")
+
+        pool = pa.array(self._pool, type=pa.large_string())
+        arrays = {}
+        for name in self._fields:
+            kind, nullable = self._kinds[name]
+            values = self._columns[name]
+            if kind is float:
+                column = np.array(values, dtype=np.float64)
+                arrays[name] = pa.array(column, mask=np.isnan(column) if nullable else None)
+            elif kind is int:
+                column = np.array(values, dtype=np.int64)
+                arrays[name] = pa.array(column, mask=column == _NULL_INT if nullable else None)
+            elif kind is bool:
+                arrays[name] = pa.array(np.array(values, dtype=np.int8).astype(bool))
+            else:
+                indices = np.array(values, dtype=np.int64)
+                indices = pa.array(indices, mask=indices < 0)
+                arrays[name] = pa.DictionaryArray.from_arrays(indices, pool)
+        return pa.table(arrays)
+
+    def write_parquet(self, path: Path):
+        """
+        Export the results to a Parquet file.
+
+        Args:
+            path (Path): Destination file.
+        """
+        table = self.to_arrow()
+        import pyarrow.parquet as pq
+
+        pq.write_table(table, path)
+
+    def write_arrow(self, path: Path):
+        """
+        Export the results to an Arrow IPC file, which can be memory-mapped by readers.
+
+        Args:
+            path (Path): Destination file.
+        """
+        table = self.to_arrow()
+        import pyarrow as pa
+
+        with pa.OSFile(str(path), 'wb') as sink:
+            with pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
@@ -0,0 +1,61 @@
+from dataclasses import dataclass
+from typing import Dict, Any, List, Optional
+from .estimate import DEFAULT_OVERHEAD_MS, DEFAULT_TOKENS_PER_SECOND, max_output_tokens
+
+# Rough prompt processing rate used to rank requests by prompt length when there is no history.
+CHARS_PER_TOKEN = 4
+DEFAULT_PROMPT_TOKENS_PER_SECOND = 1000.0
+
+
+class FailFast(Exception):
+    """Raised inside a run to cancel the outstanding requests once a test case failed."""
+
+
+@dataclass(slots=True)
+class Job:
+    """One model request of a run."""
+    test_case: Dict[str, Any]
+    model_config: Dict[str, Any]
+    side: int  # 0 for the baseline, 1 for the target
+    index: int  # position of the input in the test case
+    prompt: str
+    expected_ms: float
+    previously_failed: bool = False
+    cache_prefix: Optional[str] = None
+
+
+def expected_duration_ms(prompt: str, model_config: Dict[str, Any], average_ms: Optional[float] = None) -> float:
+    """
+    Expected latency of one request.
+
+    Args:
+        prompt (str): The rendered prompt.
+        model_config (Dict[str, Any]): Model configuration.
+        average_ms (Optional[float]): Average latency of the test case on this model in past runs.
+
+    Returns:
+        float: The historical average if there is one, otherwise a projection from the prompt
+               length and the configured output token limit.
+    """
+    if average_ms:
+        return average_ms
+    prompt_ms = len(prompt) / CHARS_PER_TOKEN / DEFAULT_PROMPT_TOKENS_PER_SECOND * 1000
+    output_ms = max_output_tokens(model_config) / DEFAULT_TOKENS_PER_SECOND * 1000
+    return DEFAULT_OVERHEAD_MS + prompt_ms + output_ms
+
+
+def order_jobs(jobs: List[Job]) -> List[Job]:
+    """
+    Order the requests of a run for dispatch.
+
+    Test cases that failed in the previous run go first, so that a regression verdict is known
+    as early as possible. Within each group the longest requests go first (LPT scheduling),
+    which keeps a single slow request from being started last and setting the wall time.
+
+    Args:
+        jobs (List[Job]): Requests of the run.
+
+    Returns:
+        List[Job]: The requests in dispatch order.
+    """
+    return sorted(jobs, key=lambda job: (not job.previously_failed, -job.expected_ms))
@@ -0,0 +1,43 @@
+import yaml
+import pytest
+from tests.fakes import CountingProvider, DummyMetrics
+
+
+@pytest.fixture
+def suite():
+    """A configuration comparing 'base' with 'new' on test cases 'a' (two inputs) and 'b' (one input)."""
+    return {
+        "models": [
+            {"name": "base", "provider": "openai"},
+            {"name": "new", "provider": "openai"},
+        ],
+        "test_cases": [
+            {"name": "a", "prompt_template": "A {x}", "inputs": [{"x": "1"}, {"x": "2"}]},
+            {"name": "b", "prompt_template": "B {x}", "inputs": [{"x": "1"}]},
+        ],
+        "metrics": {"text_similarity": {"threshold": 0.7}, "semantic_similarity": {"threshold": 0.8}},
+    }
+
+@pytest.fixture
+def write_config(tmp_path):
+    """Write a configuration to a YAML file, `config.yml` in the test's directory by default."""
+    def write(config, path=None):
+        path = path or tmp_path / "config.yml"
+        path.write_text(yaml.dump(config))
+        return path
+    return write
+
+@pytest.fixture
+def suite_config(suite, write_config):
+    return write_config(suite)
+
+@pytest.fixture
+def fake_engine(monkeypatch):
+    """Replace the embedding metrics and the OpenAI provider of the engine with fakes."""
+    def patch(provider=CountingProvider, metrics=DummyMetrics):
+        monkeypatch.setattr("prompt_regress.core.SimilarityMetrics", metrics)
+        monkeypatch.setattr("prompt_regress.core.OpenAIProvider", provider)
+        return provider
+
+    CountingProvider.calls = CountingProvider.instances = CountingProvider.warmups = 0
+    return patch
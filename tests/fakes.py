@@ -0,0 +1,44 @@
+from prompt_regress.models import ModelResponse
+
+
+class DummyMetrics:
+    """Embedding-free metrics that score every pair of outputs as identical."""
+
+    def __init__(self, **kwargs):
+        pass
+
+    def text_similarity(self, baseline_texts, target_texts):
+        return [1.0] * len(baseline_texts)
+
+    def semantic_similarity(self, baseline_texts, target_texts, target_embeddings=None):
+        return [1.0] * len(baseline_texts)
+
+class EqualityMetrics(DummyMetrics):
+    """Metrics that only score identical outputs as similar."""
+
+    def text_similarity(self, baseline_texts, target_texts):
+        return [float(a == b) for a, b in zip(baseline_texts, target_texts)]
+
+class CountingProvider:
+    """Provider that echoes every prompt and counts instances, warmups and calls."""
+    calls = 0
+    instances = 0
+    warmups = 0
+
+    def __init__(self, **kwargs):
+        CountingProvider.instances += 1
+
+    async def awarmup(self, model, **kwargs):
+        CountingProvider.warmups += 1
+
+    async def agenerate(self, prompt, **kwargs):
+        CountingProvider.calls += 1
+        return ModelResponse(text=prompt, prompt=prompt, token_count=0, cost=0.0, response_time_ms=0, metadata={})
+
+class EchoProvider(CountingProvider):
+    """Provider that echoes every prompt, except that model 'new' regresses on prompts starting with 'B'."""
+
+    async def agenerate(self, prompt, model=None, **kwargs):
+        CountingProvider.calls += 1
+        text = "regressed" if model == "new" and prompt.startswith("B") else prompt
+        return ModelResponse(text=text, prompt=prompt, token_count=0, cost=0.0, response_time_ms=0, metadata={})
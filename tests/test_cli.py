@@ -38,4 +38,35 @@ def test_version_option():
     print(result.output)
     print(result.exception)
     assert result.exit_code == 0
-    assert "version" in result.output.lower()
\ No newline at end of file
+    assert "version" in result.output.lower()
+
+
+def test_history_without_runs(tmp_path):
+    runner = CliRunner()
+    config_path = tmp_path / "test-config.yml"
+    config_path.write_text("models: []")
+    result = runner.invoke(cli, ['history', '--config', str(config_path)])
+    assert result.exit_code == 0
+    assert "No history recorded yet" in result.output
+
+def test_check_fail_on_regression_exit_code(monkeypatch, tmp_path):
+    from prompt_regress.results import ComparisonResult, ResultTable
+
+    def fake_compare(passed):
+        async def acompare_models(self, *args, **kwargs):
+            return ResultTable([ComparisonResult(test_case="t", prompt="p", baseline_output="a", target_output="a",
+                                                 text_similarity=1.0, semantic_similarity=None, passed=passed)])
+        return acompare_models
+
+    runner = CliRunner()
+    config = tmp_path / "config.yml"
+    runner.invoke(cli, ['init', '--config', str(config)])
+    args = ['check', '--baseline', 'gpt-4', '--target', 'claude-opus', '--config', str(config), '--fail-on-regression', '--no-history']
+
+    monkeypatch.setattr("prompt_regress.core.PromptRegress.acompare_models", fake_compare(True))
+    assert runner.invoke(cli, args).exit_code == 0
+
+    monkeypatch.setattr("prompt_regress.core.PromptRegress.acompare_models", fake_compare(False))
+    result = runner.invoke(cli, args)
+    assert result.exit_code == 1
+    assert "Regressions found" in result.output
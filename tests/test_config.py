@@ -0,0 +1,106 @@
+import yaml
+import pytest
+from prompt_regress.config import compile_config, load_suite
+
+
+def write_test_config(path, test_cases, metrics=None):
+    config = {"models": [{"name": "m", "provider": "openai"}], "test_cases": test_cases}
+    if metrics is not None:
+        config["metrics"] = metrics
+    path.write_text(yaml.dump(config))
+    return path
+
+def test_compile_config_renders_prompts():
+    suite = compile_config({"test_cases": [{"name": "a", "prompt_template": "Hi {x}", "inputs": [{"x": 1}, {"x": 2}]}]})
+    test_case = suite.config["test_cases"][0]
+    assert suite.prompts(test_case) == ["Hi 1", "Hi 2"]
+    assert suite.prompts({**test_case, "prompt_template": "Bye {x}"}) is None
+    assert suite.prompts({"name": "b", "prompt_template": "{x}", "inputs": []}) is None
+
+def test_compile_config_collects_errors():
+    config = {
+        "test_cases": [
+            {"name": "a", "prompt_template": "{x} {y}", "inputs": [{"x": 1, "y": 2}, {"x": 1}]},
+            {"name": "a", "prompt_template": "{x}", "inputs": []},
+            {"name": "b", "prompt_template": "{x", "inputs": [{"x": 1}]},
+            {"name": "c", "prompt_template": "{}", "inputs": [{"x": 1}]},
+        ],
+        "metrics": {"text_similarity": {}, "drift": {"k": 3}},
+    }
+    with pytest.raises(ValueError) as excinfo:
+        compile_config(config)
+    message = str(excinfo.value)
+    assert "5 error(s)" in message
+    assert "test case 'a', input 2: missing value for placeholder 'y'" in message
+    assert "test case 'a' is defined more than once" in message
+    assert "test case 'b': invalid prompt_template" in message
+    assert "test case 'c', input 1: positional placeholders" in message
+    assert "metric 'text_similarity' has no numeric threshold" in message
+
+def test_load_suite_caches_compiled_form(monkeypatch, tmp_path):
+    config_path = write_test_config(tmp_path / "config.yml", [{"name": "a", "prompt_template": "{x}", "inputs": [{"x": "1"}]}])
+    cache_dir = tmp_path / "compiled"
+    first = load_suite(config_path, cache_dir)
+    assert len(list(cache_dir.iterdir())) == 1
+
+    def fail(*args, **kwargs):
+        raise AssertionError("the configuration was parsed again")
+    monkeypatch.setattr("prompt_regress.config.yaml.load", fail)
+    second = load_suite(config_path, cache_dir)
+    assert second.digest == first.digest
+    assert second.prompts(second.config["test_cases"][0]) == ["1"]
+
+    monkeypatch.undo()
+    write_test_config(config_path, [{"name": "a", "prompt_template": "{x}!", "inputs": [{"x": "1"}]}])
+    third = load_suite(config_path, cache_dir)
+    assert third.prompts(third.config["test_cases"][0]) == ["1!"]
+    assert len(list(cache_dir.iterdir())) == 1
+
+def test_load_suite_caches_per_file_name(tmp_path):
+    cache_dir = tmp_path / "compiled"
+    for name in ("suite.yml", "suite.yaml"):
+        write_test_config(tmp_path / name, [{"name": "a", "prompt_template": "{x}", "inputs": [{"x": name}]}])
+        load_suite(tmp_path / name, cache_dir)
+    assert sorted(path.name.split("-")[0] for path in cache_dir.iterdir()) == ["suite.yaml", "suite.yml"]
+
+def test_load_suite_caches_in_state_dir(monkeypatch, tmp_path):
+    config_path = tmp_path / "config.yml"
+    config_path.write_text(yaml.dump({
+        "regression_options": {"state_dir": "state"},
+        "test_cases": [{"name": "a", "prompt_template": "{x}", "inputs": [{"x": "1"}]}],
+    }))
+    first = load_suite(config_path, cache_in_state_dir=True)
+    assert len(list((tmp_path / "state" / "compiled").iterdir())) == 1
+    assert not (tmp_path / ".prompt-regress").exists()
+
+    def fail(*args, **kwargs):
+        raise AssertionError("the configuration was compiled again")
+    monkeypatch.setattr("prompt_regress.config.compile_config", fail)
+    assert load_suite(config_path, cache_in_state_dir=True).digest == first.digest
+
+def test_load_suite_ignores_untrusted_cache(tmp_path):
+    import json
+    import pickle
+    config_path = write_test_config(tmp_path / "config.yml", [{"name": "a", "prompt_template": "{x}", "inputs": [{"x": "1"}]}])
+    cache_dir = tmp_path / "compiled"
+    suite = load_suite(config_path, cache_dir)
+    (cache_path,) = cache_dir.iterdir()
+    assert json.loads(cache_path.read_text())["digest"] == suite.digest
+
+    data = json.loads(cache_path.read_text())
+    data["digest"] = "0" * 64
+    data["prompts"]["a"] = ["tampered"]
+    cache_path.write_text(json.dumps(data))
+    assert load_suite(config_path, cache_dir).prompts(suite.config["test_cases"][0]) == ["1"]
+
+    class Exploit:
+        def __reduce__(self):
+            return (exec, ("raise SystemExit('unpickled')",))
+    cache_path.write_bytes(pickle.dumps(Exploit()))
+    assert load_suite(config_path, cache_dir).digest == suite.digest
+
+def test_invalid_config_fails_before_run(tmp_path):
+    from prompt_regress.core import PromptRegress
+    config_path = write_test_config(tmp_path / "config.yml", [{"name": "a", "prompt_template": "{text}", "inputs": [{"txt": "1"}]}])
+    with pytest.raises(ValueError, match="missing value for placeholder 'text'"):
+        PromptRegress(config_path)
@@ -1,5 +1,11 @@
+import gc
 import pytest
+import asyncio
+import weakref
 from prompt_regress.core import PromptRegress
+from prompt_regress.budget import BudgetExceededError
+from prompt_regress.models import ModelResponse
+from tests.fakes import CountingProvider, DummyMetrics, EchoProvider, EqualityMetrics
 
 # Mock OpenAIProvider
 class DummyProvider:
@@ -54,4 +60,337 @@ async def test_arun_test_case_openai(monkeypatch, sample_config):
     monkeypatch.setattr("prompt_regress.core.OpenAIProvider", DummyProvider)
 
     result = await pr.arun_test_case(test_case, model_config)
-    assert isinstance(result, list)
\ No newline at end of file
+    assert isinstance(result, list)
+
+@pytest.mark.asyncio
+async def test_acompare_models_changed_only(fake_engine, suite_config):
+    fake_engine()
+
+    pr = PromptRegress(suite_config)
+    first = await pr.acompare_models("base", "new", changed_only=True)
+    assert len(first) == 3
+    assert CountingProvider.calls == 6
+
+    pr.config['test_cases'][1]['prompt_template'] = "B2 {x}"
+    second = await pr.acompare_models("base", "new", changed_only=True)
+    assert CountingProvider.calls == 8
+    assert [r.test_case for r in second] == ["a", "a", "b"]
+    assert second[2].prompt == "B2 1"
+    assert second[0] == first[0]
+
+def test_fingerprint_covers_json_schema_file(fake_engine, suite, write_config, tmp_path):
+    fake_engine()
+    schema_path = tmp_path / "schema.json"
+    schema_path.write_text('{"type": "object"}')
+    suite["test_cases"][0]["json_schema"] = "schema.json"
+    pr = PromptRegress(write_config(suite))
+    test_case, models = pr.config["test_cases"][0], pr.config["models"]
+
+    before = pr._fingerprint(test_case, *models)
+    assert pr._fingerprint(test_case, *models) == before
+    schema_path.write_text('{"type": "array"}')
+    assert pr._fingerprint(test_case, *models) != before
+
+@pytest.mark.asyncio
+async def test_concurrent_engines_keep_each_others_results(fake_engine, suite_config):
+    fake_engine(PricedProvider)
+
+    first, second = PromptRegress(suite_config), PromptRegress(suite_config)
+    # Both engines load the (empty) saved results before either of them saves its own.
+    await asyncio.gather(first.acompare_models("base", "new", test_cases=["a"]),
+                         second.acompare_models("base", "new", test_cases=["b"]))
+
+    assert set(first._load_previous_results("base", "new")) == {"a", "b"}
+    assert not list(first._results_path("base", "new").parent.glob("*.tmp"))
+
+@pytest.mark.asyncio
+async def test_acompare_models_records_history(fake_engine, suite_config):
+    fake_engine()
+
+    pr = PromptRegress(suite_config)
+    await pr.acompare_models("base", "new")
+    await pr.acompare_models("base", "new")
+
+    trend = pr.history.trend("passed", test_case="a", baseline="base", target="new")
+    assert [row["count"] for row in trend] == [2, 2]
+    assert trend[-1]["mean"] == 1.0
+
+@pytest.mark.asyncio
+async def test_changed_only_records_only_rerun_test_cases(fake_engine, suite_config):
+    fake_engine()
+
+    pr = PromptRegress(suite_config)
+    await pr.acompare_models("base", "new", changed_only=True)
+    pr.config['test_cases'][1]['prompt_template'] = "B2 {x}"
+    await pr.acompare_models("base", "new", changed_only=True)
+    await pr.acompare_models("base", "new", changed_only=True)
+
+    assert len(pr.history.trend("passed", test_case="a")) == 1
+    assert len(pr.history.trend("passed", test_case="b")) == 2
+    assert len(pr.history.trend("passed")) == 2
+
+@pytest.mark.asyncio
+async def test_acompare_models_json_similarity(monkeypatch, write_config):
+    class JSONProvider(CountingProvider):
+        async def agenerate(self, prompt, **kwargs):
+            return ModelResponse(text='{"name": "Foo"}', prompt=prompt, token_count=0, cost=0.0, response_time_ms=0, metadata={})
+
+    config = {
+        "models": [{"name": "base", "provider": "openai"}, {"name": "new", "provider": "openai"}],
+        "test_cases": [{"name": "j", "prompt_template": "{x}", "inputs": [{"x": "1"}], "expect_json": True}],
+        "metrics": {"semantic_similarity": {"threshold": 0.8}, "json_similarity": {"threshold": 0.9}},
+    }
+    config_path = write_config(config)
+    monkeypatch.setattr("prompt_regress.core.OpenAIProvider", JSONProvider)
+
+    pr = PromptRegress(config_path)
+    results = await pr.acompare_models("base", "new")
+    assert results[0].passed
+    assert results[0].json_similarity == 1.0
+    assert results[0].semantic_similarity is None
+    assert pr.metrics._model is None
+
+@pytest.mark.asyncio
+async def test_acompare_models_lexical_metrics(fake_engine, write_config):
+    config = {
+        "models": [{"name": "base", "provider": "openai"}, {"name": "new", "provider": "openai"}],
+        "test_cases": [{"name": "l", "prompt_template": "{x}", "inputs": [{"x": "one two three"}]}],
+        "metrics": {"rouge_l": {"threshold": 0.9}, "length_ratio": {"threshold": 0.5}},
+    }
+    config_path = write_config(config)
+    fake_engine()
+
+    pr = PromptRegress(config_path)
+    results = await pr.acompare_models("base", "new")
+    assert results[0].passed
+    assert results[0].rouge_l == 1.0
+    assert results[0].length_ratio == 1.0
+    assert results[0].bleu is None
+    assert "ROUGE-L: 1.000" in pr.generate_report(results)
+
+class EmbeddingMetrics(DummyMetrics):
+    def embed(self, texts):
+        import torch
+        return torch.tensor([[float(text.startswith("good")), float(text.startswith("bad")), 1.0] for text in texts])
+
+    def semantic_similarity(self, baseline_texts, target_texts, target_embeddings=None):
+        return [0.0 if text.startswith("bad") else 1.0 for text in target_texts]
+
+@pytest.mark.asyncio
+async def test_acompare_models_drift(fake_engine, write_config):
+    config = {
+        "models": [{"name": "base", "provider": "openai"}, {"name": "new", "provider": "openai"}],
+        "test_cases": [{"name": "d", "prompt_template": "{x}", "inputs": [{"x": "good 1"}, {"x": "bad 1"}, {"x": "bad 2"}]}],
+        "metrics": {"semantic_similarity": {"threshold": 0.8}, "drift": {"k": 2}},
+    }
+    config_path = write_config(config)
+    fake_engine(metrics=EmbeddingMetrics)
+
+    pr = PromptRegress(config_path)
+    first = await pr.acompare_models("base", "new")
+    assert [r.passed for r in first] == [True, False, False]
+    assert first[0].drift_similarity is None
+    assert [r.failure_cluster for r in first] == [None, 1, 1]
+    assert "d: 2 failure(s) like 'bad 1'" in pr.generate_report(first)
+
+    # The accepted output of the first run is the only neighbour in a new engine.
+    second = await PromptRegress(config_path).acompare_models("base", "new")
+    assert second[0].drift_similarity == pytest.approx(1.0)
+    assert second[1].drift_similarity == pytest.approx(0.5)
+
+class PricedProvider(CountingProvider):
+    async def agenerate(self, prompt, **kwargs):
+        CountingProvider.calls += 1
+        await asyncio.sleep(0.01)
+        return ModelResponse(text=prompt, prompt=prompt, token_count=0, cost=1.0, response_time_ms=0, metadata={})
+
+@pytest.mark.asyncio
+async def test_acompare_models_max_cost(fake_engine, suite_config):
+    fake_engine(PricedProvider)
+
+    pr = PromptRegress(suite_config)
+    pr.max_concurrency = 1
+    with pytest.raises(BudgetExceededError):
+        await pr.acompare_models("base", "new", max_cost=1.5)
+    assert CountingProvider.calls < 6
+
+@pytest.mark.asyncio
+async def test_acompare_models_max_duration(fake_engine, suite_config):
+    class SlowProvider(CountingProvider):
+        async def agenerate(self, prompt, **kwargs):
+            await asyncio.sleep(10)
+
+    fake_engine(SlowProvider)
+
+    pr = PromptRegress(suite_config)
+    with pytest.raises(BudgetExceededError):
+        await pr.acompare_models("base", "new", max_duration=0.05)
+
+class FakeEncoding:
+    def encode_batch(self, texts, num_threads=8, allowed_special=()):
+        return [text.split() for text in texts]
+
+def test_estimate(monkeypatch, suite_config):
+    monkeypatch.setattr("prompt_regress.models.OpenAIProvider.get_encoding", classmethod(lambda cls, model=None: FakeEncoding()))
+    pr = PromptRegress(suite_config)
+    pr.config['models'][1]['pricing'] = {'input': 1_000_000, 'output': 0}
+    pr.config['models'][1]['parameters'] = {'max_output_tokens': 100}
+
+    estimate = pr.estimate("base", "new")
+    base, new = estimate.models
+    assert base.requests == new.requests == 3
+    assert new.input_tokens == 6
+    assert new.output_tokens == 300
+    assert base.cost == 0.0
+    assert estimate.cost == new.cost == 6.0
+    assert estimate.duration_s > 0
+
+@pytest.mark.asyncio
+async def test_estimate_changed_only(fake_engine, monkeypatch, suite_config):
+    fake_engine()
+    monkeypatch.setattr("prompt_regress.models.OpenAIProvider.get_encoding", classmethod(lambda cls, model=None: FakeEncoding()))
+
+    pr = PromptRegress(suite_config)
+    assert pr.estimate("base", "new", changed_only=True).models[0].requests == 3
+    await pr.acompare_models("base", "new")
+    pr.config['test_cases'][1]['prompt_template'] = "B2 {x}"
+    assert pr.estimate("base", "new", changed_only=True).models[0].requests == 1
+    assert pr.estimate("base", "new").models[0].requests == 3
+
+class RecordingProvider(EchoProvider):
+    prompts = []
+
+    async def agenerate(self, prompt, model=None, **kwargs):
+        RecordingProvider.prompts.append((model, prompt))
+        await asyncio.sleep(0.01)
+        return await super().agenerate(prompt, model=model, **kwargs)
+
+@pytest.mark.asyncio
+async def test_acompare_models_fail_fast(fake_engine, suite_config):
+    fake_engine(RecordingProvider, metrics=EqualityMetrics)
+    RecordingProvider.prompts = []
+
+    pr = PromptRegress(suite_config)
+    pr.config['metrics'] = {"text_similarity": {"threshold": 0.7}}
+    pr.config['test_cases'][1]['prompt_template'] = "B with a much longer prompt {x}"
+    pr.max_concurrency = 1
+
+    results = await pr.acompare_models("base", "new", fail_fast=True)
+    assert RecordingProvider.prompts[:2] == [("base", "B with a much longer prompt 1"), ("new", "B with a much longer prompt 1")]
+    # Dispatch continues while "b" is scored; the one request per model started meanwhile is cancelled.
+    assert len(RecordingProvider.prompts) <= 4
+    assert [r.test_case for r in results] == ["b"]
+    assert not results[0].passed
+
+    # The failing test case goes first on the next run even though it is no longer the longest.
+    RecordingProvider.prompts = []
+    pr.config['test_cases'][0]['prompt_template'] = "A with an even much longer prompt {x}"
+    results = await pr.acompare_models("base", "new")
+    assert RecordingProvider.prompts[0] == ("base", "B with a much longer prompt 1")
+    assert len(results) == 3
+
+@pytest.mark.asyncio
+async def test_max_concurrency_is_per_model(fake_engine, suite_config):
+    in_flight = {"now": 0, "peak": 0}
+
+    class TrackingProvider(CountingProvider):
+        async def agenerate(self, prompt, **kwargs):
+            in_flight["now"] += 1
+            in_flight["peak"] = max(in_flight["peak"], in_flight["now"])
+            await asyncio.sleep(0.01)
+            in_flight["now"] -= 1
+            return await super().agenerate(prompt, **kwargs)
+
+    fake_engine(TrackingProvider)
+    pr = PromptRegress(suite_config)
+    pr.max_concurrency = 1
+    await pr.acompare_models("base", "new")
+    assert in_flight["peak"] == 2
+
+@pytest.mark.asyncio
+async def test_responses_are_released_once_scored(fake_engine, suite_config):
+    responses = []
+    held_while_scoring = []
+
+    class TrackingProvider(CountingProvider):
+        async def agenerate(self, prompt, **kwargs):
+            response = await super().agenerate(prompt, **kwargs)
+            responses.append(weakref.ref(response))
+            return response
+
+    class TrackingMetrics(DummyMetrics):
+        def text_similarity(self, baseline_texts, target_texts):
+            gc.collect()
+            held_while_scoring.append({ref().prompt for ref in responses if ref() is not None} - set(baseline_texts))
+            return super().text_similarity(baseline_texts, target_texts)
+
+    fake_engine(TrackingProvider, TrackingMetrics)
+    pr = PromptRegress(suite_config)
+    results = await pr.acompare_models("base", "new")
+    assert len(results) == 3
+    # When the second test case is scored, the responses of the first one are gone.
+    assert held_while_scoring[-1] == set()
+
+def test_runs_on_separate_event_loops(fake_engine, suite_config):
+    class SemaphoreProvider(CountingProvider):
+        def __init__(self, **kwargs):
+            super().__init__(**kwargs)
+            self.semaphore = asyncio.Semaphore(1)
+
+        async def agenerate(self, prompt, **kwargs):
+            async with self.semaphore:
+                await asyncio.sleep(0.001)
+                return await super().agenerate(prompt, **kwargs)
+
+    fake_engine(SemaphoreProvider)
+    pr = PromptRegress(suite_config)
+    asyncio.run(pr.acompare_models("base", "new"))
+    asyncio.run(pr.acompare_models("base", "new"))
+    assert CountingProvider.calls == 12
+
+def test_encode_pool_starts_with_the_engine(fake_engine, suite, write_config):
+    import threading
+    started = []
+
+    class PoolMetrics(DummyMetrics):
+        def start(self):
+            started.append(threading.current_thread())
+
+    fake_engine(metrics=PoolMetrics)
+    PromptRegress(write_config({**suite, "regression_options": {"encode_workers": 2}}))
+    assert started == [threading.main_thread()]
+
+@pytest.mark.asyncio
+async def test_scoring_runs_off_the_event_loop(fake_engine, suite_config):
+    import threading
+    threads = []
+
+    class ThreadMetrics(DummyMetrics):
+        def text_similarity(self, baseline_texts, target_texts):
+            threads.append(threading.current_thread())
+            return super().text_similarity(baseline_texts, target_texts)
+
+    fake_engine(metrics=ThreadMetrics)
+    await PromptRegress(suite_config).acompare_models("base", "new")
+    assert len(threads) == 2
+    assert threading.current_thread() not in threads
+
+@pytest.mark.asyncio
+async def test_acompare_models_prompt_caching(fake_engine, suite_config):
+    class CachingProvider(CountingProvider):
+        prefixes = []
+
+        async def agenerate(self, prompt, cache_prefix=None, **kwargs):
+            CachingProvider.prefixes.append(cache_prefix)
+            return ModelResponse(text=prompt, prompt=prompt, token_count=0, cost=0.0, response_time_ms=0,
+                                 metadata={'input_tokens': 10, 'cached_input_tokens': 4})
+
+    fake_engine(CachingProvider)
+
+    pr = PromptRegress(suite_config)
+    pr.prompt_caching = True
+    pr.config['test_cases'][1]['prompt_caching'] = False
+    results = await pr.acompare_models("base", "new")
+    assert sorted(CachingProvider.prefixes, key=str) == ["A ", "A ", "A ", "A ", None, None]
+    assert results[0].target_cached_input_tokens == 4
+    assert "Cached input tokens: baseline 12/30 (40%)" in pr.generate_report(results, False)
@@ -0,0 +1,75 @@
+import yaml
+import asyncio
+import pytest
+from prompt_regress.core import PromptRegress
+from prompt_regress.daemon import PromptRegressDaemon, request_run
+from tests.fakes import CountingProvider
+
+
+@pytest.fixture
+def regress(fake_engine, suite, write_config):
+    suite["test_cases"][0]["inputs"] = [{"x": "1"}]
+    fake_engine()
+    return PromptRegress(write_config(suite))
+
+@pytest.mark.asyncio
+async def test_daemon_reruns_only_changed_test_cases(regress):
+    daemon = PromptRegressDaemon(regress)
+    first = await daemon.arun("base", "new")
+    assert first["passed"]
+    assert CountingProvider.calls == 4
+
+    config = yaml.safe_load(regress.config_path.read_text())
+    config["test_cases"][0]["prompt_template"] = "A2 {x}"
+    regress.config_path.write_text(yaml.dump(config))
+
+    await daemon.arun("base", "new")
+    assert CountingProvider.calls == 6
+    assert CountingProvider.instances == 2
+
+@pytest.mark.asyncio
+async def test_daemon_serve(regress, tmp_path):
+    socket_path = tmp_path / "daemon.sock"
+    server = asyncio.create_task(PromptRegressDaemon(regress).serve(socket_path))
+    while not socket_path.exists():
+        await asyncio.sleep(0.01)
+
+    response = await asyncio.to_thread(request_run, socket_path, "base", "new", timeout=10)
+    server.cancel()
+    assert response["passed"]
+    assert "Passed: 2/2" in response["report"]
+
+@pytest.mark.asyncio
+async def test_daemon_refuses_other_config(regress, tmp_path):
+    socket_path = tmp_path / "daemon.sock"
+    server = asyncio.create_task(PromptRegressDaemon(regress).serve(socket_path))
+    while not socket_path.exists():
+        await asyncio.sleep(0.01)
+
+    response = await asyncio.to_thread(request_run, socket_path, "base", "new", config=tmp_path / "other.yml", timeout=10)
+    server.cancel()
+    assert "not" in response["error"] and "other.yml" in response["error"]
+    assert CountingProvider.calls == 0
+
+@pytest.mark.asyncio
+async def test_daemon_passes_run_options(regress, monkeypatch):
+    seen = {}
+
+    async def acompare_models(baseline, target, **kwargs):
+        seen.update(kwargs, record_history=regress.record_history)
+        return []
+    monkeypatch.setattr(regress, "acompare_models", acompare_models)
+
+    await PromptRegressDaemon(regress).arun("base", "new", changed_only=False, max_cost=1.5, max_duration=30,
+                                            record_history=False)
+    assert seen == {"changed_only": False, "fail_fast": False, "max_cost": 1.5, "max_duration": 30,
+                    "record_history": False}
+    assert regress.record_history
+
+def test_check_rejects_unsupported_daemon_options(tmp_path):
+    from click.testing import CliRunner
+    from prompt_regress.cli import cli
+    result = CliRunner().invoke(cli, ["check", "--baseline", "base", "--target", "new", "--dry-run",
+                                      "--daemon", str(tmp_path / "daemon.sock")])
+    assert result.exit_code == 1
+    assert "--dry-run cannot be used with --daemon" in result.output
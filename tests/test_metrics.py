@@ -1,5 +1,10 @@
+import os
 import pytest
-from prompt_regress.metrics import SimilarityMetrics
+import numpy as np
+import torch
+from prompt_regress.metrics import SimilarityMetrics, JSONMetrics, LexicalMetrics
+from prompt_regress.metrics.encode_pool import EncodePool
+from prompt_regress.metrics.drift import DriftIndex, cluster_embeddings
 
 
 @pytest.fixture
@@ -30,4 +35,147 @@ def test_semantic_similarity_empty(metrics):
     with pytest.raises(ValueError):
         metrics.semantic_similarity([], []) 
         metrics.semantic_similarity(["a"], [])
-        metrics.semantic_similarity([], ["b"])
\ No newline at end of file
+        metrics.semantic_similarity([], ["b"])
+
+@pytest.fixture
+def chunked_metrics():
+    return SimilarityMetrics(embedding_model='Qwen/Qwen3-Embedding-0.6B', chunk_tokens=16, chunk_overlap=4, pooling='max')
+
+def test_split_windows_long_text(chunked_metrics):
+    long_text = " ".join(["the quick brown fox jumps over the lazy dog"] * 10)
+    windows, owners = chunked_metrics._split_windows([long_text, "short"])
+    assert owners.count(0) > 1
+    assert owners.count(1) == 1
+    assert windows[-1] == "short"
+
+def test_chunked_semantic_similarity_identical(chunked_metrics):
+    long_text = " ".join(["the quick brown fox jumps over the lazy dog"] * 10)
+    assert chunked_metrics.semantic_similarity([long_text], [long_text])[0] >= 0.99
+
+def test_chunked_embed_covers_whole_text(chunked_metrics):
+    long_text = " ".join(["the quick brown fox jumps over the lazy dog"] * 10)
+    embeddings = chunked_metrics.embed([long_text, long_text + " but the cat sat on the mat instead", "short"])
+    assert embeddings.shape[0] == 3
+    assert torch.allclose(embeddings.norm(dim=1), torch.ones(3), atol=1e-5)
+    assert not torch.allclose(embeddings[0], embeddings[1])
+
+def test_chunked_mean_pooling_reuses_target_embeddings(monkeypatch):
+    metrics = SimilarityMetrics(embedding_model='Qwen/Qwen3-Embedding-0.6B', chunk_tokens=16)
+    embedded = []
+
+    def embed(texts):
+        embedded.extend(texts)
+        return torch.tensor([[1.0, 0.0]] * len(texts))
+
+    monkeypatch.setattr(metrics, "embed", embed)
+    similarities = metrics.semantic_similarity(["a", "b"], ["c", "d"], target_embeddings=torch.tensor([[1.0, 0.0], [0.0, 1.0]]))
+    assert embedded == ["a", "b"]
+    assert similarities.tolist() == pytest.approx([1.0, 0.0])
+
+def test_chunked_semantic_similarity_invalid_overlap():
+    with pytest.raises(ValueError):
+        SimilarityMetrics(embedding_model='Qwen/Qwen3-Embedding-0.6B', chunk_tokens=8, chunk_overlap=8)
+
+def test_json_metrics_identical():
+    scores, baseline_valid, target_valid, diffs = JSONMetrics().compare(['{"a": 1, "b": "x"}'], ['{"b": "x", "a": 1}'])
+    assert scores[0] == 1.0
+    assert baseline_valid == target_valid == [True]
+    assert diffs[0] == {'missing': [], 'added': [], 'changed': []}
+
+def test_json_metrics_structural_diff():
+    scores, _, _, diffs = JSONMetrics().compare(['{"a": 1, "b": [1, 2]}'], ['{"a": 2, "b": [1], "c": null}'])
+    assert 0 < scores[0] < 1.0
+    assert diffs[0] == {'missing': ['$.b[1]'], 'added': ['$.c'], 'changed': ['$.a']}
+
+def test_json_metrics_invalid():
+    scores, baseline_valid, target_valid, _ = JSONMetrics().compare(['not json'], ['{}'])
+    assert scores[0] == 0.0
+    assert baseline_valid == [False]
+    assert target_valid == [True]
+
+def test_json_metrics_schema():
+    pytest.importorskip("jsonschema")
+    schema = {"type": "object", "required": ["name"]}
+    _, baseline_valid, target_valid, _ = JSONMetrics(schema=schema).compare(['{"name": "x"}'], ['{"age": 1}'])
+    assert baseline_valid == [True]
+    assert target_valid == [False]
+
+def test_lexical_metrics_identical():
+    scores = LexicalMetrics().compute(["The cat sat on the mat.", ""], ["the cat sat on the mat.", ""])
+    for metric in ('rouge_l', 'bleu', 'token_jaccard', 'length_ratio'):
+        assert scores[metric].tolist() == pytest.approx([1.0, 1.0])
+
+def test_lexical_metrics_disjoint():
+    scores = LexicalMetrics().compute(["a b c", "a b c"], ["x y z", ""])
+    assert scores['rouge_l'].tolist() == [0.0, 0.0]
+    assert scores['bleu'].tolist() == [0.0, 0.0]
+    assert scores['token_jaccard'].tolist() == [0.0, 0.0]
+    assert scores['length_ratio'].tolist() == [1.0, 0.0]
+
+def test_lexical_metrics_known_values():
+    scores = LexicalMetrics(batch_size=1).compute(["a b c d e f", "the cat sat"], ["f e d c b a", "the cat sat on the mat"])
+    # The LCS of a reversed sequence is a single token: 2 * 1 / (6 + 6).
+    assert scores['rouge_l'][0] == pytest.approx(1 / 6)
+    assert scores['rouge_l'][1] == pytest.approx(2 * 3 / 9)
+    assert scores['token_jaccard'].tolist() == pytest.approx([1.0, 3 / 5])
+    assert scores['length_ratio'].tolist() == pytest.approx([1.0, 0.5])
+    assert 0.0 < scores['bleu'][0] < scores['bleu'][1] < 1.0
+
+def test_lexical_metrics_subset():
+    scores = LexicalMetrics().compute(["a"], ["a"], metrics=['bleu'])
+    assert list(scores) == ['bleu']
+    with pytest.raises(ValueError):
+        LexicalMetrics().compute(["a"], ["a"], metrics=['meteor'])
+
+class FakeEmbeddingModel:
+    def get_sentence_embedding_dimension(self):
+        return 3
+
+    def encode(self, texts, batch_size=16, convert_to_numpy=True, normalize_embeddings=False):
+        embeddings = np.array([[len(text), text.count("a"), os.getpid()] for text in texts], dtype=np.float32)
+        if normalize_embeddings:
+            embeddings /= np.linalg.norm(embeddings, axis=1, keepdims=True)
+        return embeddings
+
+def test_encode_pool_preserves_order():
+    pool = EncodePool(FakeEmbeddingModel(), workers=2)
+    texts = ["a" * n + "b" * (n % 3) for n in range(1, 40)]
+    try:
+        embeddings = pool.encode(texts, batch_size=4)
+    finally:
+        pool.close()
+    assert embeddings.shape == (39, 3)
+    assert embeddings.dtype == np.float32
+    assert embeddings[:, 0].tolist() == [len(text) for text in texts]
+    assert embeddings[:, 1].tolist() == [text.count("a") for text in texts]
+    assert os.getpid() not in embeddings[:, 2]
+
+def test_encode_pool_invalid_workers():
+    with pytest.raises(ValueError):
+        EncodePool(FakeEmbeddingModel(), workers=0)
+
+@pytest.mark.parametrize("backend", ["hnsw", "numpy"])
+def test_drift_index_query_and_persist(monkeypatch, tmp_path, backend):
+    if backend == "hnsw":
+        pytest.importorskip("hnswlib")
+    else:
+        monkeypatch.setattr("prompt_regress.metrics.drift.hnswlib", None)
+    embeddings = np.random.default_rng(0).normal(size=(200, 8)).astype(np.float32)
+
+    index = DriftIndex(tmp_path, model="m", dimension=8)
+    assert index.query(embeddings[:2], k=3)[0].shape == (2, 0)
+    assert index.add(embeddings) == 200
+    assert index.add(embeddings[:5]) == 0
+    index.save()
+
+    reloaded = DriftIndex(tmp_path, model="m", dimension=8)
+    similarities, ids = reloaded.query(embeddings[:3] * 2, k=3)
+    assert ids[:, 0].tolist() == [0, 1, 2]
+    assert similarities[:, 0] == pytest.approx([1.0, 1.0, 1.0], abs=1e-4)
+    assert (np.diff(similarities, axis=1) <= 1e-6).all()
+    assert len(DriftIndex(tmp_path, model="other", dimension=8)) == 0
+
+def test_cluster_embeddings():
+    embeddings = np.array([[1.0, 0.0], [0.0, 1.0], [0.99, 0.1], [0.1, 0.99]])
+    assert cluster_embeddings(embeddings, threshold=0.9) == [0, 1, 0, 1]
+    assert cluster_embeddings(embeddings, threshold=1.0) == [0, 1, 2, 3]
@@ -1,5 +1,7 @@
+import json
+import asyncio
 import pytest
-from prompt_regress.models import OpenAIProvider, AnthropicProvider, LocalProvider
+from prompt_regress.models import OpenAIProvider, AnthropicProvider, LocalProvider, ModelResponse, Cassette, CassetteProvider, CassetteMissError, compute_cost, static_prefix
 
 @pytest.fixture
 def openai_provider():
@@ -29,4 +31,173 @@ async def test_anthropic_provider(anthropic_provider):
 async def test_local_provider(local_provider):
     response = await local_provider.agenerate("Hello, world!", model="deepseek-r1:1.5b")
     assert isinstance(response.text, str)
-    assert len(response.text) > 0
\ No newline at end of file
+    assert len(response.text) > 0
+
+class FakeProvider:
+    def __init__(self):
+        self.calls = 0
+
+    async def agenerate(self, prompt, **kwargs):
+        self.calls += 1
+        return ModelResponse(text=f"echo: {prompt}", prompt=prompt, token_count=7, cost=0.5,
+                             response_time_ms=12.5, metadata={'input_tokens': 3, 'output_tokens': 4})
+
+@pytest.mark.asyncio
+async def test_cassette_record_then_replay(tmp_path):
+    cassette_path = tmp_path / "cassette.jsonl"
+    live = FakeProvider()
+    recorder = CassetteProvider(Cassette(cassette_path), "fake", live, mode="record")
+    recorded = await recorder.agenerate("Hello", model="m", temperature=0.0)
+    assert live.calls == 1
+
+    replayer = CassetteProvider(Cassette(cassette_path), "fake", mode="replay")
+    replayed = await replayer.agenerate("Hello", model="m", temperature=0.0)
+    assert replayed.text == recorded.text
+    assert replayed.response_time_ms == 12.5
+    assert replayed.metadata["output_tokens"] == 4
+    assert replayed.metadata["replayed"] is True
+    assert recorded.cost == 0.5
+    assert replayed.cost == 0.0
+    assert replayed.metadata["recorded_cost"] == 0.5
+
+@pytest.mark.asyncio
+async def test_cassette_replay_miss(tmp_path):
+    cassette = Cassette(tmp_path / "cassette.jsonl")
+    with pytest.raises(CassetteMissError):
+        await CassetteProvider(cassette, "fake", mode="replay").agenerate("Hello", model="m")
+
+    live = FakeProvider()
+    provider = CassetteProvider(cassette, "fake", live, mode="replay", on_miss="live")
+    await provider.agenerate("Hello", model="m")
+    await provider.agenerate("Hello", model="m")
+    assert live.calls == 1
+    assert len(cassette) == 1
+
+def test_static_prefix():
+    assert static_prefix("You are a helpful assistant.\n\nSummarize: {text}") == "You are a helpful assistant.\n\nSummarize: "
+    assert static_prefix("Use {{braces}} for {name}") == "Use {braces} for "
+    assert static_prefix("{text} first") == ""
+    assert static_prefix("No placeholders") == "No placeholders"
+
+def test_anthropic_content_cache_breakpoint():
+    content = AnthropicProvider._content("Instructions. Input: hi", cache_prefix="Instructions. Input: ")
+    assert content[0] == {"type": "text", "text": "Instructions. Input: ", "cache_control": {"type": "ephemeral"}}
+    assert content[1] == {"type": "text", "text": "hi"}
+    assert AnthropicProvider._content("hi") == [{"type": "text", "text": "hi"}]
+
+def test_compute_cost_cached_input():
+    pricing = {"input": 10.0, "cached_input": 1.0, "output": 20.0}
+    assert compute_cost(pricing, 1_000_000, 0, cached_input_tokens=500_000) == 5.5
+    assert compute_cost({"input": 10.0}, 1_000_000, 0, cached_input_tokens=500_000) == 10.0
+    assert compute_cost(None, 1_000_000, 1_000_000) == 0.0
+
+def test_anthropic_prices_cache_writes(monkeypatch):
+    from types import SimpleNamespace
+    monkeypatch.setenv("ANTHROPIC_API_KEY", "test")
+    provider = AnthropicProvider(pricing={"input": 10.0, "cached_input": 1.0, "output": 0.0})
+    usage = SimpleNamespace(input_tokens=100_000, cache_read_input_tokens=0, cache_creation_input_tokens=400_000, output_tokens=0)
+    message = SimpleNamespace(usage=usage, content=[SimpleNamespace(text="hi")])
+    response = provider._to_model_response("prompt", message, 1.0)
+    assert response.metadata["input_tokens"] == 500_000
+    assert response.metadata["cache_write_input_tokens"] == 400_000
+    assert response.cost == pytest.approx(1.0 + 5.0)
+
+def test_compute_cost_cache_write():
+    assert compute_cost({"input": 10.0}, 1_000_000, 0, cache_write_input_tokens=500_000) == pytest.approx(11.25)
+    pricing = {"input": 10.0, "cached_input": 1.0, "cache_write": 20.0}
+    assert compute_cost(pricing, 1_000_000, 0, cached_input_tokens=250_000, cache_write_input_tokens=250_000) == pytest.approx(10.25)
+
+@pytest.mark.asyncio
+async def test_cassette_ignores_cache_prefix(tmp_path):
+    cassette = Cassette(tmp_path / "cassette.jsonl")
+    live = FakeProvider()
+    await CassetteProvider(cassette, "fake", live, mode="record").agenerate("Hello", model="m", cache_prefix="He")
+    replayed = await CassetteProvider(cassette, "fake", mode="replay").agenerate("Hello", model="m")
+    assert replayed.text == "echo: Hello"
+
+class FakeOllamaClient:
+    def __init__(self, fail=False, delay=0.0):
+        self.fail = fail
+        self.delay = delay
+        self.chats = 0
+        self.loaded = []
+
+    async def chat(self, messages, model, options, keep_alive=None):
+        from ollama import ChatResponse, Message
+        await asyncio.sleep(self.delay)
+        if self.fail:
+            raise ConnectionError("connection refused")
+        self.chats += 1
+        return ChatResponse(message=Message(role="assistant", content="ok"), prompt_eval_count=3, eval_count=2)
+
+    async def ps(self):
+        if self.fail:
+            raise ConnectionError("connection refused")
+
+    async def generate(self, model, prompt, keep_alive=None):
+        self.loaded.append(model)
+
+def multi_host_provider(*clients):
+    provider = LocalProvider(host=[f"http://box{idx}:11434" for idx in range(len(clients))], max_concurrency=4)
+    for host, client in zip(provider.hosts, clients):
+        host.async_client = client
+    return provider
+
+@pytest.mark.asyncio
+async def test_local_provider_least_outstanding():
+    clients = [FakeOllamaClient(delay=0.01), FakeOllamaClient(delay=0.01)]
+    provider = multi_host_provider(*clients)
+    responses = await asyncio.gather(*(provider.agenerate(f"p{idx}", model="m") for idx in range(8)))
+    assert [client.chats for client in clients] == [4, 4]
+    assert {response.metadata["host"] for response in responses} == {"http://box0:11434", "http://box1:11434"}
+
+@pytest.mark.asyncio
+async def test_local_provider_failover_and_warmup(capsys):
+    down, up = FakeOllamaClient(fail=True), FakeOllamaClient()
+    provider = multi_host_provider(down, up)
+    response = await provider.agenerate("hello", model="m")
+    assert response.metadata["host"] == "http://box1:11434"
+    assert not provider.hosts[0].healthy
+    assert "box0" in capsys.readouterr().out
+
+    await provider.awarmup("m")
+    assert up.loaded == ["m"]
+    assert down.loaded == []
+
+    provider = multi_host_provider(FakeOllamaClient(fail=True))
+    with pytest.raises(ConnectionError):
+        await provider.awarmup("m")
+
+def test_cassette_shared_between_instances(tmp_path):
+    first = Cassette(tmp_path / "cassette.jsonl")
+    second = Cassette(tmp_path / "cassette.jsonl")
+    response = ModelResponse(text="hi", prompt="p", token_count=1, cost=0.0, response_time_ms=1, metadata={})
+    first.put("k1", response)
+    assert second.get("k1").text == "hi"
+    second.put("k2", response)
+    assert first.get("k2").text == "hi"
+    assert len(Cassette(tmp_path / "cassette.jsonl")) == 2
+
+def test_cassette_skips_corrupt_lines(tmp_path):
+    path = tmp_path / "cassette.jsonl"
+    Cassette(path).put("k1", ModelResponse(text="hi", prompt="p", token_count=1, cost=0.0, response_time_ms=1, metadata={}))
+    with open(path, "ab") as file:
+        file.write(b'{"key": "k2", "resp\n')
+    Cassette(path).put("k3", ModelResponse(text="ho", prompt="p", token_count=1, cost=0.0, response_time_ms=1, metadata={}))
+    cassette = Cassette(path)
+    assert len(cassette) == 2
+    assert cassette.get("k3").text == "ho"
+    assert cassette.get("k2") is None
+
+def test_cassette_indexes_lines_appended_while_open(tmp_path):
+    path = tmp_path / "cassette.jsonl"
+    cassette = Cassette(path)
+    line = json.dumps({"key": "k1", "response": {"text": "hi", "prompt": "p", "token_count": 1, "cost": 0.0,
+                                                 "response_time_ms": 1, "metadata": {}}})
+    with open(path, "ab") as file:
+        # Another process is half-way through writing a recording.
+        file.write(line[:10].encode())
+        file.flush()
+        assert cassette.get("k1") is None
+        file.write(line[10:].encode() + b"\n")
+    assert cassette.get("k1").text == "hi"
@@ -0,0 +1,53 @@
+import pytest
+# Imported up front: in-process pytester runs reset sys.modules, and PyTorch cannot be imported twice.
+import prompt_regress.core
+from prompt_regress.history import HistoryStore
+from tests.fakes import EchoProvider, EqualityMetrics
+
+pytest_plugins = ["pytester"]
+
+
+@pytest.fixture
+def project(pytester, fake_engine, suite, write_config):
+    write_config(suite, pytester.path / "prompt-regress.yml")
+    fake_engine(EchoProvider, metrics=EqualityMetrics)
+    return pytester
+
+def test_plugin_collects_test_cases(project):
+    result = project.runpytest_inprocess("prompt-regress.yml", "-p", "prompt_regress.pytest_plugin",
+                                         "--prompt-regress-baseline", "base", "--prompt-regress-target", "new")
+    result.assert_outcomes(passed=1, failed=1)
+    result.stdout.fnmatch_lines(["*Target Output: regressed*", "*FAILED prompt-regress.yml::b - 1 input(s) regressed*"])
+    assert EchoProvider.calls == 6
+
+def test_plugin_records_session_as_one_run(project):
+    project.runpytest_inprocess("prompt-regress.yml", "-p", "prompt_regress.pytest_plugin",
+                                "--prompt-regress-baseline", "base", "--prompt-regress-target", "new")
+    # Both models are warmed up once for the session, not once per item.
+    assert EchoProvider.warmups == 2
+    history = HistoryStore(project.path / ".prompt-regress" / "history.db")
+    try:
+        runs = history.trend("passed", baseline="base", target="new")
+    finally:
+        history.close()
+    assert [run["count"] for run in runs] == [3]
+    assert runs[0]["mean"] == pytest.approx(2 / 3)
+
+def test_plugin_cache_reuses_generations(project):
+    args = ["prompt-regress.yml", "-p", "prompt_regress.pytest_plugin", "--prompt-regress-baseline", "base",
+            "--prompt-regress-target", "new", "--prompt-regress-cache"]
+    project.runpytest_inprocess(*args).assert_outcomes(passed=1, failed=1)
+    project.runpytest_inprocess(*args).assert_outcomes(passed=1, failed=1)
+    assert EchoProvider.calls == 6
+
+def test_plugin_inactive_without_models(project):
+    result = project.runpytest_inprocess("prompt-regress.yml", "-p", "prompt_regress.pytest_plugin")
+    result.assert_outcomes()
+
+def test_plugin_fixture(project):
+    project.makepyfile("""
+        def test_engine(prompt_regress):
+            results = prompt_regress.compare_models("base", "new", test_cases=["a"])
+            assert all(result.passed for result in results)
+    """)
+    project.runpytest_inprocess("-p", "prompt_regress.pytest_plugin").assert_outcomes(passed=1)
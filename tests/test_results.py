@@ -0,0 +1,60 @@
+import io
+import json
+import pytest
+from prompt_regress.results import ComparisonResult, ResultTable
+
+
+@pytest.fixture
+def results():
+    return [
+        ComparisonResult(test_case="a", prompt="p1", baseline_output="x", target_output="y",
+                         text_similarity=0.5, semantic_similarity=0.75, passed=False),
+        ComparisonResult(test_case="a", prompt="p2", baseline_output="x", target_output="x",
+                         text_similarity=1.0, semantic_similarity=1.0, passed=True),
+    ]
+
+def test_result_table_roundtrip(results):
+    table = ResultTable(results)
+    assert len(table) == 2
+    assert list(table) == results
+    assert table[-1] == results[1]
+    assert table.column("passed").tolist() == [False, True]
+    assert table.column("text_similarity").tolist() == [0.5, 1.0]
+
+def test_result_table_append_while_column_in_use(results):
+    table = ResultTable(results[:1])
+    column = table.column("text_similarity")
+    table.append(results[1])
+    assert column.tolist() == [0.5]
+    assert table.column("text_similarity").tolist() == [0.5, 1.0]
+
+def test_result_table_nullable_int(results):
+    results[0].failure_cluster = 0
+    table = ResultTable(results)
+    assert [r.failure_cluster for r in table] == [0, None]
+    column = table.column("failure_cluster")
+    assert column[0] == 0 and column[1] != column[1]
+
+def test_result_table_interns_text(results):
+    table = ResultTable(results)
+    assert table._pool.count("x") == 1
+
+def test_result_table_take(results):
+    table = ResultTable(results)
+    taken = table.take([1, 0, 1])
+    assert list(taken) == [results[1], results[0], results[1]]
+    taken.append(results[0])
+    assert len(table) == 2 and len(taken) == 4
+    assert [r["prompt"] for r in table.iter_records([1])] == ["p2"]
+
+def test_result_table_write_jsonl(results):
+    buffer = io.StringIO()
+    ResultTable(results).write_jsonl(buffer)
+    lines = buffer.getvalue().splitlines()
+    assert [json.loads(line)["prompt"] for line in lines] == ["p1", "p2"]
+
+def test_result_table_to_arrow(results):
+    pytest.importorskip("pyarrow")
+    table = ResultTable(results).to_arrow()
+    assert table.num_rows == 2
+    assert table.column("target_output").to_pylist() == ["y", "x"]